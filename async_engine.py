@@ -0,0 +1,338 @@
+"""
+异步同步引擎 - 基于 asyncio 并发读取 iCloud 日历和写入 Google Calendar
+
+与 SyncEngine 使用同样的变更检测、状态记录和统计，只是把网络请求换成异步实现：
+- iCloud: caldav 3 的 AsyncDAVClient
+- Google: 通过 niquests.AsyncSession 直接调用 Calendar v3 REST 接口
+两侧各用一个信号量限制同时进行的请求数。
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from icloud_calendar import ICloudCalendar, event_key
+from google_calendar import GoogleCalendar, WRITE_FIELDS, google_event_id
+from lease import Lease
+from metrics import metrics
+from planner import OperationPlanner
+from sync_engine import SyncEngine
+from sync_log import get_logger
+from time_windows import TieredWindows
+
+
+log = get_logger(__name__)
+
+
+GOOGLE_API_URL = 'https://www.googleapis.com/calendar/v3'
+
+
+class AsyncGoogleCalendar:
+    """
+    Google Calendar 异步写入客户端
+
+    复用 GoogleCalendar 的凭证、限流器、事件格式转换和错误判断，
+    HTTP 错误转换为 googleapiclient 的 HttpError，重试规则与同步版本一致。
+    """
+
+    def __init__(self, google: GoogleCalendar, session, concurrency: int = 10):
+        self.google = google
+        self.session = session
+        self.limiter = google.limiter
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.events_url = f"{GOOGLE_API_URL}/calendars/{quote(google.calendar_id)}/events"
+
+    async def create_event(self, event_data: Dict) -> Optional[str]:
+        """创建新事件，返回事件 ID，失败返回 None；ID 已存在时改为更新（见 GoogleCalendar._recreate）"""
+        body = dict(self.google._convert_to_google_event(event_data), id=google_event_id(event_data))
+        try:
+            created = await self._request('POST', f"{self.events_url}?fields={WRITE_FIELDS}", body)
+            event_id = created.get('id')
+            log.debug("创建事件成功: %s (ID: %s)", event_data['summary'], event_id)
+            return event_id
+        except HttpError as e:
+            if e.resp.status == 409:
+                return await self._recreate(body['id'], event_data)
+            log.warning("创建事件失败: %s (%s)", event_data['summary'], e)
+            return None
+        except Exception as e:
+            log.warning("创建事件失败: %s (%s)", event_data['summary'], e)
+            return None
+
+    async def _recreate(self, event_id: str, event_data: Dict) -> Optional[str]:
+        """创建时 ID 已存在：整体更新并恢复为未取消状态"""
+        log.info("事件已存在，改为更新: %s (ID: %s)", event_data['summary'], event_id)
+        try:
+            await self._request('PUT', f"{self.events_url}/{event_id}?fields={WRITE_FIELDS}",
+                                dict(self.google._convert_to_google_event(event_data), status='confirmed'))
+            return event_id
+        except Exception as e:
+            log.warning("更新事件失败: %s (%s)", event_data['summary'], e)
+            return None
+
+    async def update_event(self, event_id: str, event_data: Dict) -> bool:
+        """更新事件"""
+        try:
+            await self._request('PUT', f"{self.events_url}/{event_id}?fields={WRITE_FIELDS}",
+                                self.google._convert_to_google_event(event_data))
+            log.debug("更新事件成功: %s", event_data['summary'])
+            return True
+        except Exception as e:
+            log.warning("更新事件失败: %s (%s)", event_data['summary'], e)
+            return False
+
+    async def patch_event(self, event_id: str, event_data: Dict, changed: List[str]) -> bool:
+        """只更新变化的字段（见 GoogleCalendar.patch_event）"""
+        try:
+            await self._request('PATCH', f"{self.events_url}/{event_id}?fields={WRITE_FIELDS}",
+                                self.google._patch_body(event_data, changed))
+            log.debug("更新事件成功: %s", event_data['summary'])
+            return True
+        except Exception as e:
+            log.warning("更新事件失败: %s (%s)", event_data['summary'], e)
+            return False
+
+    async def delete_event(self, event_id: str) -> bool:
+        """删除事件，事件已不存在也视为成功"""
+        try:
+            await self._request('DELETE', f"{self.events_url}/{event_id}")
+            log.debug("删除事件成功: %s", event_id)
+            return True
+        except HttpError as e:
+            if e.resp.status in (404, 410):
+                log.debug("事件已不存在: %s", event_id)
+                return True
+            log.warning("删除事件失败: %s", e)
+            return False
+        except Exception as e:
+            log.warning("删除事件失败: %s", e)
+            return False
+
+    async def _request(self, method: str, url: str, body: Optional[Dict] = None) -> Dict:
+        """
+        发送单个请求
+
+        先经过信号量和限流器，限流、服务端错误和网络错误按指数退避重试；
+        凭证过期（401）时刷新一次凭证后重试。
+        """
+        attempt = 0
+        refreshed = False
+        while True:
+            async with self.semaphore:
+                await self.limiter.acquire_async()
+                try:
+                    with metrics.timer('google_request_seconds', method=method):
+                        response = await self.session.request(
+                            method, url, json=body,
+                            headers={'Authorization': f"Bearer {self.google.creds.token}"}
+                        )
+                    if response.status_code >= 400:
+                        raise HttpError(httplib2.Response({'status': response.status_code}),
+                                        response.content or b'', uri=url)
+                    self.limiter.on_success()
+                    return response.json() if response.content else {}
+                except Exception as e:
+                    self.google._record_error(e)
+                    error = e
+
+            if isinstance(error, HttpError) and error.resp.status == 401 and not refreshed:
+                await asyncio.to_thread(self.google.refresh_credentials)
+                refreshed = True
+                continue
+            if not self.google._is_retryable(error) or attempt >= self.limiter.max_retries:
+                raise error
+
+            if self.google._is_throttle(error):
+                self.limiter.on_throttle()
+                metrics.inc('google_throttles_total')
+            self.limiter.on_retry()
+            metrics.inc('google_retries_total')
+            delay = self.limiter.backoff(attempt)
+            log.warning("请求失败，%.1f 秒后重试（第 %s 次）: %s", delay, attempt + 1, error)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class AsyncSyncEngine(SyncEngine):
+    """
+    asyncio 同步引擎
+
+    总是读取整个时间范围（不使用增量和流水线模式，支持分层时间窗口），
+    统计和状态更新与 SyncEngine 的分阶段同步一致。
+    """
+
+    def __init__(self, icloud: ICloudCalendar, google: GoogleCalendar, state_file: str,
+                 state_backend: str = 'json', icloud_concurrency: int = 4,
+                 google_concurrency: int = 10, windows: Optional[TieredWindows] = None,
+                 planner: Optional[OperationPlanner] = None, patch_updates: bool = False,
+                 lease: Optional[Lease] = None):
+        super().__init__(icloud, google, state_file, state_backend=state_backend, windows=windows,
+                         planner=planner, patch_updates=patch_updates, lease=lease)
+        self.icloud_concurrency = icloud_concurrency    # 同时读取的日历数上限
+        self.google_concurrency = google_concurrency    # 同时进行的 Google 请求数上限
+
+    def _sync(self, start_date: datetime) -> Dict[str, int]:
+        """执行同步，返回与 SyncEngine.sync 相同的统计"""
+        return asyncio.run(self.sync_async(start_date))
+
+    async def sync_async(self, start_date: datetime) -> Dict[str, int]:
+        """sync() 的协程版本（不处理同步租约）"""
+        stats = self._begin_sync()
+        with metrics.timer('sync_run_seconds'):
+            await self._sync_phases(start_date, stats)
+        return stats
+
+    async def _sync_phases(self, start_date: datetime, stats: Dict[str, int]):
+        """读取、检测变更、写入并保存状态"""
+        import niquests
+
+        # 1. 从 iCloud 获取事件
+        log.info("[1/4] 正在从 iCloud 获取事件...")
+        plan = self._plan_windows(start_date)
+        present = {}
+        icloud_events = []
+        with metrics.timer('sync_phase_seconds', phase='fetch'):
+            for window in plan.windows:
+                events = await self._fetch_events(window.start, window.end)
+                icloud_events.extend(self._window_events(window, events, present))
+        icloud_events_dict = {event_key(event): event for event in icloud_events}
+
+        # 2. 检测需要创建、更新和删除的事件
+        log.info("[2/4] 正在检测变更...")
+        with metrics.timer('sync_phase_seconds', phase='diff'):
+            to_create, to_update = self._detect_changes(icloud_events_dict)
+            to_delete = self._detect_window_deletions(plan, present, {event['uid'] for event in icloud_events})
+            self._record_positions(plan, icloud_events_dict)
+            self._resolve_override_deletions(to_update, to_delete, icloud_events_dict, stats)
+
+        log.info("需要创建 %s 个、更新 %s 个、删除 %s 个事件", len(to_create), len(to_update), len(to_delete))
+        to_create, to_update, to_delete = self._schedule(to_create, to_update, to_delete, icloud_events_dict, stats)
+
+        # 3. 执行同步操作
+        log.info("[3/4] 正在执行同步...")
+        if self.google._expires_soon(self.google.creds):
+            self.google.refresh_credentials()
+        with metrics.timer('sync_phase_seconds', phase='apply'):
+            async with niquests.AsyncSession() as session:
+                google = AsyncGoogleCalendar(self.google, session, self.google_concurrency)
+                await self._apply_async(google, to_create, to_update, to_delete, icloud_events_dict, stats)
+
+        self._finish_sync(stats, len(icloud_events), plan=plan)
+
+    async def _fetch_events(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+        """并发读取所有日历，结果按日历列表顺序合并，失败或超时的日历被跳过"""
+        from caldav.aio import AsyncDAVClient
+
+        semaphore = asyncio.Semaphore(max(1, self.icloud_concurrency))
+
+        async def fetch(calendar) -> List[Dict]:
+            async with semaphore:
+                try:
+                    with metrics.timer('icloud_calendar_fetch_seconds', calendar=self.icloud._href(calendar.url)):
+                        return await asyncio.wait_for(
+                            self._fetch_calendar(calendar, start_date, end_date),
+                            timeout=self.icloud.fetch_timeout
+                        )
+                except asyncio.TimeoutError:
+                    log.warning("读取日历 %s 超时（%s 秒）", calendar.url, self.icloud.fetch_timeout)
+                except Exception as e:
+                    log.warning("读取日历 %s 失败: %s", calendar.url, e)
+                return []
+
+        try:
+            async with AsyncDAVClient(
+                url=self.icloud.CALDAV_URL,
+                username=self.icloud.username,
+                password=self.icloud.app_password,
+                timeout=self.icloud.fetch_timeout
+            ) as client:
+                principal = await client.get_principal()
+                calendars = [calendar for calendar in await principal.get_calendars()
+                             if self.icloud.in_shard(calendar)]
+                results = await asyncio.gather(*(fetch(calendar) for calendar in calendars))
+        finally:
+            self.icloud._finish_parsing()
+
+        all_events = [event for events in results for event in events]
+        log.info("共获取到 %s 个事件", len(all_events))
+        return all_events
+
+    async def _fetch_calendar(self, calendar, start_date: datetime, end_date: datetime) -> List[Dict]:
+        """读取单个日历在时间范围内的所有事件"""
+        calendar_name = await calendar.get_display_name()
+        log.info("正在读取日历: %s", calendar_name)
+
+        # 与同步引擎使用的 date_search 保持一致（展开结果不拆分），两者解析出的事件相同
+        events = await calendar.search(
+            start=start_date,
+            end=end_date,
+            event=True,
+            expand=not self.icloud.recurrence_aware,
+            split_expanded=False
+        )
+
+        # 解析是 CPU 密集的同步代码，放到线程中执行，不阻塞事件循环上的其他日历读取和 Google 写入
+        loop = asyncio.get_running_loop()
+        if self.icloud.parse_pool:
+            parsed = await loop.run_in_executor(None, self.icloud._parse_batch, calendar, events, calendar_name)
+            calendar_events = [event for events_data in parsed for event in events_data]
+        else:
+            calendar_events = await loop.run_in_executor(None, self._parse_events, calendar, events, calendar_name)
+        metrics.inc('icloud_events_fetched_total', len(calendar_events))
+        return calendar_events
+
+    def _parse_events(self, calendar, events: List, calendar_name: str) -> List[Dict]:
+        """逐个解析日历对象（未配置解析进程池时在线程中运行），单个事件出错时跳过"""
+        calendar_events = []
+        for event in events:
+            try:
+                calendar_events.extend(self.icloud._parse_cached(calendar, event, calendar_name))
+            except Exception as e:
+                log.warning("解析事件失败: %s", e)
+        return calendar_events
+
+    async def _apply_async(self, google: AsyncGoogleCalendar, to_create: Set[str], to_update: Set[str],
+                           to_delete: Set[str], icloud_events: Dict[str, Dict], stats: Dict[str, int]):
+        """并发执行创建、更新、删除操作，例外实例在主体创建完成后再写入"""
+        creates, overrides = self._split_overrides(to_create, icloud_events)
+
+        # 创建新事件
+        self._check_lease()
+        created = await asyncio.gather(*(google.create_event(icloud_events[key]) for key in creates))
+        for key, google_id in zip(creates, created):
+            self._record_create(key, icloud_events[key], google_id, stats)
+
+        # 重复事件的例外实例：在主体创建后更新对应实例
+        self._check_lease()
+        google_ids = [self._override_google_id(icloud_events[key]) for key in overrides]
+        updated = await asyncio.gather(*(
+            google.update_event(google_id, icloud_events[key]) if google_id else _false()
+            for key, google_id in zip(overrides, google_ids)
+        ))
+        for key, google_id, success in zip(overrides, google_ids, updated):
+            self._record_create(key, icloud_events[key], google_id if success else None, stats)
+
+        # 更新和删除互不依赖，一起并发执行
+        self._check_lease()
+        updates: List[Tuple[str, str]] = [(key, self.state.get_event(key)['google_id']) for key in to_update]
+        deletes: List[Tuple[str, str]] = [(key, self.state.get_event(key)['google_id']) for key in to_delete]
+        changed = {key: self._changed_fields(key, icloud_events[key]) for key in to_update}
+        results = await asyncio.gather(
+            *(google.update_event(google_id, icloud_events[key]) if changed[key] is None
+              else google.patch_event(google_id, icloud_events[key], changed[key])
+              for key, google_id in updates),
+            *(google.delete_event(google_id) for _, google_id in deletes)
+        )
+        for (key, _), success in zip(updates, results[:len(updates)]):
+            self._record_update(key, icloud_events[key], success, stats)
+        for (key, _), success in zip(deletes, results[len(updates):]):
+            self._record_delete(key, success, stats)
+
+
+async def _false() -> bool:
+    """主体未同步的例外实例直接记为失败"""
+    return False
@@ -0,0 +1,5 @@
+"""
+离线基准测试 - 本地假 CalDAV / Google Calendar 服务器和合成数据集
+
+用法: python -m benchmark --help
+"""
@@ -0,0 +1,5 @@
+from benchmark.runner import main
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+基准测试数据集生成 - 生成带重复事件和修改的合成日历数据
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+
+# 数据集从这一天开始，基准测试以它作为同步开始日期
+BASE_DATE = datetime(2026, 1, 1)
+
+WORDS = ['周会', '评审', '午餐', '出差', '健身', '读书会', '面试', '培训', '复盘', '电话', '体检', '生日']
+
+
+class CalendarObject:
+    """CalDAV 中的一个日历对象（一个 .ics 资源）"""
+
+    __slots__ = ('uid', 'data', 'etag', 'version')
+
+    def __init__(self, uid: str, data: str, version: int):
+        self.uid = uid
+        self.data = data
+        self.version = version
+        self.etag = f'"{uid}-{version}"'
+
+
+class Dataset:
+    """
+    合成数据集：若干日历，每个日历包含若干日历对象
+
+    修改和删除会推进版本号，供假 CalDAV 服务器计算 ctag 和 sync-token。
+    """
+
+    def __init__(self, events: int, calendars: int = 5, recurring: float = 0.1,
+                 overrides: float = 0.3, all_day: float = 0.1, seed: int = 0):
+        self.random = random.Random(seed)
+        self.recurring = recurring      # 重复事件的比例
+        self.overrides = overrides      # 重复事件中带例外实例的比例
+        self.all_day = all_day          # 全天事件的比例
+        self.version = 0
+        self.serial = 0
+        self.calendars: Dict[str, Dict[str, CalendarObject]] = {
+            f'cal{n}': {} for n in range(calendars)
+        }
+        self.tombstones: Dict[str, Dict[str, int]] = {name: {} for name in self.calendars}
+        self.ctags: Dict[str, int] = {name: 0 for name in self.calendars}
+
+        names = list(self.calendars)
+        for n in range(events):
+            self._add(names[n % len(names)])
+
+    def churn(self, fraction: float = 0.01) -> Dict[str, int]:
+        """
+        随机修改一部分对象：约 70% 修改内容，15% 删除，15% 新增
+
+        Returns:
+            {edited, deleted, added}
+        """
+        objects = [(name, href) for name, objs in self.calendars.items() for href in objs]
+        count = max(1, int(len(objects) * fraction))
+        result = {'edited': 0, 'deleted': 0, 'added': 0}
+
+        for name, href in self.random.sample(objects, min(count, len(objects))):
+            roll = self.random.random()
+            if roll < 0.7:
+                self._edit(name, href)
+                result['edited'] += 1
+            elif roll < 0.85:
+                self._delete(name, href)
+                result['deleted'] += 1
+            else:
+                self._add(name)
+                result['added'] += 1
+        return result
+
+    def count(self) -> int:
+        """对象总数"""
+        return sum(len(objs) for objs in self.calendars.values())
+
+    def _bump(self, calendar: str) -> int:
+        self.version += 1
+        self.ctags[calendar] = self.version
+        return self.version
+
+    def _add(self, calendar: str):
+        self.serial += 1
+        uid = f'bench-{self.serial:07d}@example.com'
+        version = self._bump(calendar)
+        self.calendars[calendar][f'{uid}.ics'] = CalendarObject(uid, self._render(uid), version)
+
+    def _edit(self, calendar: str, href: str):
+        obj = self.calendars[calendar][href]
+        version = self._bump(calendar)
+        self.calendars[calendar][href] = CalendarObject(
+            obj.uid, obj.data.replace('SUMMARY:', f'SUMMARY:[v{version}] ', 1), version
+        )
+
+    def _delete(self, calendar: str, href: str):
+        del self.calendars[calendar][href]
+        self.tombstones[calendar][href] = self._bump(calendar)
+
+    def _render(self, uid: str) -> str:
+        """生成一个 VCALENDAR 对象"""
+        rnd = self.random
+        start = BASE_DATE + timedelta(days=rnd.randrange(300), hours=rnd.randrange(8, 20))
+        duration = timedelta(minutes=rnd.choice([30, 60, 90, 120]))
+        summary = f"{rnd.choice(WORDS)} {uid.split('@')[0]}"
+        all_day = rnd.random() < self.all_day
+
+        lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//benchmark//EN']
+        lines += self._vevent(uid, summary, start, duration, all_day)
+        if rnd.random() < self.recurring:
+            # 重复事件：每周一次共 8 次，部分带一个例外实例
+            lines.insert(-1, 'RRULE:FREQ=WEEKLY;COUNT=8')
+            if rnd.random() < self.overrides:
+                occurrence = start + timedelta(weeks=rnd.randrange(1, 8))
+                lines += self._vevent(uid, summary + '（改期）', occurrence + timedelta(hours=1),
+                                      duration, all_day, recurrence_id=occurrence)
+        lines.append('END:VCALENDAR')
+        return '\r\n'.join(lines) + '\r\n'
+
+    def _vevent(self, uid: str, summary: str, start: datetime, duration: timedelta,
+                all_day: bool, recurrence_id: Optional[datetime] = None) -> List[str]:
+        lines = ['BEGIN:VEVENT', f'UID:{uid}', 'DTSTAMP:20260101T000000Z']
+        if all_day:
+            lines += [f"DTSTART;VALUE=DATE:{start:%Y%m%d}",
+                      f"DTEND;VALUE=DATE:{start + timedelta(days=1):%Y%m%d}"]
+            if recurrence_id:
+                lines.append(f"RECURRENCE-ID;VALUE=DATE:{recurrence_id:%Y%m%d}")
+        else:
+            lines += [f"DTSTART:{start:%Y%m%dT%H%M%SZ}", f"DTEND:{start + duration:%Y%m%dT%H%M%SZ}"]
+            if recurrence_id:
+                lines.append(f"RECURRENCE-ID:{recurrence_id:%Y%m%dT%H%M%SZ}")
+        lines += [
+            f'SUMMARY:{summary}',
+            f'DESCRIPTION:基准测试事件 {uid}',
+            f'LOCATION:会议室 {self.random.randrange(1, 30)}',
+            'END:VEVENT'
+        ]
+        return lines
@@ -0,0 +1,315 @@
+"""
+假 CalDAV 服务器 - 在本地提供合成日历数据，支持同步所用的 PROPFIND / REPORT 请求
+
+支持：
+- 发现 principal 和 calendar-home-set
+- 列出日历（displayname、getctag、sync-token）
+- calendar-query（返回日历中的全部对象，时间范围过滤交给客户端）
+- calendar-multiget、sync-collection、GET
+"""
+
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlparse
+from xml.sax.saxutils import escape
+
+from benchmark.dataset import Dataset
+
+
+DAV = '{DAV:}'
+CALDAV = '{urn:ietf:params:xml:ns:caldav}'
+
+PRINCIPAL = '/principal/'
+HOME = '/calendars/'
+
+
+class FakeCalDAVServer:
+    """
+    基于 ThreadingHTTPServer 的假 CalDAV 服务器
+
+    Args:
+        dataset: 提供日历数据的数据集（修改数据集后服务器立即可见）
+        latency: 每个请求额外等待的秒数
+    """
+
+    def __init__(self, dataset: Dataset, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.dataset = dataset
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = Counter()
+
+        server = self
+
+        class Handler(CalDAVHandler):
+            fake = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, kind: str):
+        with self.lock:
+            self.calls[kind] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.calls, total=sum(self.calls.values()))
+
+
+class CalDAVHandler(BaseHTTPRequestHandler):
+    """处理单个 CalDAV 请求"""
+
+    fake: FakeCalDAVServer
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---- HTTP 方法 ----
+
+    def do_OPTIONS(self):
+        self._send(200, b'', extra={'DAV': '1, 2, calendar-access', 'Allow': 'OPTIONS, GET, PROPFIND, REPORT'})
+
+    def do_GET(self):
+        self._delay('GET')
+        calendar, href = self._split_path()
+        obj = self._object(calendar, href)
+        if obj is None:
+            return self._send(404, b'')
+        self._send(200, obj.data.encode(), content_type='text/calendar; charset=utf-8',
+                   extra={'ETag': obj.etag})
+
+    def do_PROPFIND(self):
+        self._delay('PROPFIND')
+        props = self._requested_props(self._read_body())
+        depth = self.headers.get('Depth', '0')
+        path = urlparse(self.path).path
+
+        if path in ('/', ''):
+            responses = [self._prop_response('/', props, self._root_props())]
+        elif path == PRINCIPAL:
+            responses = [self._prop_response(PRINCIPAL, props, self._principal_props())]
+        elif path == HOME:
+            responses = [self._prop_response(HOME, props, self._collection_props())]
+            if depth != '0':
+                for name in self.fake.dataset.calendars:
+                    responses.append(self._prop_response(
+                        f'{HOME}{name}/', props, self._calendar_props(name)
+                    ))
+        else:
+            calendar, href = self._split_path()
+            if calendar not in self.fake.dataset.calendars:
+                return self._send(404, b'')
+            if href:
+                obj = self._object(calendar, href)
+                if obj is None:
+                    return self._send(404, b'')
+                responses = [self._prop_response(self.path, props, {f'{DAV}getetag': escape(obj.etag)})]
+            else:
+                responses = [self._prop_response(f'{HOME}{calendar}/', props, self._calendar_props(calendar))]
+                if depth != '0':
+                    for href, obj in list(self.fake.dataset.calendars[calendar].items()):
+                        responses.append(self._prop_response(
+                            self._object_href(calendar, href), props,
+                            {f'{DAV}getetag': escape(obj.etag), f'{DAV}resourcetype': ''}
+                        ))
+        self._multistatus(responses)
+
+    def do_REPORT(self):
+        body = self._read_body()
+        root = ET.fromstring(body)
+        self._delay('REPORT ' + root.tag.split('}')[-1])
+        calendar, _ = self._split_path()
+        if calendar not in self.fake.dataset.calendars:
+            return self._send(404, b'')
+        with_data = root.find(f'.//{CALDAV}calendar-data') is not None
+
+        if root.tag == f'{CALDAV}calendar-query':
+            objects = list(self.fake.dataset.calendars[calendar].items())
+            self._multistatus([self._object_response(calendar, href, obj, with_data) for href, obj in objects])
+
+        elif root.tag == f'{CALDAV}calendar-multiget':
+            responses = []
+            for element in root.iter(f'{DAV}href'):
+                href = unquote(element.text or '').rstrip('/').rsplit('/', 1)[-1]
+                obj = self._object(calendar, href)
+                if obj is None:
+                    responses.append(self._status_response(self._object_href(calendar, href), 404))
+                else:
+                    responses.append(self._object_response(calendar, href, obj, with_data))
+            self._multistatus(responses)
+
+        elif root.tag == f'{DAV}sync-collection':
+            token = root.findtext(f'{DAV}sync-token') or ''
+            self._sync_collection(calendar, token, with_data)
+
+        else:
+            self._send(501, b'')
+
+    # ---- 响应内容 ----
+
+    def _sync_collection(self, calendar: str, token: str, with_data: bool):
+        dataset = self.fake.dataset
+        since = self._parse_token(token)
+        if since is None and token:
+            return self._send(403, b'<?xml version="1.0"?><D:error xmlns:D="DAV:"><D:valid-sync-token/></D:error>',
+                              content_type='application/xml')
+        since = since or 0
+
+        responses = [
+            self._object_response(calendar, href, obj, with_data)
+            for href, obj in list(dataset.calendars[calendar].items()) if obj.version > since
+        ]
+        if token:
+            responses += [
+                self._status_response(self._object_href(calendar, href), 404)
+                for href, version in list(dataset.tombstones[calendar].items()) if version > since
+            ]
+        self._multistatus(responses, sync_token=self._token(calendar))
+
+    def _root_props(self) -> Dict[str, str]:
+        return {
+            f'{DAV}current-user-principal': f'<D:href>{PRINCIPAL}</D:href>',
+            f'{DAV}resourcetype': '<D:collection/>',
+        }
+
+    def _principal_props(self) -> Dict[str, str]:
+        return {
+            f'{DAV}current-user-principal': f'<D:href>{PRINCIPAL}</D:href>',
+            f'{CALDAV}calendar-home-set': f'<D:href>{HOME}</D:href>',
+            f'{CALDAV}calendar-user-address-set': '<D:href>mailto:bench@example.com</D:href>',
+            f'{DAV}resourcetype': '<D:collection/><D:principal/>',
+            f'{DAV}displayname': 'bench',
+        }
+
+    def _collection_props(self) -> Dict[str, str]:
+        return {f'{DAV}resourcetype': '<D:collection/>'}
+
+    def _calendar_props(self, name: str) -> Dict[str, str]:
+        return {
+            f'{DAV}resourcetype': '<D:collection/><C:calendar/>',
+            f'{DAV}displayname': name,
+            '{http://calendarserver.org/ns/}getctag': str(self.fake.dataset.ctags[name]),
+            f'{DAV}sync-token': self._token(name),
+            f'{CALDAV}supported-calendar-component-set': '<C:comp name="VEVENT"/>',
+        }
+
+    def _prop_response(self, href: str, requested: Optional[List[str]], available: Dict[str, str]) -> str:
+        names = requested if requested is not None else list(available)
+        found = [name for name in names if name in available]
+        missing = [name for name in names if name not in available]
+
+        parts = [f'<D:response><D:href>{escape(href)}</D:href>']
+        if found:
+            parts.append('<D:propstat><D:prop>')
+            parts += [self._element(name, available[name]) for name in found]
+            parts.append('</D:prop><D:status>HTTP/1.1 200 OK</D:status></D:propstat>')
+        if missing:
+            parts.append('<D:propstat><D:prop>')
+            parts += [self._element(name, '') for name in missing]
+            parts.append('</D:prop><D:status>HTTP/1.1 404 Not Found</D:status></D:propstat>')
+        parts.append('</D:response>')
+        return ''.join(parts)
+
+    def _object_response(self, calendar: str, href: str, obj, with_data: bool) -> str:
+        props = f'<D:getetag>{escape(obj.etag)}</D:getetag>'
+        if with_data:
+            props += f'<C:calendar-data>{escape(obj.data)}</C:calendar-data>'
+        return (f'<D:response><D:href>{self._object_href(calendar, href)}</D:href>'
+                f'<D:propstat><D:prop>{props}</D:prop><D:status>HTTP/1.1 200 OK</D:status></D:propstat>'
+                f'</D:response>')
+
+    @staticmethod
+    def _status_response(href: str, status: int) -> str:
+        return f'<D:response><D:href>{href}</D:href><D:status>HTTP/1.1 {status} X</D:status></D:response>'
+
+    @staticmethod
+    def _element(name: str, value: str) -> str:
+        namespace, local = name[1:].split('}')
+        prefix = {'DAV:': 'D', 'urn:ietf:params:xml:ns:caldav': 'C'}.get(namespace)
+        if prefix:
+            return f'<{prefix}:{local}>{value}</{prefix}:{local}>'
+        return f'<X:{local} xmlns:X="{namespace}">{value}</X:{local}>'
+
+    def _multistatus(self, responses: List[str], sync_token: Optional[str] = None):
+        token = f'<D:sync-token>{sync_token}</D:sync-token>' if sync_token else ''
+        body = ('<?xml version="1.0" encoding="utf-8"?>'
+                '<D:multistatus xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">'
+                + ''.join(responses) + token + '</D:multistatus>')
+        self._send(207, body.encode(), content_type='application/xml; charset=utf-8')
+
+    # ---- 工具 ----
+
+    def _delay(self, kind: str):
+        self.fake.count(kind)
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    @staticmethod
+    def _requested_props(body: bytes) -> Optional[List[str]]:
+        """PROPFIND 请求的属性名，allprop 或空请求返回 None"""
+        if not body.strip():
+            return None
+        prop = ET.fromstring(body).find(f'{DAV}prop')
+        if prop is None:
+            return None
+        return [child.tag for child in prop]
+
+    def _split_path(self) -> Tuple[Optional[str], Optional[str]]:
+        """把 /calendars/{日历}/{对象} 拆分为 (日历, 对象文件名)"""
+        path = unquote(urlparse(self.path).path)
+        if not path.startswith(HOME):
+            return None, None
+        parts = path[len(HOME):].strip('/').split('/', 1)
+        return parts[0], (parts[1] if len(parts) > 1 else None)
+
+    def _object(self, calendar: Optional[str], href: Optional[str]):
+        return self.fake.dataset.calendars.get(calendar, {}).get(href)
+
+    @staticmethod
+    def _object_href(calendar: str, href: str) -> str:
+        return f'{HOME}{calendar}/{quote(href)}'
+
+    def _token(self, calendar: str) -> str:
+        return f'http://bench/sync/{self.fake.dataset.ctags[calendar]}'
+
+    @staticmethod
+    def _parse_token(token: str) -> Optional[int]:
+        if not token.startswith('http://bench/sync/'):
+            return None
+        try:
+            return int(token.rsplit('/', 1)[1])
+        except ValueError:
+            return None
+
+    def _send(self, status: int, body: bytes, content_type: str = 'text/plain',
+              extra: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
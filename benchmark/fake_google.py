@@ -0,0 +1,244 @@
+"""
+假 Google Calendar 服务器 - 在本地模拟 Calendar v3 REST 接口和批量请求
+
+支持 events 的 insert / get / update / patch / delete / list，以及 /batch/calendar/v3
+批量请求。可配置每个请求的延迟和每秒请求数上限，超出上限的请求返回
+403 rateLimitExceeded（与 Google 的行为一致）。
+"""
+
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+
+EVENTS_PATH = re.compile(r'^/calendar/v3/calendars/([^/]+)/events(?:/([^/]+))?$')
+
+
+class FakeGoogleServer:
+    """
+    基于 ThreadingHTTPServer 的假 Google Calendar 服务器
+
+    Args:
+        latency: 每个 HTTP 请求额外等待的秒数（批量请求只等待一次）
+        rate_limit: 每秒允许的 API 调用数（批量请求中每个子请求计一次），0 表示不限
+    """
+
+    def __init__(self, latency: float = 0.0, rate_limit: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.events: Dict[str, Dict] = {}
+        self.ids = itertools.count(1)
+        self.calls = Counter()
+        self.tokens = float(rate_limit)
+        self.updated = time.monotonic()
+
+        server = self
+
+        class Handler(GoogleHandler):
+            fake = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @staticmethod
+    def build_service(url: str):
+        """构造指向 url 处假服务器的 googleapiclient 服务对象（包括批量请求地址）"""
+        doc = json.loads(get_static_doc('calendar', 'v3'))
+        doc['rootUrl'] = url
+        doc['baseUrl'] = url + doc['servicePath']
+        return build_from_document(doc, http=httplib2.Http(timeout=60))
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.calls)
+
+    def allow(self) -> bool:
+        """按令牌桶判断本次 API 调用是否被限流"""
+        with self.lock:
+            if not self.rate_limit:
+                return True
+            now = time.monotonic()
+            self.tokens = min(self.rate_limit, self.tokens + (now - self.updated) * self.rate_limit)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.calls['throttled'] += 1
+            return False
+
+    def handle(self, method: str, path: str, body: Optional[Dict]) -> Tuple[int, Optional[Dict]]:
+        """处理一个 API 调用，返回 (状态码, 响应 JSON)"""
+        with self.lock:
+            self.calls['api_calls'] += 1
+            self.calls[method] += 1
+        if not self.allow():
+            return 403, _error(403, 'Rate Limit Exceeded', 'rateLimitExceeded')
+
+        parsed = urlparse(path)
+        match = EVENTS_PATH.match(parsed.path)
+        if not match:
+            return 404, _error(404, 'Not Found', 'notFound')
+        event_id = unquote(match.group(2)) if match.group(2) else None
+
+        with self.lock:
+            if method == 'POST' and not event_id:
+                return self._insert(body or {})
+            if method == 'GET' and not event_id:
+                return self._list(parse_qs(parsed.query))
+            if event_id is None:
+                return 405, _error(405, 'Method Not Allowed', 'methodNotAllowed')
+            if method == 'GET':
+                event = self.events.get(event_id)
+                return (200, event) if event else (404, _error(404, 'Not Found', 'notFound'))
+            if method in ('PUT', 'PATCH'):
+                return self._update(event_id, body or {}, replace=(method == 'PUT'))
+            if method == 'DELETE':
+                if self.events.pop(event_id, None) is None:
+                    return 410, _error(410, 'Resource has been deleted', 'deleted')
+                return 204, None
+        return 405, _error(405, 'Method Not Allowed', 'methodNotAllowed')
+
+    def _insert(self, body: Dict) -> Tuple[int, Dict]:
+        event_id = body.get('id') or f'bench{next(self.ids):08d}'
+        if event_id in self.events:
+            return 409, _error(409, 'The requested identifier already exists.', 'duplicate')
+        event = dict(body, id=event_id, status='confirmed')
+        self.events[event_id] = event
+        return 200, event
+
+    def _update(self, event_id: str, body: Dict, replace: bool) -> Tuple[int, Dict]:
+        event = self.events.get(event_id)
+        if event is None:
+            # 重复事件实例（{主体 ID}_{时间}）在主体存在时可以直接修改
+            master_id = event_id.rsplit('_', 1)[0]
+            if '_' not in event_id or master_id not in self.events:
+                return 404, _error(404, 'Not Found', 'notFound')
+            event = {'id': event_id, 'recurringEventId': master_id}
+        event = dict(body, id=event_id) if replace else dict(event, **body)
+        self.events[event_id] = event
+        return 200, event
+
+    def _list(self, query: Dict[str, List[str]]) -> Tuple[int, Dict]:
+        items = list(self.events.values())
+        for condition in query.get('privateExtendedProperty', []):
+            name, _, value = condition.partition('=')
+            items = [item for item in items
+                     if item.get('extendedProperties', {}).get('private', {}).get(name) == value]
+        start = int(query.get('pageToken', ['0'])[0])
+        size = min(int(query.get('maxResults', ['250'])[0]), 2500)
+        page = {'items': items[start:start + size]}
+        if start + size < len(items):
+            page['nextPageToken'] = str(start + size)
+        return 200, page
+
+
+class GoogleHandler(BaseHTTPRequestHandler):
+    """处理单个 HTTP 请求（单个 API 调用或批量请求）"""
+
+    fake: FakeGoogleServer
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        if urlparse(self.path).path.startswith('/batch/'):
+            return self._batch()
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method: str):
+        body = self._read_body()
+        self._delay()
+        status, payload = self.fake.handle(method, self.path, json.loads(body) if body else None)
+        data = json.dumps(payload).encode() if payload is not None else b''
+        self._send(status, data, 'application/json; charset=UTF-8')
+
+    def _batch(self):
+        """处理 multipart/mixed 批量请求，每个子请求单独返回结果"""
+        body = self._read_body().decode('utf-8')
+        self._delay()
+        boundary = re.search(r'boundary="?([^";]+)"?', self.headers['Content-Type']).group(1)
+
+        parts = []
+        for part in body.split('--' + boundary):
+            if 'Content-ID' not in part:
+                continue
+            content_id = re.search(r'Content-ID:\s*<([^>]+)>', part).group(1)
+            request = re.split(r'\r?\n\r?\n', part, maxsplit=1)[1]
+            head, payload = _split_http(request)
+            method, path = head.split(' ')[:2]
+            status, result = self.fake.handle(method, path, json.loads(payload) if payload.strip() else None)
+            result_body = json.dumps(result) if result is not None else ''
+            parts.append(
+                f'--batch_response\r\nContent-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} {"OK" if status < 400 else "Error"}\r\n'
+                f'Content-Type: application/json; charset=UTF-8\r\n\r\n{result_body}\r\n'
+            )
+        data = (''.join(parts) + '--batch_response--\r\n').encode('utf-8')
+        self._send(200, data, 'multipart/mixed; boundary=batch_response')
+
+    def _delay(self):
+        with self.fake.lock:
+            self.fake.calls['http_requests'] += 1
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status: int, data: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _split_http(request: str) -> Tuple[str, str]:
+    """把批量请求中的子请求拆分为 (请求行, 请求体)"""
+    head, _, payload = request.replace('\r\n', '\n').partition('\n\n')
+    return head.split('\n', 1)[0], payload
+
+
+def _error(code: int, message: str, reason: str) -> Dict:
+    return {'error': {'code': code, 'message': message,
+                      'errors': [{'domain': 'global', 'reason': reason, 'message': message}]}}
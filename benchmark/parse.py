@@ -0,0 +1,134 @@
+"""
+事件解析基准测试 - 比较快速提取（ical_extract.py）和 icalendar 解析的耗时，并检查结果一致
+
+除合成数据集外，还生成接近 iCloud 导出格式的事件：带 VTIMEZONE 的 TZID 时间、折行的长描述、
+转义字符、VALARM、浮动时间，以及一部分需要改用 icalendar 解析的事件（Windows 时区名、
+自定义 VTIMEZONE、带引号的参数）。两种方式的结果不一致时返回非零退出码。
+
+用法:
+    python -m benchmark.parse -n 5000
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import List
+
+from benchmark.dataset import Dataset, WORDS
+from ical_extract import Unsupported, extract_vevents
+from icloud_calendar import ICloudCalendar
+
+
+SHANGHAI = ['BEGIN:VTIMEZONE', 'TZID:Asia/Shanghai',
+            'BEGIN:STANDARD', 'DTSTART:19910915T000000', 'TZOFFSETFROM:+0900', 'TZOFFSETTO:+0800',
+            'TZNAME:GMT+8', 'END:STANDARD', 'END:VTIMEZONE']
+
+# 不是 IANA 时区名，结果取决于 VTIMEZONE 定义，需要改用 icalendar 解析
+CUSTOM = ['BEGIN:VTIMEZONE', 'TZID:China Standard Time',
+          'BEGIN:STANDARD', 'DTSTART:16010101T000000', 'TZOFFSETFROM:+0800', 'TZOFFSETTO:+0800',
+          'END:STANDARD', 'END:VTIMEZONE']
+
+
+def _fold(line: str, width: int = 75) -> List[str]:
+    """按 RFC 5545 折行（按字符数近似）"""
+    lines = [line[:width]]
+    for i in range(width, len(line), width - 1):
+        lines.append(' ' + line[i:i + width - 1])
+    return lines
+
+
+def icloud_object(rng: random.Random, serial: int) -> str:
+    """生成一个接近 iCloud 导出格式的日历对象"""
+    uid = f'{serial:08X}-ICLOUD-{rng.randrange(16 ** 6):06X}'
+    day = f'2026{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}'
+    hour = rng.randint(8, 20)
+    kind = rng.random()
+    timezone = SHANGHAI
+    if kind < 0.05:
+        timezone, times = CUSTOM, [f'DTSTART;TZID="China Standard Time":{day}T{hour:02d}0000',
+                                   f'DTEND;TZID="China Standard Time":{day}T{hour + 1:02d}0000']
+    elif kind < 0.15:
+        times = [f'DTSTART;VALUE=DATE:{day}']
+    elif kind < 0.2:
+        times = [f'DTSTART:{day}T{hour:02d}0000', f'DTEND:{day}T{hour + 1:02d}0000']
+    else:
+        times = [f'DTSTART;TZID=Asia/Shanghai:{day}T{hour:02d}0000',
+                 f'DTEND;TZID=Asia/Shanghai:{day}T{hour + 1:02d}3000']
+
+    summary = rng.choice(WORDS) + ('\\, ' + rng.choice(WORDS) if rng.random() < 0.3 else '')
+    description = '\\n'.join('；'.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+                             for _ in range(rng.randint(1, 6)))
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Apple Inc.//macOS 15.0//EN', 'CALSCALE:GREGORIAN']
+    lines += timezone
+    lines += ['BEGIN:VEVENT', 'CREATED:20250101T000000Z', 'DTSTAMP:20260101T000000Z',
+              'LAST-MODIFIED:20260102T030405Z', f'UID:{uid}', 'SEQUENCE:0',
+              f'SUMMARY:{summary}', 'TRANSP:OPAQUE', 'X-APPLE-TRAVEL-ADVISORY-BEHAVIOR:AUTOMATIC']
+    lines += _fold('DESCRIPTION:' + description)
+    if rng.random() < 0.5:
+        lines += _fold(f'LOCATION:{rng.choice(WORDS)}会议室\\; 上海市浦东新区世纪大道 {rng.randint(1, 2000)} 号')
+    lines += times
+    if rng.random() < 0.6:
+        lines += ['BEGIN:VALARM', 'ACTION:DISPLAY', 'DESCRIPTION:Reminder', 'TRIGGER:-PT15M',
+                  f'UID:{uid}-ALARM', 'X-WR-ALARMUID:' + uid, 'END:VALARM']
+    lines += ['END:VEVENT', 'END:VCALENDAR']
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def corpus(events: int, seed: int) -> List[str]:
+    """一半合成数据集事件，一半 iCloud 格式事件"""
+    dataset = Dataset(events // 2, seed=seed)
+    payloads = [obj.data for objects in dataset.calendars.values() for obj in objects.values()]
+    rng = random.Random(seed)
+    payloads += [icloud_object(rng, n) for n in range(events - len(payloads))]
+    rng.shuffle(payloads)
+    return payloads
+
+
+def run(payloads: List[str], recurrence_aware: bool, repeat: int) -> bool:
+    """测量一种模式，返回两种方式的结果是否一致"""
+    fast = ICloudCalendar('', '', recurrence_aware=recurrence_aware, fast_parse=True)
+    full = ICloudCalendar('', '', recurrence_aware=recurrence_aware, fast_parse=False)
+
+    timings = {}
+    results = {}
+    for name, parser in (('icalendar', full), ('fast', fast)):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            parsed = [parser._parse_data(data, 'bench') for data in payloads]
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+        results[name] = [[dict(event) for event in events] for events in parsed]
+
+    extracted = 0
+    for data in payloads:
+        try:
+            extract_vevents(data, recurrence_aware=recurrence_aware)
+            extracted += 1
+        except Unsupported:
+            pass
+
+    mismatches = sum(a != b for a, b in zip(results['fast'], results['icalendar']))
+    mode = '识别重复事件' if recurrence_aware else '展开重复事件'
+    print(f"{mode:<8} icalendar {timings['icalendar']:7.2f}s  快速提取 {timings['fast']:7.2f}s  "
+          f"加速 {timings['icalendar'] / timings['fast']:5.1f}x  "
+          f"快速提取比例 {extracted / len(payloads):6.1%}  不一致 {mismatches}")
+    return mismatches == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较快速提取和 icalendar 解析')
+    parser.add_argument('--events', '-n', type=int, default=5000, help='日历对象数')
+    parser.add_argument('--repeat', '-r', type=int, default=3, help='每项测量次数，取最快')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    payloads = corpus(args.events, args.seed)
+    ok = all([run(payloads, recurrence_aware, args.repeat) for recurrence_aware in (False, True)])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+基准测试运行器 - 在本地假服务器上测量首次同步、无变更同步和 1% 修改后同步
+
+每次同步在独立的子进程中运行（与 launchd 每次启动一个新进程一致），
+子进程报告耗时和峰值内存，API 调用次数由假服务器统计。
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmark.dataset import BASE_DATE, Dataset
+from benchmark.fake_caldav import FakeCalDAVServer
+from benchmark.fake_google import FakeGoogleServer
+
+
+SCENARIOS = ['首次同步', '无变更同步', '1% 修改']
+
+
+def run_sync(options: Dict, results) -> None:
+    """子进程：连接假服务器执行一次同步，把统计、耗时和峰值内存放入 results"""
+    from google.oauth2.credentials import Credentials
+
+    from icloud_calendar import ICloudCalendar
+    from google_calendar import GoogleCalendar
+    from sync_engine import SyncEngine
+
+    output = sys.stdout if options['verbose'] else open(os.devnull, 'w')
+    with contextlib.redirect_stdout(output):
+        started = time.perf_counter()
+
+        icloud = ICloudCalendar(
+            'bench', 'bench',
+            max_workers=options['workers'],
+            recurrence_aware=options['recurrence_aware'],
+            parse_cache_file=options['parse_cache_file'],
+            parse_workers=options['parse_workers']
+        )
+        icloud.CALDAV_URL = options['caldav_url']
+        if not icloud.connect():
+            raise RuntimeError('无法连接假 CalDAV 服务器')
+
+        google = GoogleCalendar('', '', rate_limit=options['client_rate'])
+        google.creds = Credentials(token='bench')
+        google.service = FakeGoogleServer.build_service(options['google_url'])
+
+        if options['engine'] == 'async':
+            import async_engine
+            async_engine.GOOGLE_API_URL = options['google_url'] + 'calendar/v3'
+            engine = async_engine.AsyncSyncEngine(
+                icloud, google, options['state_file'],
+                state_backend=options['state_backend'],
+                icloud_concurrency=options['workers']
+            )
+        else:
+            engine = SyncEngine(
+                icloud, google, options['state_file'],
+                incremental=options['incremental'],
+                batch_writes=options['batch'],
+                state_backend=options['state_backend'],
+                streaming=options['streaming']
+            )
+
+        stats = engine.sync(BASE_DATE)
+        elapsed = time.perf_counter() - started
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    results.put({'stats': stats, 'wall': elapsed, 'peak_rss_mb': peak_mb})
+
+
+def run_size(events: int, args: argparse.Namespace) -> List[Dict]:
+    """对一个数据规模依次运行三个场景"""
+    dataset = Dataset(events, calendars=args.calendars, seed=args.seed)
+    caldav = FakeCalDAVServer(dataset, latency=args.caldav_latency)
+    google = FakeGoogleServer(latency=args.google_latency, rate_limit=args.google_rate)
+    caldav.start()
+    google.start()
+
+    workdir = tempfile.mkdtemp(prefix='calendar-bench-')
+    options = {
+        'caldav_url': caldav.url,
+        'google_url': google.url,
+        'state_file': os.path.join(workdir, 'sync_state.json'),
+        'parse_cache_file': os.path.join(workdir, 'parse_cache.db') if args.parse_cache else None,
+        'engine': args.engine,
+        'incremental': args.incremental,
+        'batch': args.batch,
+        'streaming': args.streaming,
+        'state_backend': args.state_backend,
+        'recurrence_aware': args.recurrence_aware,
+        'workers': args.workers,
+        'parse_workers': args.parse_workers,
+        'client_rate': args.client_rate,
+        'verbose': args.verbose,
+    }
+
+    # 使用 spawn 启动子进程，避免继承父进程（数据集和服务器）的内存
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    try:
+        for scenario in SCENARIOS:
+            if scenario == '1% 修改':
+                dataset.churn(0.01)
+
+            caldav_before, google_before = caldav.stats(), google.stats()
+            results = context.Queue()
+            process = context.Process(target=run_sync, args=(options, results))
+            process.start()
+            result = results.get()
+            process.join()
+
+            caldav_after, google_after = caldav.stats(), google.stats()
+            rows.append({
+                'events': events,
+                'scenario': scenario,
+                'wall': round(result['wall'], 2),
+                'caldav_requests': caldav_after.get('total', 0) - caldav_before.get('total', 0),
+                'google_http_requests': google_after.get('http_requests', 0) - google_before.get('http_requests', 0),
+                'google_api_calls': google_after.get('api_calls', 0) - google_before.get('api_calls', 0),
+                'google_throttled': google_after.get('throttled', 0) - google_before.get('throttled', 0),
+                'peak_rss_mb': round(result['peak_rss_mb'], 1),
+                **result['stats'],
+            })
+            print_row(rows[-1])
+    finally:
+        caldav.stop()
+        google.stop()
+    return rows
+
+
+def print_row(row: Dict):
+    print(f"{row['events']:>7} {row['scenario']:<8} {row['wall']:>8.2f}s "
+          f"{row['caldav_requests']:>7} {row['google_http_requests']:>8} {row['google_api_calls']:>8} "
+          f"{row['google_throttled']:>6} {row['peak_rss_mb']:>8.1f} "
+          f"{row['created']:>6}/{row['updated']}/{row['deleted']}/{row['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='在本地假 CalDAV / Google Calendar 服务器上测量同步性能',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+示例:
+  python -m benchmark                              # 1k 事件，默认配置
+  python -m benchmark -n 1000 10000 100000         # 三种规模
+  python -m benchmark --incremental --batch        # 增量拉取 + 批量写入
+  python -m benchmark --google-latency 0.05 --google-rate 10
+        '''
+    )
+    parser.add_argument('--events', '-n', type=int, nargs='+', default=[1000], help='数据集事件数，可指定多个')
+    parser.add_argument('--calendars', type=int, default=5, help='日历数')
+    parser.add_argument('--seed', type=int, default=0, help='数据集随机种子')
+    parser.add_argument('--caldav-latency', type=float, default=0.0, help='假 CalDAV 服务器每个请求的延迟（秒）')
+    parser.add_argument('--google-latency', type=float, default=0.0, help='假 Google 服务器每个请求的延迟（秒）')
+    parser.add_argument('--google-rate', type=float, default=0.0, help='假 Google 服务器每秒允许的调用数，0 为不限')
+    parser.add_argument('--client-rate', type=float, default=100.0, help='客户端限流器的每秒请求数')
+    parser.add_argument('--engine', choices=['sync', 'async'], default='sync', help='同步引擎')
+    parser.add_argument('--incremental', action='store_true', help='CalDAV 增量拉取')
+    parser.add_argument('--batch', action='store_true', help='Google 批量写入')
+    parser.add_argument('--streaming', action='store_true', help='流水线模式')
+    parser.add_argument('--state-backend', choices=['json', 'sqlite'], default='json', help='状态存储后端')
+    parser.add_argument('--recurrence-aware', action='store_true', help='按 RRULE 同步重复事件')
+    parser.add_argument('--parse-cache', action='store_true', help='启用解析缓存')
+    parser.add_argument('--workers', type=int, default=4, help='并发读取的日历数')
+    parser.add_argument('--parse-workers', type=int, default=0, help='解析进程数（0 为在本进程解析）')
+    parser.add_argument('--json', metavar='FILE', help='把结果写入 JSON 文件')
+    parser.add_argument('--verbose', '-v', action='store_true', help='显示同步过程输出')
+    args = parser.parse_args()
+
+    print(f"{'事件数':>7} {'场景':<8} {'耗时':>9} {'CalDAV':>7} {'G-HTTP':>8} {'G-API':>8} "
+          f"{'限流':>6} {'RSS(MB)':>8} 创建/更新/删除/错误")
+    rows = []
+    for events in args.events:
+        rows.extend(run_size(events, args))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
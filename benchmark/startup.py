@@ -0,0 +1,65 @@
+"""
+启动时间测量 - 检查 launchd 单次运行和 --status 的冷启动耗时是否在目标之内
+
+用法（在项目目录下，需要已有 config.py）:
+    python -m benchmark.startup
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 目标（秒，含解释器启动）：--status 不导入 caldav / googleapiclient；
+# 单次同步在第一个网络请求之前只做必要的导入
+TARGETS = {
+    'status': 0.25,
+    'sync_imports': 1.0,
+}
+
+COMMANDS = {
+    # python main.py --status：只读取本地状态文件
+    'status': [os.path.join(PROJECT_DIR, 'main.py'), '--status'],
+    # python main.py 在连接 iCloud / Google 之前的全部导入
+    'sync_imports': ['-c', 'import main; from icloud_calendar import ICloudCalendar; '
+                           'from google_calendar import GoogleCalendar; from sync_engine import SyncEngine'],
+}
+
+
+def measure(args: List[str], runs: int) -> List[float]:
+    """运行命令 runs 次，返回每次的耗时"""
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=PROJECT_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量单次运行和 --status 的冷启动时间')
+    parser.add_argument('--runs', '-r', type=int, default=5, help='每项测量次数，取中位数')
+    args = parser.parse_args()
+
+    failed = False
+    for name, command in COMMANDS.items():
+        times = measure(command, args.runs)
+        median = statistics.median(times)
+        ok = median <= TARGETS[name]
+        failed = failed or not ok
+        print(f"{name:<14} 中位数 {median * 1000:7.1f} ms  最快 {min(times) * 1000:7.1f} ms  "
+              f"目标 {TARGETS[name] * 1000:.0f} ms  {'通过' if ok else '超出'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+"""
+日历同步应用 - 读取配置，创建 iCloud / Google 客户端和同步引擎，执行单次同步、定时同步和对账
+
+main.py（命令行入口）和 supervisor.py（多账号子进程）都从这里导入，
+main.py 作为脚本运行时不会被再次导入、重复执行配置读取。
+"""
+
+import importlib.util
+import os
+import signal
+import time
+from datetime import datetime
+
+import config
+from config import (
+    ICLOUD_USERNAME, ICLOUD_APP_PASSWORD,
+    GOOGLE_CREDENTIALS_FILE, GOOGLE_TOKEN_FILE, GOOGLE_CALENDAR_ID,
+    SYNC_STATE_FILE, SYNC_START_DATE, SYNC_INTERVAL_MINUTES
+)
+
+# 可选配置（旧的 config.py 中可能没有，使用默认值）
+ICLOUD_MAX_WORKERS = getattr(config, 'ICLOUD_MAX_WORKERS', 4)
+ICLOUD_FETCH_TIMEOUT = getattr(config, 'ICLOUD_FETCH_TIMEOUT', 120)
+ICLOUD_RECURRENCE_AWARE = getattr(config, 'ICLOUD_RECURRENCE_AWARE', False)
+ICLOUD_PARSE_CACHE_FILE = getattr(config, 'ICLOUD_PARSE_CACHE_FILE', None)
+ICLOUD_PARSE_CACHE_SIZE = getattr(config, 'ICLOUD_PARSE_CACHE_SIZE', 50000)
+ICLOUD_PARSE_WORKERS = getattr(config, 'ICLOUD_PARSE_WORKERS', 0)
+ICLOUD_PARSE_CHUNK_SIZE = getattr(config, 'ICLOUD_PARSE_CHUNK_SIZE', 100)
+ICLOUD_FAST_PARSE = getattr(config, 'ICLOUD_FAST_PARSE', True)
+SYNC_INCREMENTAL = getattr(config, 'SYNC_INCREMENTAL', False)
+GOOGLE_BATCH_WRITES = getattr(config, 'GOOGLE_BATCH_WRITES', False)
+GOOGLE_PATCH_UPDATES = getattr(config, 'GOOGLE_PATCH_UPDATES', False)
+GOOGLE_RATE_LIMIT = getattr(config, 'GOOGLE_RATE_LIMIT', 5)
+GOOGLE_MAX_RETRIES = getattr(config, 'GOOGLE_MAX_RETRIES', 5)
+SYNC_STATE_BACKEND = getattr(config, 'SYNC_STATE_BACKEND', 'json')
+SYNC_STREAMING = getattr(config, 'SYNC_STREAMING', False)
+SYNC_WRITE_QUEUE_SIZE = getattr(config, 'SYNC_WRITE_QUEUE_SIZE', 200)
+SYNC_ENGINE = getattr(config, 'SYNC_ENGINE', 'sync')
+GOOGLE_CONCURRENCY = getattr(config, 'GOOGLE_CONCURRENCY', 10)
+METRICS_PORT = getattr(config, 'METRICS_PORT', None)
+METRICS_FILE = getattr(config, 'METRICS_FILE', None)
+SYNC_ADAPTIVE_SCHEDULE = getattr(config, 'SYNC_ADAPTIVE_SCHEDULE', False)
+SYNC_MIN_INTERVAL_MINUTES = getattr(config, 'SYNC_MIN_INTERVAL_MINUTES', 1)
+SYNC_MAX_INTERVAL_MINUTES = getattr(config, 'SYNC_MAX_INTERVAL_MINUTES', 60)
+SYNC_WINDOW_TIERS = getattr(config, 'SYNC_WINDOW_TIERS', False)
+SYNC_WINDOW_PAST_DAYS = getattr(config, 'SYNC_WINDOW_PAST_DAYS', 30)
+SYNC_WINDOW_NEAR_DAYS = getattr(config, 'SYNC_WINDOW_NEAR_DAYS', 90)
+SYNC_WINDOW_FAR_DAYS = getattr(config, 'SYNC_WINDOW_FAR_DAYS', 365)
+SYNC_WINDOW_FAR_EVERY = getattr(config, 'SYNC_WINDOW_FAR_EVERY', 12)
+SYNC_ACCOUNTS = getattr(config, 'SYNC_ACCOUNTS', [])
+SYNC_MAX_PARALLEL_ACCOUNTS = getattr(config, 'SYNC_MAX_PARALLEL_ACCOUNTS', 2)
+GOOGLE_QUOTA_BUDGET = getattr(config, 'GOOGLE_QUOTA_BUDGET', None)
+SYNC_LEASE_TTL = getattr(config, 'SYNC_LEASE_TTL', None)
+SYNC_LEASE_SETTLE = getattr(config, 'SYNC_LEASE_SETTLE', 0)
+SYNC_SHARDS = getattr(config, 'SYNC_SHARDS', 1)
+LOG_LEVEL = getattr(config, 'LOG_LEVEL', 'INFO')
+LOG_FILE = getattr(config, 'LOG_FILE', None)
+LOG_MAX_BYTES = getattr(config, 'LOG_MAX_BYTES', 10 * 1024 * 1024)
+LOG_BACKUP_COUNT = getattr(config, 'LOG_BACKUP_COUNT', 5)
+LOG_JSON = getattr(config, 'LOG_JSON', False)
+# iCloud / Google 客户端依赖较重（caldav、googleapiclient），在 setup() 中按需导入，
+# --status 等不需要联网的命令可以快速启动
+from metrics import metrics
+from scheduler import AdaptiveScheduler
+from state_store import open_state_store
+from sync_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+def account_settings(account: dict = None) -> dict:
+    """
+    一组同步对（iCloud 账号 -> Google 日历）的设置
+
+    Args:
+        account: SYNC_ACCOUNTS 中的一项，未指定的设置使用顶层配置；
+            为 None 时返回顶层配置（单账号模式）
+
+    Returns:
+        {name, icloud_username, icloud_app_password, google_credentials_file,
+         google_token_file, google_calendar_id, state_file, parse_cache_file, start_date}
+    """
+    settings = {
+        'name': None,
+        'icloud_username': ICLOUD_USERNAME,
+        'icloud_app_password': ICLOUD_APP_PASSWORD,
+        'google_credentials_file': GOOGLE_CREDENTIALS_FILE,
+        'google_token_file': GOOGLE_TOKEN_FILE,
+        'google_calendar_id': GOOGLE_CALENDAR_ID,
+        'state_file': SYNC_STATE_FILE,
+        'parse_cache_file': ICLOUD_PARSE_CACHE_FILE,
+        'start_date': SYNC_START_DATE,
+    }
+    if account is None:
+        return settings
+
+    unknown = set(account) - set(settings)
+    if unknown:
+        raise ValueError(f"SYNC_ACCOUNTS 中有未知的设置: {', '.join(sorted(unknown))}")
+    name = account.get('name')
+    if not name:
+        raise ValueError("SYNC_ACCOUNTS 中的每一项都需要 name")
+
+    # 每组同步对的状态、Google 授权和解析缓存默认各自独立，文件名带上 name
+    settings['state_file'] = _with_suffix(SYNC_STATE_FILE, name)
+    settings['google_token_file'] = _with_suffix(GOOGLE_TOKEN_FILE, name)
+    if ICLOUD_PARSE_CACHE_FILE:
+        settings['parse_cache_file'] = _with_suffix(ICLOUD_PARSE_CACHE_FILE, name)
+    settings.update(account)
+    return settings
+
+
+def state_files(settings: dict) -> list:
+    """一组同步对的状态文件，分片时每个分片一个（sync_state_shard0.json ...）"""
+    if SYNC_SHARDS <= 1:
+        return [settings['state_file']]
+    return [_with_suffix(settings['state_file'], f'shard{index}') for index in range(SYNC_SHARDS)]
+
+
+def seed_shards(settings: dict):
+    """
+    开启分片时，由未分片的同步状态拆分出各分片的初始状态
+
+    否则各分片从空状态开始，Google 分配 ID 的已有事件会被重复创建、旧的副本留在 Google 中。
+    同步状态不记录事件所属的日历，按增量同步保存的日历状态（各日历中的事件键）拆分；
+    只写入状态文件还不存在的分片。
+
+    Raises:
+        ValueError: 有事件无法确定所属日历，不能安全开启分片
+    """
+    if SYNC_SHARDS <= 1 or not _state_exists(settings['state_file']):
+        return
+    shard_files = state_files(settings)
+    fresh = [index for index, state_file in enumerate(shard_files) if not _state_exists(state_file)]
+    if not fresh:
+        return
+    # 只读取，不调用 close（JSON 存储的 close 会写回文件）
+    base = open_state_store(settings['state_file'], SYNC_STATE_BACKEND)
+    if not base.count_events():
+        return
+
+    from icloud_calendar import ICloudCalendar, calendar_shard
+    caldav_state = base.get_meta('caldav') or {}
+    calendars = [{} for _ in range(SYNC_SHARDS)]
+    key_shards = {}
+    for calendar_url, calendar_state in (caldav_state.get('calendars') or {}).items():
+        index = calendar_shard(ICloudCalendar._href(calendar_url), SYNC_SHARDS)
+        calendars[index][calendar_url] = calendar_state
+        for entry in calendar_state['hrefs'].values():
+            key_shards.update(dict.fromkeys(entry['keys'], index))
+
+    entries = [[] for _ in range(SYNC_SHARDS)]
+    unplaced = 0
+    for key, entry in base.iter_events():
+        index = key_shards.get(key, key_shards.get(entry.get('master')))
+        if index is None:
+            unplaced += 1
+        else:
+            entries[index].append((key, entry))
+    if unplaced:
+        raise ValueError(
+            f"无法开启日历分片：{settings['state_file']} 中有 {unplaced} 个事件无法确定所属日历。"
+            "请先在 SYNC_SHARDS = 1、SYNC_INCREMENTAL = True 下完成一次同步，再开启分片"
+        )
+
+    # 推迟的操作随事件拆分；找不到所属日历的操作下次同步会重新检测到
+    pending = [[] for _ in range(SYNC_SHARDS)]
+    for op in base.get_meta('pending_ops') or []:
+        index = key_shards.get(op[1])
+        if index is not None:
+            pending[index].append(op)
+
+    for index in fresh:
+        state_file = shard_files[index]
+        store = open_state_store(state_file, SYNC_STATE_BACKEND)
+        for key, entry in entries[index]:
+            store.put_event(key, entry)
+        if caldav_state:
+            store.set_meta('caldav', dict(caldav_state, calendars=calendars[index]))
+        for name in ('windows', 'last_sync'):
+            if base.get_meta(name) is not None:
+                store.set_meta(name, base.get_meta(name))
+        store.set_meta('pending_ops', pending[index])
+        store.close()
+        log.info("已由 %s 拆分出 %s（%s 条记录）", settings['state_file'], state_file, len(entries[index]))
+
+
+def _state_exists(state_file: str) -> bool:
+    """同步状态是否已存在（sqlite 后端的 .json 路径对应同名 .db 文件）"""
+    root, ext = os.path.splitext(state_file)
+    return os.path.exists(state_file) or (SYNC_STATE_BACKEND == 'sqlite' and ext == '.json'
+                                          and os.path.exists(root + '.db'))
+
+
+def _with_suffix(path: str, name: str) -> str:
+    """sync_state.json -> sync_state_{name}.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{name}{ext}"
+
+
+def _caldav_async_available() -> bool:
+    """已安装的 caldav 是否提供 caldav.aio（caldav>=3）
+
+    只查找模块、不导入，--status 不会因此加载 caldav。
+    """
+    try:
+        spec = importlib.util.find_spec('caldav')
+    except (ImportError, ValueError):
+        return False
+    if spec is None or not spec.submodule_search_locations:
+        return False
+    return any(os.path.exists(os.path.join(location, 'aio.py')) or
+               os.path.isdir(os.path.join(location, 'aio'))
+               for location in spec.submodule_search_locations)
+
+
+class CalendarSync:
+    """日历同步应用"""
+
+    def __init__(self, engine: str = SYNC_ENGINE, account: dict = None, cassette=None):
+        self.engine_type = engine   # 'sync' 或 'async'
+        self.settings = account_settings(account)
+        if cassette and engine == 'async':
+            raise ValueError("HTTP 录制和回放只支持同步引擎（--engine sync）")
+        if engine == 'async' and not _caldav_async_available():
+            raise ValueError("异步引擎（--engine async）需要 caldav>=3，"
+                             "请运行 pip install -U 'caldav>=3' 或改用 --engine sync")
+        self.cassette = cassette    # HTTP 录制 / 回放（见 cassette.py）
+        if cassette:
+            if SYNC_SHARDS > 1:
+                raise ValueError("HTTP 录制和回放不支持日历分片（SYNC_SHARDS）")
+            self.settings['state_file'] = cassette.attach_state(self.settings['state_file'])
+        if SYNC_WINDOW_TIERS and not ICLOUD_RECURRENCE_AWARE:
+            # 展开模式下重复事件由窗口内第一个实例代表，近期窗口的起点每天后移，
+            # 选中的实例随之变化，每次同步都会更新所有重复事件
+            raise ValueError("分层时间窗口（SYNC_WINDOW_TIERS）需要同时启用 ICLOUD_RECURRENCE_AWARE")
+        if SYNC_SHARDS > 1 and not SYNC_LEASE_TTL:
+            raise ValueError("日历分片（SYNC_SHARDS）需要同时启用同步租约（SYNC_LEASE_TTL）")
+        # 多账号模式下由 SyncSupervisor 汇总写入指标文件
+        self.metrics_file = METRICS_FILE if account is None else None
+        self.icloud = None
+        self.google = None
+        self.engine = None          # 第一个分片（未分片时为唯一）的同步引擎
+        self.engines = []           # 各分片的同步引擎，共享 iCloud、Google 连接
+        self.running = False
+        self.last_stats = None      # 最近一次同步的统计，失败时为 None
+
+    def setup(self, connect_google: bool = True) -> bool:
+        """
+        初始化连接
+
+        Args:
+            connect_google: 是否连接 Google Calendar（--plan 不需要）
+        """
+        settings = self.settings
+        log.info("正在初始化%s...", ' ' + settings['name'] if settings['name'] else '')
+        from icloud_calendar import ICloudCalendar
+        from google_calendar import GoogleCalendar
+        from sync_engine import SyncEngine
+
+        try:
+            seed_shards(settings)
+        except ValueError as e:
+            log.error("%s", e)
+            return False
+
+        # 连接 iCloud
+        log.info("[iCloud] 正在连接...")
+        self.icloud = ICloudCalendar(
+            settings['icloud_username'], settings['icloud_app_password'],
+            max_workers=ICLOUD_MAX_WORKERS,
+            fetch_timeout=ICLOUD_FETCH_TIMEOUT,
+            recurrence_aware=ICLOUD_RECURRENCE_AWARE,
+            parse_cache_file=settings['parse_cache_file'],
+            parse_cache_size=ICLOUD_PARSE_CACHE_SIZE,
+            parse_workers=ICLOUD_PARSE_WORKERS,
+            parse_chunk_size=ICLOUD_PARSE_CHUNK_SIZE,
+            fast_parse=ICLOUD_FAST_PARSE,
+            cassette=self.cassette
+        )
+        if not self.icloud.connect():
+            log.error("无法连接到 iCloud，请检查用户名和应用专用密码")
+            return False
+
+        # 连接 Google Calendar
+        self.google = GoogleCalendar(
+            settings['google_credentials_file'],
+            settings['google_token_file'],
+            settings['google_calendar_id'],
+            rate_limit=GOOGLE_RATE_LIMIT,
+            max_retries=GOOGLE_MAX_RETRIES,
+            cassette=self.cassette
+        )
+        if connect_google:
+            log.info("[Google] 正在连接...")
+        if connect_google and not self.google.connect():
+            log.error("无法连接到 Google Calendar，请检查凭证文件")
+            return False
+
+        # 初始化同步引擎
+        windows = None
+        if SYNC_WINDOW_TIERS:
+            from time_windows import TieredWindows
+            windows = TieredWindows(
+                past_days=SYNC_WINDOW_PAST_DAYS,
+                near_days=SYNC_WINDOW_NEAR_DAYS,
+                far_days=SYNC_WINDOW_FAR_DAYS,
+                far_every=SYNC_WINDOW_FAR_EVERY
+            )
+
+        planner = None
+        if GOOGLE_QUOTA_BUDGET is not None:
+            from planner import OperationPlanner
+            planner = OperationPlanner(GOOGLE_QUOTA_BUDGET)
+
+        # 分片时每个分片只读取自己的日历，使用自己的同步状态和租约
+        self.engines = []
+        for index, state_file in enumerate(state_files(settings)):
+            icloud = self.icloud.for_shard(index, SYNC_SHARDS) if SYNC_SHARDS > 1 else self.icloud
+            lease = None
+            if SYNC_LEASE_TTL:
+                from lease import Lease
+                lease = Lease(SYNC_LEASE_TTL, settle=SYNC_LEASE_SETTLE)
+
+            if self.engine_type == 'async':
+                from async_engine import AsyncSyncEngine
+                engine = AsyncSyncEngine(
+                    icloud, self.google, state_file,
+                    state_backend=SYNC_STATE_BACKEND,
+                    icloud_concurrency=ICLOUD_MAX_WORKERS,
+                    google_concurrency=GOOGLE_CONCURRENCY,
+                    windows=windows,
+                    planner=planner,
+                    patch_updates=GOOGLE_PATCH_UPDATES,
+                    lease=lease
+                )
+            else:
+                engine = SyncEngine(
+                    icloud, self.google, state_file,
+                    incremental=SYNC_INCREMENTAL,
+                    batch_writes=GOOGLE_BATCH_WRITES,
+                    state_backend=SYNC_STATE_BACKEND,
+                    streaming=SYNC_STREAMING,
+                    write_queue_size=SYNC_WRITE_QUEUE_SIZE,
+                    windows=windows,
+                    planner=planner,
+                    patch_updates=GOOGLE_PATCH_UPDATES,
+                    lease=lease
+                )
+            self.engines.append(engine)
+        self.engine = self.engines[0]
+
+        log.info("初始化完成!")
+        return True
+
+    def sync_once(self) -> bool:
+        """执行一次同步"""
+        if not self.engine:
+            log.error("请先调用 setup() 初始化")
+            return False
+
+        from sync_engine import STAT_KEYS
+
+        started = datetime.now()
+        self.last_stats = None
+        try:
+            start_date = datetime.fromisoformat(self.settings['start_date'])
+            # 租约由其他机器持有的分片被跳过（sync 返回 None），不计入统计
+            total = dict.fromkeys(STAT_KEYS, 0)
+            for index, engine in enumerate(self.engines):
+                if len(self.engines) > 1:
+                    log.info("分片 %s/%s", index + 1, len(self.engines))
+                for key, count in (engine.sync(start_date) or {}).items():
+                    total[key] += count
+            self.last_stats = total
+            return True
+        except Exception as e:
+            log.error("同步出错: %s", e)
+            metrics.inc('sync_runs_total', result='failed')
+            return False
+        finally:
+            self.write_metrics(started, self.last_stats)
+
+    def reconcile(self, mode: str = 'verify') -> bool:
+        """用 Google 日历中的同步属性校验或重建同步状态（见 reconcile.py）"""
+        if not self.engine:
+            log.error("请先调用 setup() 初始化")
+            return False
+
+        if len(self.engines) > 1:
+            # Google 日历中的事件无法按分片区分，对账会把其他分片的事件当作孤立事件
+            log.error("日历分片（SYNC_SHARDS）模式下不支持对账")
+            return False
+
+        from reconcile import Reconciler
+
+        if not self.engine.acquire_lease():
+            return False
+        try:
+            start_date = datetime.fromisoformat(self.settings['start_date'])
+            Reconciler(self.engine).run(start_date, mode)
+            return True
+        except Exception as e:
+            log.error("对账出错: %s", e)
+            return False
+        finally:
+            self.engine.release_lease()
+
+    def preview(self) -> bool:
+        """读取 iCloud 并检测变更，打印写入计划和预计配额消耗，不调用 Google 接口（见 planner.py）"""
+        if not self.engine:
+            log.error("请先调用 setup() 初始化")
+            return False
+
+        try:
+            start_date = datetime.fromisoformat(self.settings['start_date'])
+            for engine in self.engines:
+                engine.preview(start_date)
+            return True
+        except Exception as e:
+            log.error("生成写入计划出错: %s", e)
+            return False
+
+    def write_metrics(self, started: datetime, stats: dict = None, accounts: list = None):
+        """把指标和本次同步结果写入 METRICS_FILE（未配置时跳过）"""
+        if not self.metrics_file:
+            return
+        last_run = {
+            'started': started.isoformat(),
+            'duration_seconds': round((datetime.now() - started).total_seconds(), 3),
+            'status': 'ok' if stats is not None else 'failed',
+            'stats': stats,
+        }
+        if accounts is not None:
+            last_run['accounts'] = accounts
+        try:
+            metrics.write_json(self.metrics_file, extra={'last_run': last_run})
+        except Exception as e:
+            log.warning("写入指标文件失败: %s", e)
+
+    def run_daemon(self, interval_minutes: int = None, adaptive: bool = SYNC_ADAPTIVE_SCHEDULE):
+        """
+        以守护进程模式运行，定时同步
+
+        Args:
+            interval_minutes: 同步间隔（分钟）；自适应调度时为初始间隔
+            adaptive: 根据每次同步的结果调整间隔（有变更时缩短，空闲时退避，出错时大幅退避）
+        """
+        if interval_minutes is None:
+            interval_minutes = SYNC_INTERVAL_MINUTES
+
+        scheduler = None
+        if adaptive:
+            scheduler = AdaptiveScheduler(
+                interval_minutes * 60,
+                min_interval=SYNC_MIN_INTERVAL_MINUTES * 60,
+                max_interval=SYNC_MAX_INTERVAL_MINUTES * 60
+            )
+
+        self.running = True
+
+        # 设置信号处理
+        # 信号处理函数中不写日志（可能打断正在写日志的主线程），只设置退出标志
+        def signal_handler(signum, frame):
+            self.running = False
+
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+        if METRICS_PORT:
+            try:
+                metrics.serve(METRICS_PORT)
+                log.info("指标地址: http://127.0.0.1:%s/metrics", METRICS_PORT)
+            except OSError as e:
+                log.warning("启动指标服务失败: %s", e)
+
+        if scheduler:
+            log.info("开始定时同步模式，自适应间隔: %s-%s 分钟", SYNC_MIN_INTERVAL_MINUTES, SYNC_MAX_INTERVAL_MINUTES)
+        else:
+            log.info("开始定时同步模式，间隔: %s 分钟", interval_minutes)
+        log.info("按 Ctrl+C 停止")
+
+        while self.running:
+            self.sync_once()
+
+            if not self.running:
+                break
+
+            if scheduler:
+                wait_seconds = scheduler.next_interval(self.last_stats)
+            else:
+                wait_seconds = interval_minutes * 60
+            metrics.set('sync_next_interval_seconds', wait_seconds)
+
+            log.info("下次同步: %.1f 分钟后", wait_seconds / 60)
+
+            # 等待下次同步
+            deadline = time.monotonic() + wait_seconds
+            while self.running and time.monotonic() < deadline:
+                time.sleep(min(1, deadline - time.monotonic()))
+
+        log.info("收到停止信号，同步服务已停止")
+
+    def show_status(self):
+        """显示同步状态（未初始化时直接读取本地状态，不连接 iCloud 和 Google）"""
+        if self.engines:
+            statuses = [engine.get_sync_status() for engine in self.engines]
+        else:
+            statuses = [open_state_store(state_file, SYNC_STATE_BACKEND).status()
+                        for state_file in state_files(self.settings)]
+        last_syncs = [status['last_sync'] for status in statuses if status['last_sync']]
+        print("\n同步状态:")
+        print(f"  - 已同步事件数: {sum(status['total_synced_events'] for status in statuses)}")
+        print(f"  - 上次同步时间: {max(last_syncs) if last_syncs else '从未同步'}")
@@ -0,0 +1,324 @@
+"""
+HTTP 录制与回放 - 把 iCloud CalDAV 和 Google Calendar 的请求和响应保存为 cassette 文件，离线重放
+
+- 录制：每个 HTTP 交换（方法、URL、请求体、状态、响应头和响应体、耗时）写成一行 JSON，
+  整个文件用 gzip 压缩；Authorization / Cookie 头、URL 中的令牌和 OAuth 令牌请求都会脱敏
+- 回放：按录制内容返回响应，不访问网络；可按录制时的耗时（乘以倍数）等待，
+  用于反复重现和分析慢同步
+- 同步状态：录制开始时把状态文件保存在 cassette 旁边，回放时使用它的临时副本，
+  每次回放都从录制时的状态开始，也不会修改正式的同步状态
+
+只覆盖同步引擎使用的 ICloudCalendar（caldav 会话）和 GoogleCalendar（httplib2），
+异步引擎直接使用 niquests 异步会话，不经过这里。
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httplib2
+from niquests.structures import CaseInsensitiveDict
+
+from sync_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+MODES = ('record', 'replay')
+
+REDACTED = '<redacted>'
+
+# 需要脱敏的请求头、URL 参数
+SECRET_HEADERS = {'authorization', 'proxy-authorization', 'cookie', 'set-cookie'}
+SECRET_PARAMS = {'access_token', 'key', 'client_secret', 'refresh_token'}
+
+# OAuth 令牌接口的请求和响应整体脱敏
+TOKEN_URLS = ('oauth2.googleapis.com/token', 'accounts.google.com/o/oauth2/token')
+
+# 批量请求体中子请求的 Authorization 头
+BODY_AUTH_PATTERN = re.compile(r'(?im)^(authorization:[ \t]*).*?(\r?)$')
+
+# 批量请求的 Content-ID 前缀是随机的，回放时替换为本次请求的前缀
+CONTENT_ID_PATTERN = re.compile(r'Content-ID: <([^>+]+)\+')
+
+
+class CassetteMiss(Exception):
+    """回放时没有匹配的录制记录"""
+
+
+class Cassette:
+    """
+    HTTP 录制 / 回放
+
+    Args:
+        path: cassette 文件（gzip 压缩的 JSON lines）
+        mode: 'record' 或 'replay'
+        latency: 回放时按录制耗时的多少倍等待，0 表示不等待
+    """
+
+    def __init__(self, path: str, mode: str = 'record', latency: float = 0.0):
+        if mode not in MODES:
+            raise ValueError(f"未知的 cassette 模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.file = None
+        self.count = 0
+        # 回放：先按 (方法, URL, 请求体摘要) 匹配，请求体不同（如时间范围、批量请求的
+        # 随机分隔符）时按 (方法, URL) 的录制顺序匹配
+        self.exact: Dict[Tuple[str, str, str], deque] = defaultdict(deque)
+        self.loose: Dict[Tuple[str, str], deque] = defaultdict(deque)
+
+        if mode == 'record':
+            self.file = gzip.open(path, 'at', encoding='utf-8')
+        else:
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def _load(self):
+        """读取 cassette 文件；录制进程被中断时文件末尾可能不完整，读到的部分照常使用"""
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    record['used'] = False
+                    self.exact[(record['method'], record['url'], record['digest'])].append(record)
+                    self.loose[(record['method'], record['url'])].append(record)
+                    self.count += 1
+            except (EOFError, json.JSONDecodeError):
+                pass
+        log.info("已加载 HTTP 回放记录: %s 个请求（%s）", self.count, self.path)
+
+    def attach_state(self, state_file: str) -> str:
+        """
+        录制时保存同步开始前的状态文件（及 sqlite 后端的同名 .db 文件）；
+        回放时把保存的状态复制到临时目录
+
+        Returns:
+            本次应使用的状态文件路径
+        """
+        snapshot = self.path + '.state'
+        root = os.path.splitext(state_file)[0]
+        names = [state_file, root + '.db']
+
+        if not self.replaying:
+            if not os.path.isdir(snapshot):
+                os.makedirs(snapshot)
+                for name in names:
+                    if os.path.exists(name):
+                        shutil.copy2(name, snapshot)
+            return state_file
+
+        work = tempfile.mkdtemp(prefix='cassette-')
+        if os.path.isdir(snapshot):
+            for name in os.listdir(snapshot):
+                shutil.copy2(os.path.join(snapshot, name), work)
+        log.info("回放使用录制时的同步状态（临时副本: %s）", work)
+        return os.path.join(work, os.path.basename(state_file))
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+            log.info("已录制 %s 个 HTTP 请求到 %s", self.count, self.path)
+
+    def wrap_session(self, session):
+        """包装 caldav 使用的 niquests 会话"""
+        return _RecordingSession(self, session)
+
+    def wrap_http(self, http: Optional[httplib2.Http] = None):
+        """包装 googleapiclient 使用的 httplib2.Http，回放时不需要 http"""
+        return _RecordingHttp(self, http)
+
+    # ---- 录制 ----
+
+    def record(self, method: str, url: str, request_headers: Dict, request_body,
+               status: int, reason: str, headers: Dict, body: bytes, elapsed: float):
+        """写入一个 HTTP 交换"""
+        url = redact_url(url)
+        token_request = any(token_url in url for token_url in TOKEN_URLS)
+        request_text = REDACTED if token_request else redact_body(_to_text(request_body))
+        record = {
+            't': round(time.perf_counter() - self.started - elapsed, 4),
+            'elapsed': round(elapsed, 4),
+            'method': method,
+            'url': url,
+            'digest': _digest(request_text),
+            'request': {'headers': redact_headers(request_headers), 'body': request_text},
+            'status': status,
+            'reason': reason,
+            'headers': redact_headers(headers),
+        }
+        if token_request:
+            record['body'] = REDACTED
+        else:
+            record.update(_encode_body(body))
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            self.file.write(line + '\n')
+            # 守护进程可能长时间运行，每条记录都刷新到文件
+            self.file.flush()
+            self.count += 1
+
+    # ---- 回放 ----
+
+    def replay(self, method: str, url: str, request_body) -> Dict:
+        """取出匹配的录制记录，按需等待录制时的耗时"""
+        url = redact_url(url)
+        request_text = redact_body(_to_text(request_body))
+        with self.lock:
+            record = self._take(self.exact[(method, url, _digest(request_text))])
+            if record is None:
+                record = self._take(self.loose[(method, url)])
+        if record is None:
+            raise CassetteMiss(f"回放记录中没有匹配的请求: {method} {url}")
+        if self.latency:
+            time.sleep(record['elapsed'] * self.latency)
+
+        body = _decode_body(record)
+        recorded_ids = CONTENT_ID_PATTERN.findall(record['request']['body'] or '')
+        current_ids = CONTENT_ID_PATTERN.findall(request_text or '')
+        if recorded_ids and current_ids:
+            body = body.replace(recorded_ids[0].encode(), current_ids[0].encode())
+        return dict(record, content=body)
+
+    @staticmethod
+    def _take(records: deque) -> Optional[Dict]:
+        """取出队列中第一个未使用的记录（两个索引共享同一批记录）"""
+        while records:
+            record = records.popleft()
+            if not record['used']:
+                record['used'] = True
+                return record
+        return None
+
+
+class _RecordingSession:
+    """caldav 会话代理：只拦截 request()，其余属性交给原会话"""
+
+    def __init__(self, cassette: Cassette, session):
+        self._cassette = cassette
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def request(self, method: str, url: str, data=None, headers=None, **kwargs):
+        if self._cassette.replaying:
+            record = self._cassette.replay(method, url, data)
+            return _ReplayResponse(record, url)
+
+        started = time.perf_counter()
+        response = self._session.request(method, url, data=data, headers=headers, **kwargs)
+        # 带上认证后实际发出的请求头
+        sent_headers = response.request.headers if response.request is not None else headers
+        self._cassette.record(
+            method, url, dict(sent_headers or {}), data,
+            response.status_code, response.reason or '', dict(response.headers),
+            response.content or b'', time.perf_counter() - started
+        )
+        return response
+
+
+class _ReplayResponse:
+    """回放的 caldav 响应，只提供 caldav 用到的属性"""
+
+    def __init__(self, record: Dict, url: str):
+        self.status_code = record['status']
+        self.reason = record['reason']
+        self.headers = CaseInsensitiveDict(record['headers'])
+        self.content = record['content']
+        self.url = url
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+
+class _RecordingHttp:
+    """httplib2.Http 代理：googleapiclient（包括批量请求）通过 request() 发出所有请求"""
+
+    def __init__(self, cassette: Cassette, http: Optional[httplib2.Http]):
+        self._cassette = cassette
+        self._http = http
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        if self._cassette.replaying:
+            record = self._cassette.replay(method, uri, body)
+            response = httplib2.Response(dict(record['headers'], status=str(record['status'])))
+            response.reason = record['reason']
+            return response, record['content']
+
+        started = time.perf_counter()
+        response, content = self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
+        self._cassette.record(
+            method, uri, dict(headers or {}), body,
+            response.status, response.reason or '',
+            {name: value for name, value in response.items() if name != 'status'},
+            content or b'', time.perf_counter() - started
+        )
+        return response, content
+
+
+def redact_headers(headers: Dict) -> Dict:
+    return {name: REDACTED if name.lower() in SECRET_HEADERS else str(value) for name, value in headers.items()}
+
+
+def redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [(name, REDACTED if name in SECRET_PARAMS else value)
+             for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def redact_body(text: Optional[str]) -> Optional[str]:
+    return BODY_AUTH_PATTERN.sub(rf'\g<1>{REDACTED}\g<2>', text) if text else text
+
+
+def _to_text(body) -> Optional[str]:
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        return body.decode('utf-8', errors='replace')
+    return str(body)
+
+
+def _digest(text: Optional[str]) -> str:
+    return hashlib.sha1((text or '').encode()).hexdigest()[:16]
+
+
+def _encode_body(body: bytes) -> Dict:
+    """响应体：UTF-8 文本直接保存，其他内容用 base64"""
+    try:
+        return {'body': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'body_b64': base64.b64encode(body).decode()}
+
+
+def _decode_body(record: Dict) -> bytes:
+    if 'body_b64' in record:
+        return base64.b64decode(record['body_b64'])
+    return record['body'].encode('utf-8')
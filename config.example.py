@@ -9,15 +9,75 @@ iOS 日历同步到 Google Calendar 的配置文件
 # iCloud 配置
 ICLOUD_USERNAME = "your_apple_id@example.com"  # 你的 Apple ID
 ICLOUD_APP_PASSWORD = "xxxx-xxxx-xxxx-xxxx"    # Apple 应用专用密码 (在 appleid.apple.com 生成)
+ICLOUD_MAX_WORKERS = 4                         # 并发读取的日历数上限
+ICLOUD_FETCH_TIMEOUT = 120                     # 单个日历读取超时（秒）
+ICLOUD_RECURRENCE_AWARE = False                # 按 RRULE 同步重复事件（主体 + 例外实例），不展开为单次事件
+ICLOUD_PARSE_CACHE_FILE = None                 # 解析缓存文件，未变化的事件跳过解析，None 时不缓存；
+                                               # 建议放在 iCloud Drive 之外，如 "~/Library/Caches/ios-to-google/parse_cache.db"
+ICLOUD_PARSE_CACHE_SIZE = 50000                # 解析缓存最多保留的条目数
+ICLOUD_PARSE_WORKERS = 0                       # 解析进程数，首次同步大量历史事件时并行解析（0 为在本进程解析）
+ICLOUD_PARSE_CHUNK_SIZE = 100                  # 每次交给解析进程的事件数
+# ICLOUD_FAST_PARSE = True                     # 按行快速提取事件属性，不能处理的自动改用 icalendar 解析
 
 # Google Calendar 配置
 GOOGLE_CREDENTIALS_FILE = "credentials.json"   # Google API 凭证文件
 GOOGLE_TOKEN_FILE = "token.json"               # 授权后自动生成的 token 文件
 GOOGLE_CALENDAR_ID = "primary"                 # 使用主日历，或指定特定日历 ID
+GOOGLE_BATCH_WRITES = False                    # 使用批量请求写入（每批最多 50 个操作）
+GOOGLE_PATCH_UPDATES = False                   # 修改的事件只提交变化的字段（PATCH），不整体覆盖
+GOOGLE_RATE_LIMIT = 5                          # 每秒请求数上限，被限流时自动降低
+GOOGLE_MAX_RETRIES = 5                         # 限流或服务端错误时的最大重试次数
+GOOGLE_CONCURRENCY = 10                        # 异步引擎同时进行的 Google 请求数上限
+GOOGLE_QUOTA_BUDGET = None                     # 每次同步最多执行的写入操作数，超出部分下次同步继续（None 表示不限）
 
 # 同步配置
 SYNC_START_DATE = "2026-01-01"     # 从这个日期开始同步
 SYNC_INTERVAL_MINUTES = 5          # 同步间隔（分钟）
+SYNC_ADAPTIVE_SCHEDULE = False     # 自适应调度：有变更时缩短间隔，空闲时指数退避，出错时大幅退避
+SYNC_MIN_INTERVAL_MINUTES = 1      # 自适应调度的最短间隔（分钟）
+SYNC_MAX_INTERVAL_MINUTES = 60     # 自适应调度的最长间隔（分钟）
+SYNC_INCREMENTAL = False           # 增量同步：只拉取 ctag / sync-token 有变化的事件
+SYNC_STREAMING = False             # 流水线模式：边读取 iCloud 边写入 Google（仅在非增量同步时生效）
+SYNC_WRITE_QUEUE_SIZE = 200        # 流水线模式下待写入操作的队列上限
+SYNC_ENGINE = "sync"               # 同步引擎：sync 或 async（asyncio 并发读写，需要 caldav>=3）
+
+# 分层时间窗口（仅在非增量同步时生效）
+SYNC_WINDOW_TIERS = False          # 分层读取：近期每次读取，远期隔几次读取，更早的历史事件冻结（需要 ICLOUD_RECURRENCE_AWARE = True）
+SYNC_WINDOW_PAST_DAYS = 30         # 近期窗口向过去覆盖的天数，更早的事件不再读取和删除
+SYNC_WINDOW_NEAR_DAYS = 90         # 近期窗口向未来覆盖的天数
+SYNC_WINDOW_FAR_DAYS = 365         # 远期窗口向未来覆盖的天数
+SYNC_WINDOW_FAR_EVERY = 12         # 每隔几次同步读取一次远期窗口
+
+# 多账号同步（可选）：每项为一组 iCloud 账号 -> Google 日历，未填写的设置使用上面的配置。
+# 同步状态、Google 令牌和解析缓存默认按 name 分开保存（如 sync_state_family.json、token_family.json）。
+# 首次使用某个 Google 账号时先运行 python main.py --account <name> 完成授权。
+SYNC_ACCOUNTS = [
+    # {
+    #     "name": "family",
+    #     "icloud_username": "family@icloud.com",
+    #     "icloud_app_password": "xxxx-xxxx-xxxx-xxxx",
+    #     "google_calendar_id": "primary",
+    # },
+]
+SYNC_MAX_PARALLEL_ACCOUNTS = 2     # 同时同步的账号组数（每组一个子进程）
+
+# 多台 Mac 共享（项目放在 iCloud Drive 中）
+SYNC_LEASE_TTL = None              # 同步租约有效期（秒，如 300），启用后 run_sync.sh 不再使用 .sync.lock 锁文件
+SYNC_LEASE_SETTLE = 0              # 取得租约后等待几秒再确认，覆盖 iCloud Drive 的传播延迟（共享时建议 15）
+SYNC_SHARDS = 1                    # 日历分片数：大于 1 时日历按分片分配，多台 Mac 可同时同步不同分片（需要启用租约）
+
+# 运行指标
+METRICS_FILE = None                  # 每次同步后写入的指标文件（如 "metrics.json"），None 时不写入
+METRICS_PORT = None                  # 守护进程模式下 Prometheus 指标端口（如 9464，仅监听 127.0.0.1），None 时不启动
 
 # 数据存储
 SYNC_STATE_FILE = "sync_state.json"  # 存储同步状态，用于检测变更
+SYNC_STATE_BACKEND = "json"          # 状态存储：json 或 sqlite（sqlite 保存在同名 .db 文件，自动导入 JSON；
+                                     # 项目在 iCloud Drive 中多台 Mac 共享时，SQLite 文件可能在写入中途被同步，建议配合 SYNC_LEASE_TTL 使用）
+
+# 日志
+LOG_LEVEL = "INFO"                   # 日志级别：DEBUG 时记录每个事件的读取和写入，INFO 只记录进度和汇总
+LOG_FILE = "sync-detail.log"         # 日志文件（后台线程缓冲写入、按大小轮转），None 时写到标准输出
+LOG_MAX_BYTES = 10 * 1024 * 1024     # 日志文件超过该大小时轮转
+LOG_BACKUP_COUNT = 5                 # 保留的旧日志文件数（.1 ~ .5）
+LOG_JSON = False                     # 每条日志输出为一行 JSON（包含同步统计等结构化字段）
@@ -0,0 +1,168 @@
+"""
+紧凑的事件表示 - 十万级事件时降低同步进程的内存占用
+
+- EventRecord: iCloud 事件。使用 __slots__ 而不是字典，哈希保存为 16 字节的 MD5 摘要，
+  日历名称驻留（sys.intern），同一日历的事件共用一个字符串。
+  实现只读的 Mapping 接口，event['summary']、event.get('recurrence') 等原有写法不变；
+  event['hash'] 仍返回十六进制字符串（写入 Google 私有属性、解析缓存和同步状态文件）。
+- StateEntry: 同步状态中的一条映射，JsonStateStore 在内存中使用它，
+  读写状态文件时与原 JSON 格式相互转换。
+"""
+
+import json
+import sys
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+
+def to_digest(event_hash: str) -> bytes:
+    """
+    十六进制哈希转换为摘要
+
+    空哈希（见 SyncEngine._resolve_override_deletions，表示下次同步时重新提交）
+    和无法识别的哈希转换为 b''，与任何事件的摘要都不相等。
+    """
+    try:
+        return bytes.fromhex(event_hash)
+    except (TypeError, ValueError):
+        return b''
+
+
+class EventRecord(Mapping):
+    """
+    iCloud 事件
+
+    映射接口的键与原来的事件字典一致：uid、summary、description、location、start、end、
+    is_all_day、calendar_name、last_modified、hash，重复事件另有 recurrence 和
+    recurrence_id（只在有值时出现）。
+    """
+
+    __slots__ = ('uid', 'summary', 'description', 'location', 'start', 'end', 'is_all_day',
+                 'calendar_name', 'last_modified', 'digest', 'recurrence', 'recurrence_id')
+
+    KEYS = ('uid', 'summary', 'description', 'location', 'start', 'end', 'is_all_day',
+            'calendar_name', 'last_modified', 'hash')
+    OPTIONAL_KEYS = ('recurrence', 'recurrence_id')
+    _ALL_KEYS = frozenset(KEYS + OPTIONAL_KEYS)
+
+    def __init__(self, uid: str, summary: str, description: str, location: str, start: str, end: str,
+                 is_all_day: bool, calendar_name: str, last_modified: Optional[str], digest: bytes,
+                 recurrence: Optional[List[str]] = None, recurrence_id: Optional[str] = None):
+        self.uid = uid
+        self.summary = summary
+        self.description = description
+        self.location = location
+        self.start = start
+        self.end = end
+        self.is_all_day = is_all_day
+        self.calendar_name = sys.intern(calendar_name)
+        self.last_modified = last_modified
+        self.digest = digest
+        self.recurrence = recurrence or None
+        self.recurrence_id = recurrence_id or None
+
+    @classmethod
+    def from_dict(cls, data: Dict, calendar_name: Optional[str] = None) -> 'EventRecord':
+        """由事件字典（解析缓存中保存的格式）创建，calendar_name 不为 None 时替换日历名称"""
+        return cls(
+            data['uid'], data['summary'], data['description'], data['location'],
+            data['start'], data['end'], data['is_all_day'],
+            data['calendar_name'] if calendar_name is None else calendar_name,
+            data['last_modified'], to_digest(data['hash']),
+            data.get('recurrence'), data.get('recurrence_id')
+        )
+
+    @property
+    def hash(self) -> str:
+        """十六进制哈希"""
+        return self.digest.hex()
+
+    def __getitem__(self, name: str):
+        if name not in self._ALL_KEYS:
+            raise KeyError(name)
+        value = getattr(self, 'digest' if name == 'hash' else name)
+        if name == 'hash':
+            return value.hex()
+        if value is None and name in self.OPTIONAL_KEYS:
+            raise KeyError(name)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.KEYS
+        for name in self.OPTIONAL_KEYS:
+            if getattr(self, name) is not None:
+                yield name
+
+    def __len__(self) -> int:
+        return len(self.KEYS) + sum(getattr(self, name) is not None for name in self.OPTIONAL_KEYS)
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        # 解析进程池返回的事件，日历名称重新驻留
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+        self.calendar_name = sys.intern(self.calendar_name)
+
+    def __repr__(self) -> str:
+        return f"EventRecord({self.uid!r}, {self.summary!r}, {self.start!r})"
+
+
+class StateEntry:
+    """
+    同步状态中的一条映射：Google 事件 ID 和上次同步时的摘要，以及可选的
+    master、start 和 fields（见 StateStore）。字段指纹保存为紧凑的 JSON 文本。
+    """
+
+    __slots__ = ('google_id', 'digest', 'master', 'start', 'fields')
+
+    def __init__(self, google_id: str, digest: bytes, master: Optional[str] = None,
+                 start: Optional[str] = None, fields: Optional[str] = None):
+        self.google_id = google_id
+        self.digest = digest
+        self.master = master
+        self.start = start
+        self.fields = fields
+
+    @staticmethod
+    def dump_fields(fields: Optional[Dict[str, str]]) -> Optional[str]:
+        return json.dumps(fields, sort_keys=True, separators=(',', ':')) if fields else None
+
+    @classmethod
+    def from_dict(cls, entry: Dict) -> 'StateEntry':
+        """由状态文件中的记录 {google_id, hash[, master][, start][, fields]} 创建"""
+        return cls(entry['google_id'], to_digest(entry['hash']), entry.get('master') or None,
+                   entry.get('start') or None, cls.dump_fields(entry.get('fields')))
+
+    def to_dict(self) -> Dict:
+        """转换为状态文件中的记录格式"""
+        entry = {'google_id': self.google_id, 'hash': self.digest.hex()}
+        if self.master:
+            entry['master'] = self.master
+        if self.start:
+            entry['start'] = self.start
+        if self.fields:
+            entry['fields'] = json.loads(self.fields)
+        return entry
+
+
+class DigestView(Mapping):
+    """事件键 -> 摘要 的只读视图，直接查询 StateEntry 映射，不复制"""
+
+    __slots__ = ('entries',)
+
+    def __init__(self, entries: Dict[str, StateEntry]):
+        self.entries = entries
+
+    def __getitem__(self, key: str) -> bytes:
+        return self.entries[key].digest
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -2,63 +2,148 @@
 Google Calendar API 操作模块
 """
 
+import base64
+import hashlib
+import json
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from google.auth.transport.requests import Request
+import httplib2
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from metrics import metrics
+from rate_limiter import RateLimiter
+from sync_log import get_logger
+
+
+log = get_logger(__name__)
 
 
 # Google Calendar API 权限范围
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# 写入请求只需要返回事件 ID
+WRITE_FIELDS = 'id'
+
+# base32 字母表 -> Google 事件 ID 允许的 base32hex 字母表（小写 a-v 和 0-9）
+BASE32HEX = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ234567', '0123456789abcdefghijklmnopqrstuv')
+
+
+def google_event_id(event_data: Dict) -> str:
+    """
+    由 iCloud UID（例外实例再加上 RECURRENCE-ID）确定的 Google 事件 ID
+
+    创建时由客户端指定 ID，中途崩溃后重新创建同一事件会得到 409，
+    不会在 Google 中产生重复事件。
+    """
+    source = event_data['uid']
+    if event_data.get('recurrence_id'):
+        source += '#' + event_data['recurrence_id']
+    # SHA-1 的 160 位正好编码为 32 个字符，没有填充
+    return base64.b32encode(hashlib.sha1(source.encode()).digest()).decode().translate(BASE32HEX)
+
+# 按字段记录指纹、PATCH 时单独提交的字段（time 包含 start 和 end）；
+# extendedProperties 中的同步属性每次 PATCH 都提交
+PATCH_FIELDS = ('summary', 'description', 'location', 'time', 'recurrence')
+
 
 class GoogleCalendar:
     """Google Calendar 客户端"""
 
-    def __init__(self, credentials_file: str, token_file: str, calendar_id: str = 'primary'):
+    # Google Calendar 批量请求每批最多 50 个子请求
+    BATCH_SIZE = 50
+
+    # 访问令牌剩余有效期少于该秒数时才刷新
+    TOKEN_REFRESH_MARGIN = 300
+
+    def __init__(self, credentials_file: str, token_file: str, calendar_id: str = 'primary',
+                 rate_limit: float = 5.0, max_retries: int = 5, cassette=None):
         self.credentials_file = credentials_file
         self.token_file = token_file
         self.calendar_id = calendar_id
         self.service = None
         self.creds = None
+        self.cassette = cassette    # HTTP 录制 / 回放（见 cassette.py）
+        # 所有请求共用的限流器，rate_limit 为每秒请求数上限
+        self.limiter = RateLimiter(
+            rate=rate_limit,
+            burst=max(1, int(rate_limit * 2)),
+            max_retries=max_retries
+        )
 
     def connect(self) -> bool:
         """连接到 Google Calendar API"""
+        if self.cassette and self.cassette.replaying:
+            # 回放不需要凭证
+            self.service = build('calendar', 'v3', http=self.cassette.wrap_http(),
+                                 static_discovery=True, cache_discovery=False)
+            log.info("Google Calendar: 使用 HTTP 回放记录")
+            return True
+
         try:
             # 尝试加载已保存的凭证
             if os.path.exists(self.token_file):
                 self.creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
 
-            # 如果凭证无效或不存在，进行认证
-            if not self.creds or not self.creds.valid:
-                if self.creds and self.creds.expired and self.creds.refresh_token:
-                    print("正在刷新 Google 凭证...")
-                    self.creds.refresh(Request())
-                else:
-                    print("正在进行 Google 授权，请在浏览器中完成登录...")
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        self.credentials_file, SCOPES
-                    )
-                    self.creds = flow.run_local_server(port=0)
-
-                # 保存凭证供下次使用
-                with open(self.token_file, 'w') as token:
-                    token.write(self.creds.to_json())
-                print(f"凭证已保存到 {self.token_file}")
-
-            # 创建服务
-            self.service = build('calendar', 'v3', credentials=self.creds)
-            print("成功连接到 Google Calendar")
+            # 令牌快过期时才刷新，否则直接使用保存的令牌
+            if self.creds and self.creds.refresh_token and self._expires_soon(self.creds):
+                log.info("正在刷新 Google 凭证...")
+                self.refresh_credentials()
+                self._save_credentials()
+            elif not self.creds or not self.creds.valid:
+                # 授权流程只在首次运行时需要，按需导入
+                from google_auth_oauthlib.flow import InstalledAppFlow
+
+                log.info("正在进行 Google 授权，请在浏览器中完成登录...")
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    self.credentials_file, SCOPES
+                )
+                self.creds = flow.run_local_server(port=0)
+                self._save_credentials()
+
+            # 创建服务：使用随库发布的 discovery 文档，不再请求网络
+            if self.cassette:
+                from google_auth_httplib2 import AuthorizedHttp
+                from googleapiclient.http import build_http
+
+                http = AuthorizedHttp(self.creds, http=self.cassette.wrap_http(build_http()))
+                self.service = build('calendar', 'v3', http=http,
+                                     static_discovery=True, cache_discovery=False)
+            else:
+                self.service = build('calendar', 'v3', credentials=self.creds,
+                                     static_discovery=True, cache_discovery=False)
+            log.info("成功连接到 Google Calendar")
             return True
 
         except Exception as e:
-            print(f"连接 Google Calendar 失败: {e}")
+            log.error("连接 Google Calendar 失败: %s", e)
+            return False
+
+    def refresh_credentials(self):
+        """刷新访问令牌（requests 传输层较重，按需导入）"""
+        from google.auth.transport.requests import Request
+        self.creds.refresh(Request())
+
+    def _save_credentials(self):
+        """保存凭证供下次使用"""
+        with open(self.token_file, 'w') as token:
+            token.write(self.creds.to_json())
+        log.info("凭证已保存到 %s", self.token_file)
+
+    def _expires_soon(self, creds: Credentials) -> bool:
+        """访问令牌不存在，或剩余有效期少于 TOKEN_REFRESH_MARGIN 秒"""
+        if not creds.token:
+            return True
+        if creds.expiry is None:
             return False
+        # google-auth 的 expiry 是不带时区的 UTC 时间
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now < timedelta(seconds=self.TOKEN_REFRESH_MARGIN)
 
     def get_events(self, start_date: datetime, end_date: Optional[datetime] = None) -> List[Dict]:
         """
@@ -89,13 +174,13 @@ class GoogleCalendar:
                 time_max = end_date.isoformat() + 'Z' if end_date.tzinfo is None else end_date.isoformat()
                 params['timeMax'] = time_max
 
-            events_result = self.service.events().list(**params).execute()
+            events_result = self._execute(self.service.events().list(**params))
             events = events_result.get('items', [])
 
             return events
 
         except HttpError as e:
-            print(f"获取 Google 日历事件失败: {e}")
+            log.error("获取 Google 日历事件失败: %s", e)
             return []
 
     def create_event(self, event_data: Dict) -> Optional[str]:
@@ -111,19 +196,23 @@ class GoogleCalendar:
         if not self.service:
             raise Exception("未连接到 Google Calendar")
 
+        google_event = self._convert_to_google_event(event_data)
+        google_event['id'] = google_event_id(event_data)
         try:
-            google_event = self._convert_to_google_event(event_data)
-            created_event = self.service.events().insert(
+            created_event = self._execute(self.service.events().insert(
                 calendarId=self.calendar_id,
-                body=google_event
-            ).execute()
+                body=google_event,
+                fields=WRITE_FIELDS
+            ))
 
-            event_id = created_event.get('id')
-            print(f"创建事件成功: {event_data['summary']} (ID: {event_id})")
-            return event_id
+            created_id = created_event.get('id')
+            log.debug("创建事件成功: %s (ID: %s)", event_data['summary'], created_id)
+            return created_id
 
         except HttpError as e:
-            print(f"创建事件失败: {e}")
+            if e.resp.status == 409:
+                return self._recreate([(google_event['id'], event_data)]).get(google_event['id'])
+            log.warning("创建事件失败: %s", e)
             return None
 
     def update_event(self, event_id: str, event_data: Dict) -> bool:
@@ -142,17 +231,48 @@ class GoogleCalendar:
 
         try:
             google_event = self._convert_to_google_event(event_data)
-            self.service.events().update(
+            self._execute(self.service.events().update(
+                calendarId=self.calendar_id,
+                eventId=event_id,
+                body=google_event,
+                fields=WRITE_FIELDS
+            ))
+
+            log.debug("更新事件成功: %s", event_data['summary'])
+            return True
+
+        except HttpError as e:
+            log.warning("更新事件失败: %s", e)
+            return False
+
+    def patch_event(self, event_id: str, event_data: Dict, changed: Iterable[str]) -> bool:
+        """
+        只更新变化的字段
+
+        Args:
+            event_id: Google 事件 ID
+            event_data: 新的事件数据
+            changed: 变化的字段（PATCH_FIELDS 中的名称，见 field_fingerprints）
+
+        Returns:
+            是否成功
+        """
+        if not self.service:
+            raise Exception("未连接到 Google Calendar")
+
+        try:
+            self._execute(self.service.events().patch(
                 calendarId=self.calendar_id,
                 eventId=event_id,
-                body=google_event
-            ).execute()
+                body=self._patch_body(event_data, changed),
+                fields=WRITE_FIELDS
+            ))
 
-            print(f"更新事件成功: {event_data['summary']}")
+            log.debug("更新事件成功: %s", event_data['summary'])
             return True
 
         except HttpError as e:
-            print(f"更新事件失败: {e}")
+            log.warning("更新事件失败: %s", e)
             return False
 
     def delete_event(self, event_id: str) -> bool:
@@ -169,21 +289,323 @@ class GoogleCalendar:
             raise Exception("未连接到 Google Calendar")
 
         try:
-            self.service.events().delete(
+            self._execute(self.service.events().delete(
                 calendarId=self.calendar_id,
                 eventId=event_id
-            ).execute()
+            ))
 
-            print(f"删除事件成功: {event_id}")
+            log.debug("删除事件成功: %s", event_id)
             return True
 
         except HttpError as e:
             if e.resp.status == 404:
-                print(f"事件已不存在: {event_id}")
+                log.debug("事件已不存在: %s", event_id)
                 return True
-            print(f"删除事件失败: {e}")
+            log.warning("删除事件失败: %s", e)
             return False
 
+    def batch_create_events(self, events: List[Tuple[str, Dict]]) -> Dict[str, Optional[str]]:
+        """
+        批量创建事件
+
+        Args:
+            events: (键, 事件数据) 列表，键用于对应返回结果
+
+        Returns:
+            键 -> 创建的事件 ID（失败为 None）
+        """
+        if not self.service:
+            raise Exception("未连接到 Google Calendar")
+
+        requests = [
+            (key, self.service.events().insert(
+                calendarId=self.calendar_id,
+                body=dict(self._convert_to_google_event(event), id=google_event_id(event)),
+                fields=WRITE_FIELDS
+            ))
+            for key, event in events
+        ]
+
+        results = {}
+        existing = []
+        events = dict(events)
+        for key, (response, error) in self._execute_batch(requests).items():
+            if isinstance(error, HttpError) and error.resp.status == 409:
+                existing.append(key)
+            elif error:
+                log.warning("创建事件失败: %s (%s)", events[key]['summary'], error)
+                results[key] = None
+            else:
+                created_id = response.get('id')
+                log.debug("创建事件成功: %s (ID: %s)", events[key]['summary'], created_id)
+                results[key] = created_id
+
+        if existing:
+            recreated = self._recreate([(google_event_id(events[key]), events[key]) for key in existing])
+            for key in existing:
+                results[key] = recreated.get(google_event_id(events[key]))
+        return results
+
+    def _recreate(self, events: List[Tuple[str, Dict]]) -> Dict[str, Optional[str]]:
+        """
+        创建时 ID 已存在（409）：之前的创建已成功但没有记录到同步状态，或事件在
+        Google 中被删除过（ID 仍被占用），改为整体更新并恢复为未取消状态
+
+        Args:
+            events: (Google 事件 ID, 事件数据) 列表
+
+        Returns:
+            Google 事件 ID -> 该 ID（成功）或 None（失败）
+        """
+        for google_id, event in events:
+            log.info("事件已存在，改为更新: %s (ID: %s)", event['summary'], google_id)
+        requests = [
+            (google_id, self.service.events().update(
+                calendarId=self.calendar_id,
+                eventId=google_id,
+                body=dict(self._convert_to_google_event(event), status='confirmed'),
+                fields=WRITE_FIELDS
+            ))
+            for google_id, event in events
+        ]
+        if len(requests) == 1:
+            google_id, request = requests[0]
+            try:
+                self._execute(request)
+                return {google_id: google_id}
+            except HttpError as e:
+                log.warning("更新事件失败: %s", e)
+                return {google_id: None}
+        updated = self._update_results(requests, {google_id: event['summary'] for google_id, event in events})
+        return {google_id: google_id if success else None for google_id, success in updated.items()}
+
+    def batch_update_events(self, updates: List[Tuple[str, Dict]]) -> Dict[str, bool]:
+        """
+        批量更新事件
+
+        Args:
+            updates: (Google 事件 ID, 新的事件数据) 列表
+
+        Returns:
+            Google 事件 ID -> 是否成功
+        """
+        if not self.service:
+            raise Exception("未连接到 Google Calendar")
+
+        requests = [
+            (event_id, self.service.events().update(
+                calendarId=self.calendar_id,
+                eventId=event_id,
+                body=self._convert_to_google_event(event),
+                fields=WRITE_FIELDS
+            ))
+            for event_id, event in updates
+        ]
+        return self._update_results(requests, {event_id: event['summary'] for event_id, event in updates})
+
+    def batch_patch_events(self, patches: List[Tuple[str, Dict, List[str]]]) -> Dict[str, bool]:
+        """
+        批量更新事件的变化字段
+
+        Args:
+            patches: (Google 事件 ID, 新的事件数据, 变化的字段) 列表
+
+        Returns:
+            Google 事件 ID -> 是否成功
+        """
+        if not self.service:
+            raise Exception("未连接到 Google Calendar")
+
+        requests = [
+            (event_id, self.service.events().patch(
+                calendarId=self.calendar_id,
+                eventId=event_id,
+                body=self._patch_body(event, changed),
+                fields=WRITE_FIELDS
+            ))
+            for event_id, event, changed in patches
+        ]
+        return self._update_results(requests, {event_id: event['summary'] for event_id, event, _ in patches})
+
+    def _update_results(self, requests: List[Tuple[str, HttpRequest]], summaries: Dict[str, str]) -> Dict[str, bool]:
+        """执行批量更新请求并打印结果"""
+        results = {}
+        for event_id, (_, error) in self._execute_batch(requests).items():
+            if error:
+                log.warning("更新事件失败: %s (%s)", summaries[event_id], error)
+                results[event_id] = False
+            else:
+                log.debug("更新事件成功: %s", summaries[event_id])
+                results[event_id] = True
+        return results
+
+    def batch_delete_events(self, event_ids: List[str]) -> Dict[str, bool]:
+        """
+        批量删除事件
+
+        Args:
+            event_ids: Google 事件 ID 列表
+
+        Returns:
+            Google 事件 ID -> 是否成功
+        """
+        if not self.service:
+            raise Exception("未连接到 Google Calendar")
+
+        requests = [
+            (event_id, self.service.events().delete(
+                calendarId=self.calendar_id,
+                eventId=event_id
+            ))
+            for event_id in event_ids
+        ]
+
+        results = {}
+        for event_id, (_, error) in self._execute_batch(requests).items():
+            if error is None:
+                log.debug("删除事件成功: %s", event_id)
+                results[event_id] = True
+            elif isinstance(error, HttpError) and error.resp.status == 404:
+                log.debug("事件已不存在: %s", event_id)
+                results[event_id] = True
+            else:
+                log.warning("删除事件失败: %s", error)
+                results[event_id] = False
+        return results
+
+    def _execute(self, request: HttpRequest) -> Dict:
+        """
+        执行单个 API 请求
+
+        先经过限流器，遇到限流（403 rateLimitExceeded / 429）或服务端错误（5xx）时
+        按指数退避重试，重试次数用尽或其他错误时抛出原异常。
+        """
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                with metrics.timer('google_request_seconds', method=request.method):
+                    response = request.execute()
+                self.limiter.on_success()
+                return response
+            except Exception as e:
+                self._record_error(e)
+                if not self._is_retryable(e) or attempt >= self.limiter.max_retries:
+                    raise
+                self._before_retry(e, attempt)
+                attempt += 1
+
+    def _execute_batch(self, requests: List[Tuple[str, HttpRequest]]) -> Dict[str, Tuple[Optional[Dict], Optional[Exception]]]:
+        """
+        分批执行请求，每个子请求单独返回结果
+
+        每批按子请求数取令牌；被限流或服务端出错的子请求退避后重新组批重试。
+
+        Args:
+            requests: (键, HttpRequest) 列表
+
+        Returns:
+            键 -> (响应, 异常)，成功时异常为 None
+        """
+        results = {}
+
+        for i in range(0, len(requests), self.BATCH_SIZE):
+            pending = requests[i:i + self.BATCH_SIZE]
+            attempt = 0
+
+            while pending:
+                self.limiter.acquire(len(pending))
+                chunk_results = self._send_batch(pending)
+
+                retry = []
+                retry_error = None
+                for key, request in pending:
+                    response, error = chunk_results[key]
+                    if error is not None:
+                        self._record_error(error)
+                    if error is not None and self._is_retryable(error) and attempt < self.limiter.max_retries:
+                        retry.append((key, request))
+                        retry_error = error
+                    else:
+                        if error is None:
+                            self.limiter.on_success()
+                        results[key] = (response, error)
+
+                if retry:
+                    self._before_retry(retry_error, attempt, len(retry))
+                    attempt += 1
+                pending = retry
+
+        return results
+
+    def _send_batch(self, requests: List[Tuple[str, HttpRequest]]) -> Dict[str, Tuple[Optional[Dict], Optional[Exception]]]:
+        """发送一次批量请求"""
+        results = {}
+        keys = {}
+
+        def callback(request_id, response, exception):
+            results[keys[request_id]] = (response, exception)
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for n, (key, request) in enumerate(requests):
+            request_id = str(n)
+            keys[request_id] = key
+            batch.add(request, request_id=request_id)
+
+        try:
+            # 同一批中的子请求类型相同，按 BATCH:<方法> 区分创建、更新和删除
+            with metrics.timer('google_request_seconds', method=f'BATCH:{requests[0][1].method}'):
+                batch.execute()
+        except Exception as e:
+            # 整批请求失败（如网络错误），未返回结果的子请求都记为失败
+            log.error("批量请求失败: %s", e)
+            for key, _ in requests:
+                results.setdefault(key, (None, e))
+
+        return results
+
+    def _before_retry(self, error: Exception, attempt: int, count: int = 1):
+        """记录限流/重试并退避等待"""
+        if self._is_throttle(error):
+            self.limiter.on_throttle()
+            metrics.inc('google_throttles_total')
+        for _ in range(count):
+            self.limiter.on_retry()
+        metrics.inc('google_retries_total', count)
+
+        delay = self.limiter.backoff(attempt)
+        log.warning("请求失败，%.1f 秒后重试（第 %s 次）: %s", delay, attempt + 1, error)
+        time.sleep(delay)
+
+    @staticmethod
+    def _record_error(error: Exception):
+        """按状态码记录失败的请求，网络错误记为 network"""
+        status = error.resp.status if isinstance(error, HttpError) else 'network'
+        metrics.inc('google_request_errors_total', status=status)
+
+    @staticmethod
+    def _is_throttle(error: Exception) -> bool:
+        """是否为限流错误（429，或 403 且原因为 rateLimitExceeded / userRateLimitExceeded）"""
+        if not isinstance(error, HttpError):
+            return False
+        if error.resp.status == 429:
+            return True
+        if error.resp.status == 403:
+            content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+            return 'rateLimitExceeded' in content or 'userRateLimitExceeded' in content
+        return False
+
+    @classmethod
+    def _is_retryable(cls, error: Exception) -> bool:
+        """是否值得重试：限流、服务端错误或网络错误"""
+        if isinstance(error, HttpError):
+            return cls._is_throttle(error) or error.resp.status >= 500
+        return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+    def get_request_stats(self) -> Dict:
+        """请求、限流、重试计数和当前速率"""
+        return self.limiter.stats()
+
     def find_event_by_icloud_uid(self, icloud_uid: str) -> Optional[Dict]:
         """
         通过 iCloud UID 查找 Google Calendar 中的对应事件
@@ -199,20 +621,109 @@ class GoogleCalendar:
 
         try:
             # 使用 extendedProperties 搜索
-            events_result = self.service.events().list(
+            events_result = self._execute(self.service.events().list(
                 calendarId=self.calendar_id,
                 privateExtendedProperty=f'icloud_uid={icloud_uid}',
                 singleEvents=True,
                 maxResults=1
-            ).execute()
+            ))
 
             events = events_result.get('items', [])
             return events[0] if events else None
 
         except HttpError as e:
-            print(f"搜索事件失败: {e}")
+            log.warning("搜索事件失败: %s", e)
             return None
 
+    def iter_synced_events(self) -> Iterator[Dict]:
+        """
+        分页读取日历中由本工具同步的事件（带 icloud_uid 私有属性）
+
+        不展开重复事件，返回重复事件主体和修改过的实例；每页最多 2500 个，
+        只请求对账需要的字段。
+
+        Yields:
+            Google 事件（id、start、recurringEventId、extendedProperties）
+        """
+        if not self.service:
+            raise Exception("未连接到 Google Calendar")
+
+        page_token = None
+        while True:
+            params = {
+                'calendarId': self.calendar_id,
+                'singleEvents': False,
+                'maxResults': 2500,
+                'fields': 'nextPageToken,items(id,status,start,recurringEventId,extendedProperties/private)'
+            }
+            if page_token:
+                params['pageToken'] = page_token
+            result = self._execute(self.service.events().list(**params))
+
+            for item in result.get('items', []):
+                if item.get('status') == 'cancelled':
+                    continue
+                if item.get('extendedProperties', {}).get('private', {}).get('icloud_uid'):
+                    yield item
+
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+
+    def instance_id(self, recurring_event_id: str, event_data: Dict) -> str:
+        """
+        计算重复事件某个实例的 Google 事件 ID
+
+        Args:
+            recurring_event_id: 重复事件主体的 Google 事件 ID
+            event_data: 带 recurrence_id 的例外实例数据
+
+        Returns:
+            实例 ID，格式为 {主体 ID}_{YYYYMMDD} 或 {主体 ID}_{YYYYMMDDTHHMMSSZ}
+        """
+        recurrence_id = event_data['recurrence_id']
+        if len(recurrence_id) == 10:
+            # 全天事件的 RECURRENCE-ID 是日期
+            return f"{recurring_event_id}_{recurrence_id.replace('-', '')}"
+
+        original_start = datetime.fromisoformat(recurrence_id).astimezone(timezone.utc)
+        return f"{recurring_event_id}_{original_start.strftime('%Y%m%dT%H%M%SZ')}"
+
+    def field_fingerprints(self, event_data: Dict) -> Dict[str, str]:
+        """
+        按字段计算写入 Google 的内容指纹，保存在同步状态中
+
+        与上次写入的指纹比较即可得到变化的字段（见 patch_event）。
+        """
+        google_event = self._convert_to_google_event(event_data)
+        values = {
+            'summary': google_event['summary'],
+            'description': google_event['description'],
+            'location': google_event['location'],
+            'time': [google_event['start'], google_event['end']],
+            'recurrence': google_event.get('recurrence'),
+        }
+        return {
+            name: hashlib.md5(json.dumps(value, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:8]
+            for name, value in values.items()
+        }
+
+    def _patch_body(self, event_data: Dict, changed: Iterable[str]) -> Dict:
+        """PATCH 请求体：变化的字段和同步属性"""
+        google_event = self._convert_to_google_event(event_data)
+        body = {'extendedProperties': google_event['extendedProperties']}
+        for name in changed:
+            if name == 'time':
+                # PATCH 会合并 start/end 对象，在全天和非全天之间切换时需要清除另一种格式
+                for edge in ('start', 'end'):
+                    body[edge] = dict({'date': None, 'dateTime': None, 'timeZone': None}, **google_event[edge])
+            elif name == 'recurrence':
+                # 不再重复时清空重复规则
+                body['recurrence'] = google_event.get('recurrence') or None
+            else:
+                body[name] = google_event[name]
+        return body
+
     def _convert_to_google_event(self, event_data: Dict) -> Dict:
         """将 iCloud 事件数据转换为 Google Calendar 格式"""
         google_event = {
@@ -242,6 +753,12 @@ class GoogleCalendar:
                 'timeZone': 'Asia/Shanghai'
             }
 
+        # 重复事件：主体带重复规则，例外实例记录 RECURRENCE-ID
+        if event_data.get('recurrence'):
+            google_event['recurrence'] = event_data['recurrence']
+        if event_data.get('recurrence_id'):
+            google_event['extendedProperties']['private']['icloud_recurrence_id'] = event_data['recurrence_id']
+
         return google_event
 
 
@@ -256,7 +773,7 @@ if __name__ == "__main__":
     )
 
     if client.connect():
-        from datetime import datetime
+        from datetime import datetime, timezone
         events = client.get_events(datetime(2026, 1, 1))
         print(f"找到 {len(events)} 个事件")
         for event in events[:5]:
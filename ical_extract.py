@@ -0,0 +1,193 @@
+"""
+快速 VEVENT 提取 - 按行扫描 iCalendar 文本，只取同步需要的属性
+
+同步只用到 VEVENT 的 UID、SUMMARY、DESCRIPTION、LOCATION、DTSTART、DTEND 和
+LAST-MODIFIED，用 icalendar 解析要为整个对象建立组件树、为每个属性创建值对象。
+这里直接按行扫描：展开折行、还原转义、识别 TZID 和 VALUE=DATE，
+其余属性只检查组件结构，不解析。
+
+结果与 icalendar 的解析结果一致（见 ICloudCalendar._parse_data）。遇到不能确定
+结果一致的情况时抛出 Unsupported，由调用方改用 icalendar 解析：
+- 不是 str（字节串、其他编码）
+- 组件结构异常、属性行无法识别、需要的属性重复出现
+- 带引号或反斜杠的参数、ENCODING 等其他参数
+- TZID 不是 IANA 时区名（Windows 时区名、自定义 VTIMEZONE 等取决于 VTIMEZONE 定义的情况）
+- 识别重复事件时出现 RRULE / RDATE / EXDATE / RECURRENCE-ID
+"""
+
+import re
+import zoneinfo
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+
+# 折行：换行后跟一个空格或制表符（与 icalendar 的展开规则相同）
+_UNFOLD = re.compile(r"(?:(?<!\n)\r\n|(?<![\r\n])\n)(?:\r?\n)*[ \t]")
+_NEWLINE = re.compile(r"\r?\n")
+
+# 属性名和紧随其后的分隔符（参数或值）
+_NAME = re.compile(r"([A-Za-z0-9-]+)([;:])")
+_PARAM = re.compile(r"([A-Za-z0-9-]+)=([^;:,\"\\^ \t]*)\Z")
+
+# TEXT 值的转义：\\ \, \; \: \n \N
+_ESCAPE = re.compile(r"\\([\\,;:nN])")
+
+_DATE = re.compile(r"([0-9]{4})([0-9]{2})([0-9]{2})\Z")
+_DATETIME = re.compile(r"([0-9]{4})([0-9]{2})([0-9]{2})T([0-9]{2})([0-9]{2})([0-9]{2})(Z?)\Z")
+
+TEXT_PROPERTIES = frozenset(('UID', 'SUMMARY', 'DESCRIPTION', 'LOCATION'))
+TIME_PROPERTIES = frozenset(('DTSTART', 'DTEND', 'LAST-MODIFIED'))
+RECURRENCE_PROPERTIES = frozenset(('RRULE', 'RDATE', 'EXDATE', 'RECURRENCE-ID'))
+
+_zones: Optional[frozenset] = None
+
+
+class Unsupported(Exception):
+    """无法确定提取结果与 icalendar 一致，应改用 icalendar 解析"""
+
+
+def extract_vevents(data, recurrence_aware: bool = False) -> List[Dict]:
+    """
+    提取 VCALENDAR 中直接包含的 VEVENT
+
+    Args:
+        data: iCalendar 文本
+        recurrence_aware: 是否识别重复事件（为 True 时遇到重复规则和例外实例抛出 Unsupported）
+
+    Returns:
+        每个 VEVENT 一个字典，按出现顺序；键为属性名（大写），TEXT 属性的值为还原转义后的
+        字符串，时间属性的值为 date / datetime，没有出现的属性不在字典中
+
+    Raises:
+        Unsupported: 需要改用 icalendar 解析
+    """
+    if not isinstance(data, str):
+        raise Unsupported('not str')
+
+    events = []
+    stack = []
+    current = None
+    closed = False
+    for line in _NEWLINE.split(_UNFOLD.sub('', data)):
+        if not line:
+            continue
+        match = _NAME.match(line)
+        if not match:
+            raise Unsupported(line)
+        name = match.group(1).upper()
+
+        if name == 'BEGIN' or name == 'END':
+            if match.group(2) != ':':
+                raise Unsupported(line)
+            component = line[match.end():].upper()
+            if name == 'BEGIN':
+                if closed or (not stack and component != 'VCALENDAR'):
+                    raise Unsupported(line)
+                if component == 'VEVENT':
+                    if stack != ['VCALENDAR']:
+                        raise Unsupported(line)
+                    current = {}
+                stack.append(component)
+            else:
+                if not stack or stack.pop() != component:
+                    raise Unsupported(line)
+                if component == 'VEVENT':
+                    events.append(current)
+                    current = None
+                closed = not stack
+            continue
+
+        if not stack:
+            raise Unsupported(line)
+        if current is None or len(stack) != 2:
+            # 不是 VEVENT 自身的属性（VTIMEZONE、VALARM 等）
+            continue
+        if name in TEXT_PROPERTIES or name in TIME_PROPERTIES:
+            if name in current:
+                raise Unsupported(line)
+            params, value = _split(line, match)
+            if name in TEXT_PROPERTIES:
+                current[name] = _text(params, value)
+            else:
+                current[name] = _time(name, params, value)
+        elif recurrence_aware and name in RECURRENCE_PROPERTIES:
+            raise Unsupported(line)
+
+    if stack:
+        raise Unsupported('unterminated component')
+    return events
+
+
+def _split(line: str, match) -> Tuple[Dict[str, str], str]:
+    """拆分属性行的参数和值"""
+    separator = line.find(':')
+    if separator < 0:
+        raise Unsupported(line)
+    head = line[:separator]
+    if '"' in head or '\\' in head:
+        raise Unsupported(line)
+
+    params = {}
+    if match.group(2) == ';':
+        for part in head[match.end():].split(';'):
+            param = _PARAM.match(part)
+            if not param:
+                raise Unsupported(line)
+            key = param.group(1).upper()
+            if key in params:
+                raise Unsupported(line)
+            params[key] = param.group(2)
+    return params, line[separator + 1:]
+
+
+def _text(params: Dict[str, str], value: str) -> str:
+    """TEXT 属性：只接受 LANGUAGE 和 X- 参数"""
+    for key in params:
+        if key != 'LANGUAGE' and not key.startswith('X-'):
+            raise Unsupported(key)
+    return _ESCAPE.sub(lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def _time(name: str, params: Dict[str, str], value: str):
+    """
+    时间属性：YYYYMMDD（全天）、YYYYMMDDTHHMMSS（浮动时间或带 TZID）、YYYYMMDDTHHMMSSZ（UTC）
+    """
+    if name == 'LAST-MODIFIED' and params:
+        raise Unsupported(name)
+    if set(params) - {'TZID', 'VALUE'}:
+        raise Unsupported(name)
+    kind = params.get('VALUE')
+    tzid = params.get('TZID')
+
+    match = _DATE.match(value)
+    if match:
+        # 带 TZID 的日期在各版本 icalendar 中的处理不同
+        if tzid is not None or kind not in (None, 'DATE'):
+            raise Unsupported(name)
+        try:
+            return date(*map(int, match.groups()))
+        except ValueError:
+            raise Unsupported(value)
+
+    match = _DATETIME.match(value)
+    if not match or kind not in (None, 'DATE-TIME'):
+        raise Unsupported(name)
+    utc = match.group(7)
+    if tzid is not None:
+        if utc or tzid not in _known_zones():
+            raise Unsupported(tzid)
+        tzinfo = zoneinfo.ZoneInfo(tzid)
+    else:
+        tzinfo = timezone.utc if utc else None
+    try:
+        return datetime(*map(int, match.groups()[:6]), tzinfo=tzinfo)
+    except ValueError:
+        raise Unsupported(value)
+
+
+def _known_zones() -> frozenset:
+    """IANA 时区名（icalendar 对这些 TZID 使用系统时区库，不使用 VTIMEZONE 中的定义）"""
+    global _zones
+    if _zones is None:
+        _zones = frozenset(zoneinfo.available_timezones())
+    return _zones
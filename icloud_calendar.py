@@ -3,11 +3,50 @@ iCloud CalDAV 日历读取模块
 """
 
 import caldav
+from caldav.elements import dav
+from caldav.elements.base import ValuedBaseElement
+from caldav.lib.error import NotFoundError
 from icalendar import Calendar
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import copy
 from datetime import datetime, timedelta
 from dateutil import tz
 import hashlib
-from typing import List, Dict, Optional
+from itertools import islice
+import time
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple
+from urllib.parse import unquote, urlparse
+
+from event_record import EventRecord
+from ical_extract import Unsupported, extract_vevents
+from metrics import metrics
+from parse_cache import ParseCache
+from parse_pool import ParsePool
+from sync_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+def event_key(event: Dict) -> str:
+    """
+    事件在同步状态中的键
+
+    普通事件和重复事件的主体使用 UID，重复事件的例外实例使用 UID#RECURRENCE-ID。
+    """
+    recurrence_id = event.get('recurrence_id')
+    return f"{event['uid']}#{recurrence_id}" if recurrence_id else event['uid']
+
+
+def calendar_shard(calendar_href: str, count: int) -> int:
+    """日历所属的分片序号，由日历 href 决定，各台机器上一致"""
+    return int(hashlib.sha1(calendar_href.encode()).hexdigest()[:8], 16) % count
+
+
+class GetCtag(ValuedBaseElement):
+    """CalendarServer 扩展属性 getctag，日历内任一事件变化都会改变它"""
+    tag = "{http://calendarserver.org/ns/}getctag"
 
 
 class ICloudCalendar:
@@ -15,11 +54,50 @@ class ICloudCalendar:
 
     CALDAV_URL = "https://caldav.icloud.com"
 
-    def __init__(self, username: str, app_password: str):
+    # calendar-multiget 每次请求的最大事件数
+    MULTIGET_BATCH_SIZE = 100
+
+    # 解析结果格式版本，修改 _parse_vevent / _generate_event_hash 的输入或输出时递增，
+    # 使解析缓存失效
+    PARSER_VERSION = 1
+
+    def __init__(self, username: str, app_password: str,
+                 max_workers: int = 4, fetch_timeout: Optional[float] = 120,
+                 recurrence_aware: bool = False, parse_cache_file: Optional[str] = None,
+                 parse_cache_size: int = 50000, parse_workers: int = 0, parse_chunk_size: int = 100,
+                 fast_parse: bool = True, cassette=None):
         self.username = username
         self.app_password = app_password
+        self.recurrence_aware = recurrence_aware  # 不展开重复事件，同步 RRULE 主体和例外实例
+        self.parse_cache = None
+        if parse_cache_file:
+            self.parse_cache = ParseCache(
+                parse_cache_file,
+                version=f"{self.PARSER_VERSION}|{self.recurrence_aware}",
+                max_entries=parse_cache_size
+            )
+        # 解析进程池（见 parse_pool.py），进程数不超过 1 时在本进程解析
+        self.parse_pool = ParsePool(parse_workers, parse_chunk_size) if parse_workers > 1 else None
+        self.fast_parse = fast_parse    # 先用按行提取（见 ical_extract.py），不能处理时用 icalendar 解析
+        self.max_workers = max_workers      # 并发读取的日历数上限
+        self.fetch_timeout = fetch_timeout  # 单个日历读取超时（秒）
         self.client = None
         self.principal = None
+        self.cassette = cassette    # HTTP 录制 / 回放（见 cassette.py）
+        self.shard: Optional[Tuple[int, int]] = None    # (分片序号, 分片数)，只读取该分片的日历
+
+    def for_shard(self, index: int, count: int) -> 'ICloudCalendar':
+        """只读取第 index 个分片日历的客户端，与当前客户端共享连接和解析缓存"""
+        shard = copy.copy(self)
+        shard.shard = (index, count)
+        return shard
+
+    def in_shard(self, calendar) -> bool:
+        """日历是否属于当前分片（未分片时总是属于）"""
+        if not self.shard:
+            return True
+        index, count = self.shard
+        return calendar_shard(self._href(calendar.url), count) == index
 
     def connect(self) -> bool:
         """连接到 iCloud CalDAV 服务"""
@@ -27,20 +105,23 @@ class ICloudCalendar:
             self.client = caldav.DAVClient(
                 url=self.CALDAV_URL,
                 username=self.username,
-                password=self.app_password
+                password=self.app_password,
+                timeout=self.fetch_timeout
             )
+            if self.cassette:
+                self.client.session = self.cassette.wrap_session(self.client.session)
             self.principal = self.client.principal()
-            print(f"成功连接到 iCloud 日历")
+            log.info("成功连接到 iCloud 日历")
             return True
         except Exception as e:
-            print(f"连接 iCloud 失败: {e}")
+            log.error("连接 iCloud 失败: %s", e)
             return False
 
     def get_calendars(self) -> List[caldav.Calendar]:
-        """获取所有日历"""
+        """获取所有日历（分片时只返回当前分片的日历）"""
         if not self.principal:
             raise Exception("未连接到 iCloud，请先调用 connect()")
-        return self.principal.calendars()
+        return [calendar for calendar in self.principal.calendars() if self.in_shard(calendar)]
 
     def get_events(self, start_date: datetime, end_date: Optional[datetime] = None) -> List[Dict]:
         """
@@ -56,113 +137,708 @@ class ICloudCalendar:
         if not end_date:
             end_date = start_date + timedelta(days=365)
 
-        calendars = self.get_calendars()
         all_events = []
+        for _, events in self.iter_events(start_date, end_date):
+            all_events.extend(events)
+
+        log.info("共获取到 %s 个事件", len(all_events))
+        return all_events
+
+    def iter_events(self, start_date: datetime,
+                    end_date: Optional[datetime] = None) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        按日历逐个产出事件
 
-        for calendar in calendars:
+        同时最多有 max_workers 个日历在读取，调用方处理得慢时不会继续预读，
+        内存占用不随日历数量增长。读取失败的日历会被跳过。
+
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期，默认为 start_date + 1年
+
+        Yields:
+            (日历名称, 该日历的事件列表)，按日历列表顺序
+        """
+        if not end_date:
+            end_date = start_date + timedelta(days=365)
+
+        try:
+            for _, result in self._iter_calendars(
+                lambda calendar: self._fetch_calendar_events(calendar, start_date, end_date)
+            ):
+                if result is not None:
+                    yield result
+        finally:
+            self._finish_parsing()
+
+    def existing_uids(self, uids: Iterable[str]) -> Set[str]:
+        """
+        检查哪些 UID 仍存在于任一日历中
+
+        分层同步只读取部分时间范围，删除前用它确认事件确实已删除，
+        而不是被移到了本次未读取的范围。查询失败的 UID 按存在处理，避免误删。
+        """
+        remaining = set(uids)
+        found = set()
+        for calendar in self.get_calendars():
+            for uid in sorted(remaining):
+                try:
+                    calendar.event_by_uid(uid)
+                except NotFoundError:
+                    continue
+                except Exception as e:
+                    log.warning("查询事件 %s 失败: %s", uid, e)
+                found.add(uid)
+                remaining.discard(uid)
+            if not remaining:
+                break
+        return found
+
+    def _fetch_calendar_events(self, calendar, start_date: datetime,
+                               end_date: datetime) -> Tuple[str, List[Dict]]:
+        """读取单个日历在时间范围内的所有事件，返回 (日历名称, 事件列表)"""
+        calendar_name = calendar.name
+        log.info("正在读取日历: %s", calendar_name)
+
+        events = calendar.date_search(
+            start=start_date,
+            end=end_date,
+            expand=not self.recurrence_aware
+        )
+
+        if self.parse_pool:
+            calendar_events = [
+                event_data for parsed in self._parse_batch(calendar, events, calendar_name) for event_data in parsed
+            ]
+            metrics.inc('icloud_events_fetched_total', len(calendar_events))
+            return calendar_name, calendar_events
+
+        calendar_events = []
+        # 逐个取出解析，原始 CalDAV 对象（含 iCalendar 文本）解析后即可释放，
+        # 不会与解析结果同时留在内存中直到整个日历处理完
+        events.reverse()
+        while events:
+            event = events.pop()
             try:
-                calendar_name = calendar.name
-                print(f"正在读取日历: {calendar_name}")
+                calendar_events.extend(self._parse_cached(calendar, event, calendar_name))
+            except Exception as e:
+                log.warning("解析事件失败: %s", e)
+                continue
 
-                events = calendar.date_search(
-                    start=start_date,
-                    end=end_date,
-                    expand=True
-                )
+        metrics.inc('icloud_events_fetched_total', len(calendar_events))
+        return calendar_name, calendar_events
 
-                for event in events:
-                    try:
-                        event_data = self._parse_event(event, calendar_name)
-                        if event_data:
-                            all_events.append(event_data)
-                    except Exception as e:
-                        print(f"解析事件失败: {e}")
-                        continue
+    def _map_calendars(self, fetch: Callable) -> List[Tuple]:
+        """
+        在有界线程池中并发读取所有日历
+
+        Args:
+            fetch: 读取单个日历的函数
+
+        Returns:
+            按日历列表顺序排列的 (日历, 结果) 列表，失败的日历结果为 None
+        """
+        return list(self._iter_calendars(fetch))
+
+    def _iter_calendars(self, fetch: Callable) -> Iterator[Tuple]:
+        """
+        在有界线程池中并发读取日历，按日历列表顺序逐个产出结果
+
+        同时在读取的日历不超过 max_workers 个，取走一个结果才会提交下一个。
+        单个日历失败或超时只记录错误，不影响其他日历。超时从提交时起算，
+        不受等待前面日历的时间影响；超时的读取线程无法中断，会继续占用线程池直到 HTTP 超时。
+
+        Args:
+            fetch: 读取单个日历的函数
+
+        Yields:
+            (日历, 结果)，失败的日历结果为 None
+        """
+        calendars = iter(self.get_calendars())
+        workers = max(1, self.max_workers)
+
+        def timed_fetch(calendar):
+            with metrics.timer('icloud_calendar_fetch_seconds', calendar=self._href(calendar.url)):
+                return fetch(calendar)
+
+        def submit(calendar):
+            deadline = None if self.fetch_timeout is None else time.monotonic() + self.fetch_timeout
+            return calendar, pool.submit(timed_fetch, calendar), deadline
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = deque(submit(calendar) for calendar in islice(calendars, workers))
+            while futures:
+                calendar, future, deadline = futures.popleft()
+                try:
+                    timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                    result = future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    abandoned = not future.cancel()
+                    log.warning("读取日历 %s 超时（%s 秒）%s", calendar.url, self.fetch_timeout,
+                                "，放弃等待，读取线程会继续占用线程池直到 HTTP 超时" if abandoned else "")
+                    result = None
+                except Exception as e:
+                    log.warning("读取日历 %s 失败: %s", calendar.url, e)
+                    result = None
+
+                next_calendar = next(calendars, None)
+                if next_calendar is not None:
+                    futures.append(submit(next_calendar))
+
+                yield calendar, result
+        finally:
+            # 不等待超时的日历，它们受 HTTP 超时约束会自行结束
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_event_changes(self, start_date: datetime, end_date: Optional[datetime] = None,
+                          state: Optional[Dict] = None) -> Dict:
+        """
+        增量获取事件变更
+
+        ctag 未变化的日历直接跳过；其余日历优先使用 sync-collection (RFC 6578)
+        只取变化的 href，服务器不支持时退回 etag 列表比对，再用 calendar-multiget
+        拉取变化的事件。
+
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期，默认为 start_date + 1年
+            state: 上次返回的 'state'，为空时做一次全量读取
+
+        Returns:
+            {
+                'changed': 新增或修改的事件列表,
+                'removed': 已删除（或移出时间范围）的事件键列表（见 event_key）,
+                'total': 时间范围内的事件总数,
+                'full': 是否为全量快照,
+                'state': 新的增量状态，同步成功后保存，下次传回
+            }
+        """
+        if not end_date:
+            end_date = start_date + timedelta(days=365)
+
+        window = [start_date.isoformat(), end_date.isoformat()]
+        if not state or state.get('window') != window:
+            # 没有历史状态或时间范围已变化，按全量处理
+            state = {'window': window, 'calendars': {}}
+        full = not state['calendars']
+
+        old_calendars = state['calendars']
+        new_calendars = {}
+        changed = []
+        skipped = 0
+
+        results = self._map_calendars(
+            lambda calendar: self._fetch_calendar_changes(
+                calendar, old_calendars.get(str(calendar.url)), start_date, end_date
+            )
+        )
+        for calendar, result in results:
+            calendar_url = str(calendar.url)
+            saved = old_calendars.get(calendar_url)
+            if result is None:
+                if saved:
+                    # 保留旧状态，避免把该日历的事件误判为已删除
+                    new_calendars[calendar_url] = saved
+                continue
+
+            calendar_state, events = result
+            if calendar_state is saved:
+                skipped += 1
+            new_calendars[calendar_url] = calendar_state
+            changed.extend(events)
+
+        old_keys = self._collect_keys(old_calendars)
+        new_keys = self._collect_keys(new_calendars)
+
+        self._finish_parsing()
+        if skipped:
+            log.info("%s 个日历未变化，已跳过", skipped)
+        log.info("共获取到 %s 个变化的事件", len(changed))
+
+        return {
+            'changed': changed,
+            'removed': sorted(old_keys - new_keys),
+            'total': len(new_keys),
+            'full': full,
+            'state': {'window': window, 'calendars': new_calendars}
+        }
+
+    def _fetch_calendar_changes(self, calendar, saved: Optional[Dict],
+                                start_date: datetime, end_date: datetime) -> Tuple[Dict, List[Dict]]:
+        """
+        获取单个日历的变更
+
+        Returns:
+            (新的日历状态, 变化的事件列表)；日历未变化时原样返回 saved
+        """
+        ctag = self._get_ctag(calendar)
+        if saved and ctag and saved.get('ctag') == ctag:
+            return saved, []
+
+        calendar_name = calendar.name
+
+        hrefs = dict(saved['hrefs']) if saved else {}
+        sync_token = saved.get('sync_token') if saved else None
+
+        try:
+            result = calendar.objects_by_sync_token(
+                sync_token=sync_token, load_objects=False, disable_fallback=True
+            )
+            listing = {
+                self._href(obj.url): obj.props.get(dav.GetEtag.tag)
+                for obj in result
+            }
+            new_token = result.sync_token
+            incremental = bool(sync_token)
+        except Exception as e:
+            # 服务器不支持 sync-token 或 token 已失效，退回 etag 列表比对
+            log.info("日历 %s 不支持增量同步，改用 etag 比对: %s", calendar_name, e)
+            listing = self._list_etags(calendar)
+            new_token = None
+            incremental = False
+
+        if incremental:
+            # sync-collection 只返回变化的 href（包括已删除的）
+            candidates = list(listing)
+        else:
+            for href in set(hrefs) - set(listing):
+                del hrefs[href]
+            candidates = [
+                href for href, etag in listing.items()
+                if etag is None or href not in hrefs or hrefs[href]['etag'] != etag
+            ]
+
+        fetched = self._multiget(calendar, candidates)
+        batch = {}
+        if self.parse_pool:
+            found = [href for href in candidates if href in fetched and not self._needs_expansion(fetched[href])]
+            batch = dict(zip(found, self._parse_batch(
+                calendar, [fetched[href] for href in found], calendar_name, [listing.get(href) for href in found]
+            )))
+
+        events = []
+        for href in candidates:
+            obj = fetched.pop(href, None)
+            if obj is None:
+                # multiget 没有返回，说明已被删除
+                hrefs.pop(href, None)
+                continue
 
+            try:
+                if self._needs_expansion(obj):
+                    # 展开结果取决于时间范围，不使用解析缓存
+                    parsed = self._parse_expanded(obj, calendar_name, start_date, end_date)
+                elif self.parse_pool:
+                    parsed = batch[href]
+                else:
+                    parsed = self._parse_cached(calendar, obj, calendar_name, listing.get(href))
             except Exception as e:
-                print(f"读取日历 {calendar.name} 失败: {e}")
+                log.warning("解析事件失败: %s", e)
+                parsed = []
+
+            keys = []
+            for event_data in parsed:
+                if self._in_window(event_data, str(obj.data), start_date, end_date):
+                    keys.append(event_key(event_data))
+                    events.append(event_data)
+            hrefs[href] = {'etag': listing.get(href), 'keys': keys}
+
+        metrics.inc('icloud_events_fetched_total', len(events))
+        log.info("日历 %s: %s 个事件有变化", calendar_name, len(events))
+        return {'ctag': ctag, 'sync_token': new_token, 'hrefs': hrefs}, events
+
+    def _get_ctag(self, calendar) -> Optional[str]:
+        """读取日历的 getctag，服务器不支持时返回 None"""
+        try:
+            ctag = calendar.get_property(GetCtag())
+            return str(ctag) if ctag else None
+        except Exception:
+            return None
+
+    def _list_etags(self, calendar) -> Dict[str, Optional[str]]:
+        """通过 Depth: 1 PROPFIND 列出日历内所有事件的 href -> etag"""
+        response = calendar.get_properties([dav.GetEtag()], depth=1, parse_response_xml=False)
+        calendar_href = self._href(calendar.url).rstrip('/')
+
+        listing = {}
+        for href, props in response.expand_simple_props([dav.GetEtag()]).items():
+            href = self._href(href)
+            if href.rstrip('/') == calendar_href:
                 continue
+            listing[href] = props.get(dav.GetEtag.tag)
+        return listing
+
+    def _multiget(self, calendar, hrefs: List[str]) -> Dict:
+        """分批用 calendar-multiget 拉取事件，返回 href -> 事件对象"""
+        fetched = {}
+        for i in range(0, len(hrefs), self.MULTIGET_BATCH_SIZE):
+            batch = hrefs[i:i + self.MULTIGET_BATCH_SIZE]
+            urls = [calendar.url.join(href) for href in batch]
+            for obj in calendar.multiget(urls, raise_notfound=False):
+                fetched[self._href(obj.url)] = obj
+        return fetched
+
+    def _needs_expansion(self, obj) -> bool:
+        """
+        calendar-multiget 取回的对象是否需要在客户端展开
 
-        print(f"共获取到 {len(all_events)} 个事件")
-        return all_events
+        不识别重复事件时，全量读取用 date_search(expand=True) 取得展开后的实例，
+        取第一个落在时间范围内的实例；multiget 返回的是未展开的原始对象，
+        重复事件需要同样展开，否则同步的是重复事件第一次发生的时间。
+        """
+        if self.recurrence_aware:
+            return False
+        data = str(obj.data)
+        return 'RRULE' in data or 'RDATE' in data
+
+    def _parse_expanded(self, obj, calendar_name: str, start_date: datetime,
+                        end_date: datetime) -> List[EventRecord]:
+        """在时间范围内展开重复事件后解析（与 date_search 的客户端展开一致）"""
+        import recurring_ical_events
 
-    def _parse_event(self, event, calendar_name: str) -> Optional[Dict]:
-        """解析 CalDAV 事件为字典格式"""
+        started = time.perf_counter()
         try:
-            cal = Calendar.from_ical(event.data)
+            cal = Calendar.from_ical(str(obj.data))
+            occurrences = recurring_ical_events.of(cal, components=['VEVENT']).between(start_date, end_date)
+            cal.subcomponents = [
+                component for component in cal.subcomponents if component.name == 'VTIMEZONE'
+            ] + list(occurrences)
+            return self._parse_data(cal.to_ical().decode(), calendar_name)
+        finally:
+            metrics.inc('icloud_parse_seconds_total', time.perf_counter() - started)
+
+    def _in_window(self, event_data: Dict, raw_data: str,
+                   start_date: datetime, end_date: datetime) -> bool:
+        """判断事件是否落在同步时间范围内（与 date_search 的时间范围过滤一致）"""
+        start = self._to_aware(datetime.fromisoformat(event_data['start']))
+        end = self._to_aware(datetime.fromisoformat(event_data['end']))
+
+        if start >= self._to_aware(end_date):
+            return False
+        if 'RRULE' in raw_data:
+            # 重复事件的后续实例可能落在范围内
+            return True
+        return end >= self._to_aware(start_date)
+
+    @staticmethod
+    def _to_aware(dt: datetime) -> datetime:
+        """补全时区信息，便于比较"""
+        return dt if dt.tzinfo else dt.replace(tzinfo=tz.tzlocal())
+
+    @staticmethod
+    def _href(url) -> str:
+        """将 URL 规范化为不带编码的路径，用作 href 键"""
+        return unquote(urlparse(str(url)).path)
+
+    @staticmethod
+    def _collect_keys(calendars: Dict[str, Dict]) -> Set[str]:
+        """收集日历状态中所有时间范围内事件的键（见 event_key）"""
+        return {
+            key
+            for calendar_state in calendars.values()
+            for entry in calendar_state['hrefs'].values()
+            for key in entry['keys']
+        }
+
+    def _parse_cached(self, calendar, event, calendar_name: str, etag: Optional[str] = None) -> List[Dict]:
+        """
+        通过解析缓存解析事件，未变化的事件跳过 iCalendar 解析
+
+        缓存键为 (日历 href, 事件 href, etag)。date_search 的结果不带 etag，
+        此时用事件原始数据的摘要代替（展开的重复事件实例 href 相同但数据不同）。
+        """
+        if not self.parse_cache:
+            return self._parse_timed(event, calendar_name)
+
+        key = self._cache_key(calendar, event, etag)
+        cached = self.parse_cache.get(*key)
+        if cached is None:
+            events = self._parse_timed(event, calendar_name)
+            self.parse_cache.put(*key, events)
+            return events
+        return self._from_cache(cached, calendar_name)
+
+    def _parse_batch(self, calendar, objects: List, calendar_name: str,
+                     etags: Optional[List[Optional[str]]] = None) -> List[List[EventRecord]]:
+        """
+        批量解析事件（配置了解析进程池时使用）
+
+        先查解析缓存，未命中的事件足够多时交给进程池解析，否则在本进程逐个解析。
+        单个事件出错时该事件的结果为空列表。
+
+        Returns:
+            与 objects 顺序一致的解析结果
+        """
+        results: List[Optional[List[EventRecord]]] = [None] * len(objects)
+        keys = [None] * len(objects)
+        misses = []
+        for i, obj in enumerate(objects):
+            try:
+                if self.parse_cache:
+                    keys[i] = self._cache_key(calendar, obj, etags[i] if etags else None)
+                    cached = self.parse_cache.get(*keys[i])
+                    if cached is not None:
+                        results[i] = self._from_cache(cached, calendar_name)
+                        continue
+                misses.append(i)
+            except Exception as e:
+                log.warning("解析事件失败: %s", e)
+                results[i] = []
+
+        parsed = None
+        if self.parse_pool.accepts(len(misses)):
+            started = time.perf_counter()
+            try:
+                parsed = self.parse_pool.parse(
+                    [str(objects[i].data) for i in misses], calendar_name,
+                    {'recurrence_aware': self.recurrence_aware, 'fast_parse': self.fast_parse}
+                )
+            except Exception as e:
+                log.warning("解析进程池不可用，改为在本进程解析: %s", e)
+            finally:
+                metrics.inc('icloud_parse_seconds_total', time.perf_counter() - started)
+        if parsed is None:
+            parsed = [self._parse_timed(objects[i], calendar_name) for i in misses]
+
+        for i, events in zip(misses, parsed):
+            results[i] = events
+            if keys[i]:
+                self.parse_cache.put(*keys[i], events)
+        return results
+
+    def _cache_key(self, calendar, event, etag: Optional[str] = None) -> Tuple[str, str, str]:
+        """
+        解析缓存键 (日历 href, 事件 href, etag)
+
+        没有 etag 时使用内容的 MD5。不识别重复事件时，date_search 返回的重复事件已按时间范围
+        展开（带 RECURRENCE-ID），内容随时间范围变化而 etag 不变，同样使用内容的 MD5。
+        """
+        data = None
+        if etag is None:
+            etag = self._etag_text(event.props.get(dav.GetEtag.tag))
+            if etag and not self.recurrence_aware:
+                data = str(event.data)
+                if 'RECURRENCE-ID' in data:
+                    etag = None
+        if not etag:
+            if data is None:
+                data = str(event.data)
+            etag = 'md5:' + hashlib.md5(data.encode()).hexdigest()
+        return self._href(calendar.url), self._href(event.url), etag
+
+    @staticmethod
+    def _etag_text(value) -> Optional[str]:
+        """getetag 属性值转换为字符串：date_search 的结果中为 XML 元素，其他请求中为字符串"""
+        if value is not None and not isinstance(value, str):
+            # lxml 元素的真值取决于子元素个数，不能直接判断
+            value = value.text
+        return str(value) if value else None
+
+    @staticmethod
+    def _from_cache(cached: List[Dict], calendar_name: str) -> List[EventRecord]:
+        """缓存中的事件字典转换为事件记录，日历名称不参与哈希，以当前名称为准"""
+        return [EventRecord.from_dict(event_data, calendar_name) for event_data in cached]
+
+    def _finish_parsing(self):
+        """一轮读取结束：提交解析缓存，关闭解析进程池"""
+        if self.parse_cache:
+            self.parse_cache.flush()
+        if self.parse_pool:
+            self.parse_pool.shutdown()
+
+    def _parse_timed(self, event, calendar_name: str) -> List[EventRecord]:
+        """解析事件并累计解析耗时"""
+        started = time.perf_counter()
+        try:
+            return self._parse_data(event.data, calendar_name)
+        finally:
+            metrics.inc('icloud_parse_seconds_total', time.perf_counter() - started)
+
+    def _parse_data(self, data: str, calendar_name: str) -> List[EventRecord]:
+        """
+        解析 CalDAV 事件对象的原始数据（iCalendar 文本）
+
+        识别重复事件时返回对象中的所有 VEVENT（主体和 RECURRENCE-ID 例外实例），
+        否则只返回第一个 VEVENT。启用快速提取时先按行提取（见 ical_extract.py），
+        不能处理的再用 icalendar 解析，两者结果相同。
+        """
+        if self.fast_parse:
+            try:
+                events = self._extract_data(data, calendar_name)
+            except Unsupported:
+                metrics.inc('icloud_parse_events_total', parser='icalendar')
+            else:
+                metrics.inc('icloud_parse_events_total', parser='fast')
+                return events
+
+        if not self.recurrence_aware:
+            event_data = self._parse_event(data, calendar_name)
+            return [event_data] if event_data else []
+
+        try:
+            cal = Calendar.from_ical(data)
+            events = []
+            for component in cal.walk():
+                if component.name == "VEVENT":
+                    event_data = self._parse_vevent(component, calendar_name, with_recurrence=True)
+                    if event_data:
+                        events.append(event_data)
+            return events
+
+        except Exception as e:
+            log.warning("解析事件数据失败: %s", e)
+            return []
+
+    def _parse_event(self, data: str, calendar_name: str) -> Optional[EventRecord]:
+        """解析第一个 VEVENT"""
+        try:
+            cal = Calendar.from_ical(data)
 
             for component in cal.walk():
                 if component.name == "VEVENT":
-                    # 获取基本信息
-                    uid = str(component.get('uid', ''))
-                    summary = str(component.get('summary', '无标题'))
-                    description = str(component.get('description', '')) if component.get('description') else ''
-                    location = str(component.get('location', '')) if component.get('location') else ''
-
-                    # 获取时间
-                    dtstart = component.get('dtstart')
-                    dtend = component.get('dtend')
-
-                    if not dtstart:
-                        return None
-
-                    start_dt = dtstart.dt
-                    end_dt = dtend.dt if dtend else None
-
-                    # 判断是否为全天事件
-                    is_all_day = not isinstance(start_dt, datetime)
-
-                    # 转换时间格式
-                    if is_all_day:
-                        start_str = start_dt.isoformat()
-                        end_str = end_dt.isoformat() if end_dt else start_str
-                    else:
-                        # 确保有时区信息
-                        if start_dt.tzinfo is None:
-                            start_dt = start_dt.replace(tzinfo=tz.tzlocal())
-                        if end_dt and end_dt.tzinfo is None:
-                            end_dt = end_dt.replace(tzinfo=tz.tzlocal())
-
-                        start_str = start_dt.isoformat()
-                        end_str = end_dt.isoformat() if end_dt else start_str
-
-                    # 获取最后修改时间（用于检测变更）
-                    last_modified = component.get('last-modified')
-                    if last_modified:
-                        last_modified_str = last_modified.dt.isoformat()
-                    else:
-                        last_modified_str = None
-
-                    # 生成事件哈希（用于检测变更）
-                    event_hash = self._generate_event_hash(
-                        uid, summary, description, location,
-                        start_str, end_str, is_all_day
-                    )
-
-                    return {
-                        'uid': uid,
-                        'summary': summary,
-                        'description': description,
-                        'location': location,
-                        'start': start_str,
-                        'end': end_str,
-                        'is_all_day': is_all_day,
-                        'calendar_name': calendar_name,
-                        'last_modified': last_modified_str,
-                        'hash': event_hash
-                    }
+                    return self._parse_vevent(component, calendar_name)
 
         except Exception as e:
-            print(f"解析事件数据失败: {e}")
+            log.warning("解析事件数据失败: %s", e)
             return None
 
         return None
 
+    def _extract_data(self, data: str, calendar_name: str) -> List[EventRecord]:
+        """快速提取，与 icalendar 路径一样只返回第一个 VEVENT（识别重复事件时返回全部）"""
+        vevents = extract_vevents(data, recurrence_aware=self.recurrence_aware)
+        if not self.recurrence_aware:
+            vevents = vevents[:1]
+
+        events = []
+        for props in vevents:
+            if 'DTSTART' not in props:
+                continue
+            event_data = self._event_record(
+                props.get('UID', ''), props.get('SUMMARY', '无标题'),
+                props.get('DESCRIPTION') or '', props.get('LOCATION') or '',
+                props['DTSTART'], props.get('DTEND'), props.get('LAST-MODIFIED'), calendar_name
+            )
+            events.append(event_data)
+        return events
+
+    def _parse_vevent(self, component, calendar_name: str, with_recurrence: bool = False) -> Optional[EventRecord]:
+        """
+        解析单个 VEVENT 组件
+
+        Args:
+            component: VEVENT 组件
+            calendar_name: 所属日历名称
+            with_recurrence: 是否保留 RRULE/EXDATE/RDATE 和 RECURRENCE-ID
+        """
+        # 获取基本信息
+        uid = str(component.get('uid', ''))
+        summary = str(component.get('summary', '无标题'))
+        description = str(component.get('description', '')) if component.get('description') else ''
+        location = str(component.get('location', '')) if component.get('location') else ''
+
+        # 获取时间
+        dtstart = component.get('dtstart')
+        dtend = component.get('dtend')
+
+        if not dtstart:
+            return None
+
+        # 获取最后修改时间（用于检测变更）
+        last_modified = component.get('last-modified')
+
+        # 重复规则和例外实例
+        recurrence = self._recurrence_lines(component) if with_recurrence else []
+        recurrence_id = None
+        if with_recurrence and component.get('recurrence-id'):
+            recurrence_id = self._format_recurrence_id(component.get('recurrence-id').dt)
+
+        return self._event_record(
+            uid, summary, description, location,
+            dtstart.dt, dtend.dt if dtend else None, last_modified.dt if last_modified else None,
+            calendar_name, recurrence, recurrence_id
+        )
+
+    def _event_record(self, uid: str, summary: str, description: str, location: str, start_dt, end_dt,
+                      last_modified, calendar_name: str, recurrence: Optional[List[str]] = None,
+                      recurrence_id: Optional[str] = None) -> EventRecord:
+        """由提取出的属性值生成事件记录（icalendar 解析和快速提取共用）"""
+        # 判断是否为全天事件
+        is_all_day = not isinstance(start_dt, datetime)
+
+        # 转换时间格式
+        if is_all_day:
+            start_str = start_dt.isoformat()
+            end_str = end_dt.isoformat() if end_dt else start_str
+        else:
+            # 确保有时区信息
+            if start_dt.tzinfo is None:
+                start_dt = start_dt.replace(tzinfo=tz.tzlocal())
+            if end_dt and end_dt.tzinfo is None:
+                end_dt = end_dt.replace(tzinfo=tz.tzlocal())
+
+            start_str = start_dt.isoformat()
+            end_str = end_dt.isoformat() if end_dt else start_str
+
+        last_modified_str = last_modified.isoformat() if last_modified else None
+
+        # 生成事件哈希（用于检测变更）
+        event_hash = self._generate_event_hash(
+            uid, summary, description, location,
+            start_str, end_str, is_all_day,
+            recurrence, recurrence_id
+        )
+
+        return EventRecord(
+            uid, summary, description, location,
+            start_str, end_str, is_all_day,
+            calendar_name, last_modified_str, event_hash,
+            recurrence, recurrence_id
+        )
+
+    def _recurrence_lines(self, component) -> List[str]:
+        """提取 RRULE/EXDATE/RDATE，转换为 Google Calendar recurrence 格式"""
+        lines = []
+
+        for rrule in self._as_list(component.get('rrule')):
+            lines.append('RRULE:' + rrule.to_ical().decode())
+
+        for prop in ('exdate', 'rdate'):
+            for value in self._as_list(component.get(prop)):
+                for item in getattr(value, 'dts', []):
+                    dt = item.dt
+                    if isinstance(dt, datetime):
+                        dt = self._to_aware(dt).astimezone(tz.UTC)
+                        lines.append(f"{prop.upper()}:{dt.strftime('%Y%m%dT%H%M%SZ')}")
+                    elif hasattr(dt, 'strftime'):
+                        lines.append(f"{prop.upper()};VALUE=DATE:{dt.strftime('%Y%m%d')}")
+
+        return lines
+
+    def _format_recurrence_id(self, dt) -> str:
+        """规范化 RECURRENCE-ID：全天为日期，其余统一转换为 UTC"""
+        if isinstance(dt, datetime):
+            return self._to_aware(dt).astimezone(tz.UTC).isoformat()
+        return dt.isoformat()
+
+    @staticmethod
+    def _as_list(value) -> List:
+        """icalendar 中重复出现的属性会返回列表"""
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
     def _generate_event_hash(self, uid: str, summary: str, description: str,
-                            location: str, start: str, end: str, is_all_day: bool) -> str:
-        """生成事件内容的哈希值，用于检测变更"""
+                            location: str, start: str, end: str, is_all_day: bool,
+                            recurrence: Optional[List[str]] = None,
+                            recurrence_id: Optional[str] = None) -> bytes:
+        """生成事件内容的哈希值（16 字节 MD5 摘要），用于检测变更"""
         content = f"{uid}|{summary}|{description}|{location}|{start}|{end}|{is_all_day}"
-        return hashlib.md5(content.encode()).hexdigest()
+        if recurrence or recurrence_id:
+            # 仅重复事件追加，普通事件的哈希与之前保持一致
+            content += f"|{';'.join(recurrence or [])}|{recurrence_id or ''}"
+        return hashlib.md5(content.encode()).digest()
 
 
 if __name__ == "__main__":
@@ -100,7 +100,8 @@ if launchctl list | grep -q "calendar-sync"; then
     echo "  $PROJECT_DIR/run_sync.sh"
     echo ""
     echo "查看日志:"
-    echo "  cat $PROJECT_DIR/sync.log"
+    echo "  cat $PROJECT_DIR/sync-detail.log    # 同步日志（config.py 的 LOG_FILE）"
+    echo "  cat $PROJECT_DIR/sync.log           # run_sync.sh 的记录和启动错误"
 else
     echo "错误: 服务加载失败"
     exit 1
@@ -0,0 +1,149 @@
+"""
+同步租约 - 多台 Mac 共享同步状态时，保证同一时间只有一个进程写入
+
+租约保存在同步状态中（meta 'lease'）：{holder, token, expires}
+
+- holder: 持有者（主机名:进程号）
+- expires: 过期时间（Unix 时间戳），持有者在同步期间由心跳线程定期续期，
+  进程崩溃后租约到期即可被其他机器接管，不需要人工删除锁文件
+- token: 防护令牌（fencing token），每次易主加一；持有者在提交同步状态前重新读取租约，
+  令牌或持有者变化说明租约已被接管，本次同步放弃提交。SQLite 后端每次写入立即提交，
+  每次写入同步状态前都会核对（见 SyncEngine._fence_write）
+
+同步状态放在 iCloud Drive 中时，文件在机器之间的传播有延迟，两台机器可能在
+几秒内先后取得同一个租约。取得租约后等待 settle 秒再读取一次，确认没有被其他
+机器覆盖，可以覆盖大部分传播延迟；各机器的时钟需要大致同步。
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+from state_store import StateStore
+from sync_log import get_logger
+
+
+log = get_logger(__name__)
+
+META_NAME = 'lease'
+
+
+class LeaseLost(Exception):
+    """租约已过期或被其他机器接管"""
+
+
+class Lease:
+    """
+    同步租约
+
+    Args:
+        ttl: 租约有效期（秒），心跳线程每 ttl / 3 秒续期一次
+        settle: 取得租约后等待多少秒再确认（覆盖 iCloud Drive 的传播延迟），0 表示不等待
+        holder: 持有者标识，默认为 主机名:进程号
+    """
+
+    def __init__(self, ttl: float = 300, settle: float = 0.0, holder: Optional[str] = None):
+        self.ttl = ttl
+        self.settle = settle
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}"
+        self.state: Optional[StateStore] = None
+        self.token: Optional[int] = None
+        self.expires = 0.0
+        self.current: Optional[Dict] = None     # 最近读取到的租约（未取得时为其他持有者的租约）
+        self.lost = False
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @property
+    def held(self) -> bool:
+        return self.token is not None
+
+    def acquire(self, state: StateStore) -> bool:
+        """
+        取得租约并开始心跳续期
+
+        Returns:
+            是否取得；租约由其他持有者持有且未过期时返回 False（见 current）
+        """
+        current = state.read_meta(META_NAME)
+        now = time.time()
+        if current and current['holder'] != self.holder and current['expires'] > now:
+            self.current = current
+            return False
+
+        record = {
+            'holder': self.holder,
+            'token': (current['token'] if current else 0) + 1,
+            'expires': now + self.ttl,
+        }
+        state.write_meta(META_NAME, record)
+        if self.settle:
+            # 其他机器在传播延迟内也写入了租约时，后写入的一方胜出
+            time.sleep(self.settle)
+            confirmed = state.read_meta(META_NAME)
+            if confirmed != record:
+                self.current = confirmed
+                return False
+
+        self.state = state
+        self.token = record['token']
+        self.expires = record['expires']
+        self.current = record
+        self.lost = False
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._renew_loop, name='lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def check(self):
+        """写入 Google 前检查租约（只检查心跳结果，不读取存储）"""
+        if self.lost:
+            raise LeaseLost(f"同步租约已被接管: {self.current}")
+        if time.time() >= self.expires:
+            raise LeaseLost("同步租约已过期（心跳未能续期）")
+
+    def verify(self):
+        """提交同步状态前重新读取租约，确认令牌和持有者没有变化"""
+        self.check()
+        current = self.state.read_meta(META_NAME)
+        if not self._is_ours(current):
+            self.lost = True
+            self.current = current
+            raise LeaseLost(f"同步租约已被接管: {current}")
+
+    def release(self):
+        """停止心跳并释放租约（保留令牌，下一个持有者的令牌继续递增）"""
+        if not self.held:
+            return
+        self._stop.set()
+        self._heartbeat.join()
+        try:
+            current = self.state.read_meta(META_NAME)
+            if self._is_ours(current):
+                self.state.write_meta(META_NAME, dict(current, expires=0))
+        except Exception as e:
+            log.warning("释放同步租约失败: %s", e)
+        self.token = None
+        self.state = None
+
+    def _is_ours(self, record: Optional[Dict]) -> bool:
+        return bool(record) and record['holder'] == self.holder and record['token'] == self.token
+
+    def _renew_loop(self):
+        """心跳线程：定期续期，发现租约被接管时停止"""
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                current = self.state.read_meta(META_NAME)
+                if not self._is_ours(current):
+                    self.lost = True
+                    self.current = current
+                    log.error("同步租约已被接管: %s", current)
+                    return
+                expires = time.time() + self.ttl
+                self.state.write_meta(META_NAME, dict(current, expires=expires))
+                self.expires = expires
+            except Exception as e:
+                # 暂时无法读写同步状态，到期前下次心跳再试
+                log.warning("同步租约续期失败: %s", e)
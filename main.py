@@ -10,122 +10,13 @@ iOS 日历同步到 Google Calendar 主程序
 """
 
 import argparse
-import signal
 import sys
-import time
-from datetime import datetime
 
-from config import (
-    ICLOUD_USERNAME, ICLOUD_APP_PASSWORD,
-    GOOGLE_CREDENTIALS_FILE, GOOGLE_TOKEN_FILE, GOOGLE_CALENDAR_ID,
-    SYNC_STATE_FILE, SYNC_START_DATE, SYNC_INTERVAL_MINUTES
+from calendar_sync import (
+    CalendarSync, LOG_BACKUP_COUNT, LOG_FILE, LOG_JSON, LOG_LEVEL, LOG_MAX_BYTES,
+    SYNC_ACCOUNTS, SYNC_ADAPTIVE_SCHEDULE, SYNC_ENGINE, SYNC_INTERVAL_MINUTES, SYNC_MAX_PARALLEL_ACCOUNTS
 )
-from icloud_calendar import ICloudCalendar
-from google_calendar import GoogleCalendar
-from sync_engine import SyncEngine
-
-
-class CalendarSync:
-    """日历同步应用"""
-
-    def __init__(self):
-        self.icloud = None
-        self.google = None
-        self.engine = None
-        self.running = False
-
-    def setup(self) -> bool:
-        """初始化连接"""
-        print("正在初始化...")
-
-        # 连接 iCloud
-        print("\n[iCloud] 正在连接...")
-        self.icloud = ICloudCalendar(ICLOUD_USERNAME, ICLOUD_APP_PASSWORD)
-        if not self.icloud.connect():
-            print("错误: 无法连接到 iCloud，请检查用户名和应用专用密码")
-            return False
-
-        # 连接 Google Calendar
-        print("\n[Google] 正在连接...")
-        self.google = GoogleCalendar(
-            GOOGLE_CREDENTIALS_FILE,
-            GOOGLE_TOKEN_FILE,
-            GOOGLE_CALENDAR_ID
-        )
-        if not self.google.connect():
-            print("错误: 无法连接到 Google Calendar，请检查凭证文件")
-            return False
-
-        # 初始化同步引擎
-        self.engine = SyncEngine(self.icloud, self.google, SYNC_STATE_FILE)
-
-        print("\n初始化完成!")
-        return True
-
-    def sync_once(self) -> bool:
-        """执行一次同步"""
-        if not self.engine:
-            print("错误: 请先调用 setup() 初始化")
-            return False
-
-        try:
-            start_date = datetime.fromisoformat(SYNC_START_DATE)
-            self.engine.sync(start_date)
-            return True
-        except Exception as e:
-            print(f"同步出错: {e}")
-            return False
-
-    def run_daemon(self, interval_minutes: int = None):
-        """
-        以守护进程模式运行，定时同步
-
-        Args:
-            interval_minutes: 同步间隔（分钟）
-        """
-        if interval_minutes is None:
-            interval_minutes = SYNC_INTERVAL_MINUTES
-
-        self.running = True
-
-        # 设置信号处理
-        def signal_handler(signum, frame):
-            print("\n收到停止信号，正在退出...")
-            self.running = False
-
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
-
-        print(f"\n开始定时同步模式，间隔: {interval_minutes} 分钟")
-        print("按 Ctrl+C 停止\n")
-
-        while self.running:
-            self.sync_once()
-
-            if not self.running:
-                break
-
-            print(f"下次同步: {interval_minutes} 分钟后")
-            print("-" * 30)
-
-            # 等待下次同步
-            for _ in range(interval_minutes * 60):
-                if not self.running:
-                    break
-                time.sleep(1)
-
-        print("同步服务已停止")
-
-    def show_status(self):
-        """显示同步状态"""
-        if not self.engine:
-            print("错误: 请先调用 setup() 初始化")
-            return
-
-        status = self.engine.get_sync_status()
-        print("\n同步状态:")
-        print(f"  - 已同步事件数: {status['total_synced_events']}")
-        print(f"  - 上次同步时间: {status['last_sync'] or '从未同步'}")
+from sync_log import setup_logging
 
 
 def main():
@@ -137,7 +28,16 @@ def main():
   python main.py                    # 执行一次同步
   python main.py --daemon           # 以守护进程模式运行（定时同步）
   python main.py --daemon -i 10     # 每 10 分钟同步一次
+  python main.py --daemon --adaptive  # 根据变更情况自动调整同步间隔
+  python main.py --daemon --no-adaptive  # 配置启用自适应调度时，本次按固定间隔同步
   python main.py --status           # 显示同步状态
+  python main.py --engine async     # 使用异步引擎同步
+  python main.py --account family   # 只同步 SYNC_ACCOUNTS 中名为 family 的一组
+  python main.py --reconcile        # 与 Google 日历对账，报告状态差异、重复和孤立事件
+  python main.py --reconcile rebuild  # 按 Google 日历重建同步状态
+  python main.py --plan             # 只检测变更，打印写入计划和预计配额消耗
+  python main.py --record sync.cassette.gz   # 同步并录制所有 HTTP 请求（凭证已脱敏）
+  python main.py --replay sync.cassette.gz   # 离线回放录制的请求
         '''
     )
 
@@ -160,22 +60,115 @@ def main():
         help='显示同步状态'
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        '--adaptive', '-a',
+        action=argparse.BooleanOptionalAction,
+        default=SYNC_ADAPTIVE_SCHEDULE,
+        help='自适应调度：有变更时缩短间隔，空闲时逐步延长（-i 为初始间隔）；'
+             '--no-adaptive 按固定间隔同步，默认取 SYNC_ADAPTIVE_SCHEDULE'
+    )
+
+    parser.add_argument(
+        '--engine', '-e',
+        choices=['sync', 'async'],
+        default=SYNC_ENGINE,
+        help=f'同步引擎，默认 {SYNC_ENGINE}'
+    )
+
+    parser.add_argument(
+        '--account', '-A',
+        help='只同步 SYNC_ACCOUNTS 中指定名称的一组（在当前进程中运行，可用于首次 Google 授权）'
+    )
+
+    parser.add_argument(
+        '--reconcile', '-r',
+        nargs='?',
+        const='verify',
+        choices=['verify', 'rebuild', 'cleanup'],
+        help='与 Google 日历对账：verify 只报告（默认），rebuild 重建同步状态，'
+             'cleanup 同时删除重复和孤立的 Google 事件'
+    )
+
+    parser.add_argument(
+        '--plan', '-p',
+        action='store_true',
+        help='只读取 iCloud 并检测变更，打印各类操作数量和预计配额消耗，不写入 Google'
+    )
 
-    # 创建同步应用
-    app = CalendarSync()
+    parser.add_argument(
+        '--record',
+        metavar='FILE',
+        help='把 iCloud 和 Google 的 HTTP 请求和响应录制到 cassette 文件（gzip 压缩，凭证已脱敏）'
+    )
+
+    parser.add_argument(
+        '--replay',
+        metavar='FILE',
+        help='离线回放 cassette 文件中录制的响应，不访问网络'
+    )
+
+    parser.add_argument(
+        '--replay-latency',
+        type=float,
+        default=0.0,
+        metavar='FACTOR',
+        help='回放时按录制耗时的 FACTOR 倍等待，默认 0（不等待）'
+    )
+
+    args = parser.parse_args()
 
-    # 初始化
-    if not app.setup():
+    # 创建同步应用：配置了 SYNC_ACCOUNTS 时由 SyncSupervisor 并行同步各组
+    cassette = None
+    try:
+        if args.record and args.replay:
+            raise ValueError("--record 和 --replay 不能同时使用")
+        if (args.record or args.replay) and SYNC_ACCOUNTS and not args.account:
+            raise ValueError("多账号模式下请用 --account 指定要录制或回放的一组")
+        if (args.record or args.replay) and not args.status:
+            from cassette import Cassette
+            cassette = Cassette(args.record or args.replay, 'record' if args.record else 'replay',
+                                latency=args.replay_latency)
+
+        if args.account:
+            accounts = {account.get('name'): account for account in SYNC_ACCOUNTS}
+            if args.account not in accounts:
+                print(f"错误: SYNC_ACCOUNTS 中没有名为 {args.account} 的账号")
+                sys.exit(1)
+            app = CalendarSync(args.engine, accounts[args.account], cassette=cassette)
+        elif SYNC_ACCOUNTS:
+            from supervisor import SyncSupervisor
+            app = SyncSupervisor(SYNC_ACCOUNTS, args.engine, SYNC_MAX_PARALLEL_ACCOUNTS)
+        else:
+            app = CalendarSync(args.engine, cassette=cassette)
+    except (ValueError, OSError) as e:
+        print(f"配置错误: {e}")
         sys.exit(1)
 
-    # 根据参数执行
+    # 查看状态只需要本地状态文件
     if args.status:
         app.show_status()
-    elif args.daemon:
-        app.run_daemon(args.interval)
-    else:
-        app.sync_once()
+        return
+
+    setup_logging(LOG_LEVEL, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_JSON)
+    try:
+        # 初始化
+        if not app.setup(connect_google=not args.plan):
+            sys.exit(1)
+
+        # 根据参数执行
+        if args.plan:
+            if not app.preview():
+                sys.exit(1)
+        elif args.reconcile:
+            if not app.reconcile(args.reconcile):
+                sys.exit(1)
+        elif args.daemon:
+            app.run_daemon(args.interval, adaptive=args.adaptive)
+        else:
+            app.sync_once()
+    finally:
+        if cassette:
+            cassette.close()
 
 
 if __name__ == "__main__":
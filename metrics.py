@@ -0,0 +1,189 @@
+"""
+运行指标 - 记录各阶段耗时、请求延迟、错误和重试次数，导出为 Prometheus 文本格式或 JSON
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# 延迟直方图的桶上限（秒）
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+DESCRIPTIONS = {
+    'sync_runs_total': '同步次数',
+    'sync_run_seconds': '单次同步耗时',
+    'sync_phase_seconds': '同步各阶段耗时',
+    'sync_events_total': '同步结果累计（按结果分类）',
+    'sync_last_run_events': '最近一次同步的结果',
+    'sync_last_run_timestamp_seconds': '最近一次同步完成的时间',
+    'sync_synced_events': '已同步事件数',
+    'sync_next_interval_seconds': '守护进程下次同步前的等待时间',
+    'sync_account_runs_total': '多账号模式下各组的同步次数（按结果）',
+    'sync_account_last_run_events': '多账号模式下各组最近一次同步的结果',
+    'icloud_calendar_fetch_seconds': '读取单个日历的耗时',
+    'icloud_parse_seconds_total': '解析 iCalendar 数据的累计耗时',
+    'icloud_events_fetched_total': '从 iCloud 读取的事件数',
+    'google_request_seconds': 'Google API 请求延迟（按 HTTP 方法，批量请求按整批计）',
+    'google_request_errors_total': 'Google API 请求失败次数（按状态码）',
+    'google_throttles_total': 'Google API 被限流次数',
+    'google_retries_total': 'Google API 重试次数',
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """
+    线程安全的指标集合
+
+    支持计数器（inc）、仪表（set）和直方图（observe / timer），
+    每个指标可带标签，如 metrics.observe('sync_phase_seconds', 1.2, phase='fetch')。
+    """
+
+    def __init__(self, prefix: str = 'calendar_sync_'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.gauges: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, List]] = {}   # [各桶计数, 总和, 次数]
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """计数器加 value"""
+        key = self._labels(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """设置仪表的值"""
+        with self.lock:
+            self.gauges.setdefault(name, {})[self._labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """向直方图记录一个观测值"""
+        key = self._labels(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = [[0] * len(BUCKETS), 0.0, 0]
+            histogram = series[key]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """记录代码块耗时到直方图"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def _labels(labels: Dict) -> Labels:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self.lock:
+            for kind, metrics in (('counter', self.counters), ('gauge', self.gauges)):
+                for name, series in sorted(metrics.items()):
+                    self._header(lines, name, kind)
+                    for labels, value in series.items():
+                        lines.append(f"{self.prefix}{name}{self._format_labels(labels)} {value!r}")
+
+            for name, series in sorted(self.histograms.items()):
+                self._header(lines, name, 'histogram')
+                for labels, (buckets, total, count) in series.items():
+                    for bound, bucket_count in zip(BUCKETS, buckets):
+                        bucket_labels = labels + (('le', f'{bound:g}'),)
+                        lines.append(f"{self.prefix}{name}_bucket{self._format_labels(bucket_labels)} {bucket_count}")
+                    inf_labels = labels + (('le', '+Inf'),)
+                    lines.append(f"{self.prefix}{name}_bucket{self._format_labels(inf_labels)} {count}")
+                    lines.append(f"{self.prefix}{name}_sum{self._format_labels(labels)} {total:g}")
+                    lines.append(f"{self.prefix}{name}_count{self._format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines: List[str], name: str, kind: str):
+        if name in DESCRIPTIONS:
+            lines.append(f"# HELP {self.prefix}{name} {DESCRIPTIONS[name]}")
+        lines.append(f"# TYPE {self.prefix}{name} {kind}")
+
+    @staticmethod
+    def _format_labels(labels: Labels) -> str:
+        if not labels:
+            return ''
+        escaped = (
+            (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in labels
+        )
+        return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+    def to_dict(self) -> Dict:
+        """导出为可 JSON 序列化的字典"""
+        def series_list(series, convert):
+            return [dict(labels=dict(labels), **convert(value)) for labels, value in series.items()]
+
+        with self.lock:
+            return {
+                'counters': {name: series_list(series, lambda v: {'value': v})
+                             for name, series in self.counters.items()},
+                'gauges': {name: series_list(series, lambda v: {'value': v})
+                           for name, series in self.gauges.items()},
+                'histograms': {
+                    name: series_list(series, lambda v: {
+                        'buckets': dict(zip((f'{bound:g}' for bound in BUCKETS), v[0])),
+                        'sum': round(v[1], 6),
+                        'count': v[2],
+                    })
+                    for name, series in self.histograms.items()
+                },
+            }
+
+    def write_json(self, path: str, extra: Optional[Dict] = None):
+        """把指标写入 JSON 文件（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+        data = self.to_dict()
+        data['generated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        if extra:
+            data.update(extra)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """在后台线程中启动 HTTP 服务，GET /metrics 返回 Prometheus 文本格式"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# 进程内共用的指标集合
+metrics = Metrics()
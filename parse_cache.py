@@ -0,0 +1,131 @@
+"""
+解析缓存 - 按 (日历 href, 事件 href, etag) 缓存解析后的事件，未变化的事件跳过 iCalendar 解析
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from sync_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+class ParseCache:
+    """
+    基于 SQLite 的解析缓存
+
+    查询和写入先在内存中累积，flush() 时一次性提交；超过 max_entries 时
+    淘汰最久未使用的条目。version 变化（解析逻辑或哈希输入改变）时清空缓存。
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS entries (
+            calendar_href TEXT NOT NULL,
+            event_href TEXT NOT NULL,
+            etag TEXT NOT NULL,
+            events TEXT NOT NULL,
+            used INTEGER NOT NULL,
+            PRIMARY KEY (calendar_href, event_href, etag)
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_used ON entries (used);
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        );
+    '''
+
+    def __init__(self, cache_file: str, version: str, max_entries: int = 50000):
+        cache_file = os.path.expanduser(cache_file)
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self.conn.executescript(self.SCHEMA)
+
+        with self.conn:
+            if self._get_meta('version') != version:
+                # 解析逻辑变化，旧的解析结果全部作废
+                self.conn.execute('DELETE FROM entries')
+                self._set_meta('version', version)
+            self.run = int(self._get_meta('run') or 0) + 1
+
+        self.pending: Dict[Tuple[str, str, str], List[Dict]] = {}
+        self.hits: Set[Tuple[str, str, str]] = set()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, calendar_href: str, event_href: str, etag: str) -> Optional[List[Dict]]:
+        """查询缓存，未命中返回 None"""
+        key = (calendar_href, event_href, etag)
+        with self.lock:
+            if key in self.pending:
+                events = self.pending[key]
+            else:
+                row = self.conn.execute(
+                    'SELECT events FROM entries WHERE calendar_href = ? AND event_href = ? AND etag = ?',
+                    key
+                ).fetchone()
+                events = json.loads(row[0]) if row else None
+
+            if events is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            self.hits.add(key)
+        return [dict(event) for event in events]
+
+    def put(self, calendar_href: str, event_href: str, etag: str, events: List[Dict]):
+        """写入缓存（flush 时提交）"""
+        with self.lock:
+            self.pending[(calendar_href, event_href, etag)] = [dict(event) for event in events]
+
+    def flush(self):
+        """提交本次的写入和命中记录，并按大小淘汰"""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO entries (calendar_href, event_href, etag, events, used) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key + (json.dumps(events, ensure_ascii=False), self.run)
+                 for key, events in self.pending.items())
+            )
+            self.conn.executemany(
+                'UPDATE entries SET used = ? WHERE calendar_href = ? AND event_href = ? AND etag = ?',
+                ((self.run,) + key for key in self.hits)
+            )
+
+            count = self.conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    'DELETE FROM entries WHERE rowid IN '
+                    '(SELECT rowid FROM entries ORDER BY used ASC LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+
+            self._set_meta('run', str(self.run))
+            self.pending.clear()
+            self.hits.clear()
+
+        if self.stats['hits'] or self.stats['misses']:
+            log.info("解析缓存: 命中 %s 个，未命中 %s 个", self.stats['hits'], self.stats['misses'])
+        self.stats = {'hits': 0, 'misses': 0}
+        self.run += 1
+
+    def close(self):
+        """提交并关闭缓存"""
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+    def _get_meta(self, name: str) -> Optional[str]:
+        row = self.conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value: str):
+        self.conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
@@ -0,0 +1,97 @@
+"""
+解析进程池 - 首次同步大量历史事件时，把 iCalendar 解析分给多个进程
+
+Calendar.from_ical 是纯 Python 实现，大批量解析时只能占满一个核。配置了解析进程数后，
+未命中解析缓存的事件原始数据按块交给进程池解析，结果按原顺序返回。
+
+- 未命中的事件少于 min_batch 个时（日常的增量同步）在本进程解析，进程间传输和启动
+  子进程的开销比解析本身更大
+- 子进程在第一次用到时启动，每轮读取结束后关闭（见 ICloudCalendar.iter_events），
+  守护进程空闲时不常驻
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Optional
+
+from event_record import EventRecord
+from sync_log import ROOT, set_level
+
+
+# 子进程中的解析器，按解析选项各创建一个
+_parsers = {}
+
+
+def _init_worker(level: str):
+    """子进程沿用主进程的日志级别，Ctrl+C 由主进程处理"""
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    set_level(level)
+
+
+def _parse_chunk(payloads: List[str], calendar_name: str, options: Dict) -> List[List[EventRecord]]:
+    """在子进程中解析一块事件原始数据，options 为 ICloudCalendar 的解析参数"""
+    from icloud_calendar import ICloudCalendar
+
+    key = tuple(sorted(options.items()))
+    parser = _parsers.get(key)
+    if parser is None:
+        parser = _parsers[key] = ICloudCalendar('', '', **options)
+    return [parser._parse_data(data, calendar_name) for data in payloads]
+
+
+class ParsePool:
+    """
+    iCalendar 解析进程池
+
+    Args:
+        workers: 子进程数
+        chunk_size: 每次交给子进程的事件数
+        min_batch: 事件数少于该值时由调用方在本进程解析（见 accepts）
+    """
+
+    def __init__(self, workers: int, chunk_size: int = 100, min_batch: int = 200):
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+        self.min_batch = max(min_batch, 1)
+        self.lock = threading.Lock()
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def accepts(self, count: int) -> bool:
+        """count 个事件是否值得交给进程池"""
+        return self.workers > 1 and count >= self.min_batch
+
+    def parse(self, payloads: List[str], calendar_name: str, options: Dict) -> List[List[EventRecord]]:
+        """
+        解析一批事件原始数据
+
+        Args:
+            options: 子进程中创建 ICloudCalendar 的解析参数（recurrence_aware、fast_parse）
+
+        Returns:
+            与 payloads 顺序一致的解析结果，每项为该事件对象中的事件列表
+        """
+        chunks = [payloads[i:i + self.chunk_size] for i in range(0, len(payloads), self.chunk_size)]
+        results = self._executor().map(_parse_chunk, chunks, repeat(calendar_name), repeat(options))
+        return [events for chunk in results for events in chunk]
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                # 与 supervisor 一样使用 spawn，子进程不继承主进程的连接和线程
+                level = logging.getLevelName(logging.getLogger(ROOT).getEffectiveLevel())
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker, initargs=(level,)
+                )
+            return self.executor
+
+    def shutdown(self):
+        """关闭子进程，下次解析时重新启动"""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=True)
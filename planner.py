@@ -0,0 +1,191 @@
+"""
+写入计划 - 把待执行的创建、更新、删除排成优先队列，按配额预算分批执行
+
+大量变更（首次同步、删除整个日历）时，一次同步可能产生上千个写入，超出 Google
+每日配额后剩下的操作是随机的。计划按事件时间排序：
+
+1. 未来（及当天）的事件，从近到远
+2. 过去事件的创建和更新，从近到远
+3. 过去事件的删除，以及开始时间未知的旧记录
+
+每次同步最多执行 budget 个配额单位，其余操作保存在同步状态中，下次同步继续。
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from state_store import StateStore
+from time_windows import event_position
+
+
+# 每种操作消耗的配额单位（批量请求中每个子请求单独计算）
+OPERATION_COST = {'create': 1, 'update': 1, 'delete': 1}
+
+KINDS = ('create', 'update', 'delete')
+
+PRIORITY_NAMES = ('未来和当天的事件', '过去事件的创建和更新', '过去事件的删除')
+
+Operation = Tuple[str, str]     # (操作类型, 事件键)
+
+
+class ExecutionPlan:
+    """
+    一次同步的写入计划
+
+    Attributes:
+        selected: 本次执行的操作，按优先级排序
+        deferred: 推迟到下次同步的操作，按优先级排序
+        classes: 每个操作的优先级类别（PRIORITY_NAMES 的下标）
+        resumed: 来自上次同步剩余队列的操作数
+    """
+
+    def __init__(self, selected: List[Operation], deferred: List[Operation],
+                 classes: Dict[Operation, int], resumed: int):
+        self.selected = selected
+        self.deferred = deferred
+        self.classes = classes
+        self.resumed = resumed
+
+    def keys(self, kind: str) -> List[str]:
+        """本次执行的某类操作的事件键，按优先级排序"""
+        return [key for op_kind, key in self.selected if op_kind == kind]
+
+    @staticmethod
+    def cost(operations: Iterable[Operation]) -> int:
+        """操作消耗的配额单位"""
+        return sum(OPERATION_COST[kind] for kind, _ in operations)
+
+    @staticmethod
+    def http_requests(operations: Iterable[Operation], batch_size: Optional[int] = None) -> int:
+        """发出的 HTTP 请求数：逐个写入时每个操作一个，批量写入时每类操作每 batch_size 个一个"""
+        operations = list(operations)
+        if not batch_size:
+            return len(operations)
+        return sum(
+            math.ceil(sum(1 for op_kind, _ in operations if op_kind == kind) / batch_size)
+            for kind in KINDS
+        )
+
+
+class OperationPlanner:
+    """
+    按优先级和配额预算生成写入计划
+
+    Args:
+        budget: 每次同步最多消耗的配额单位，None 表示不限
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget
+
+    def plan(self, to_create: Set[str], to_update: Set[str], to_delete: Set[str],
+             icloud_events: Dict[str, Dict], state: StateStore,
+             queued: Iterable[Operation] = (), now: Optional[datetime] = None) -> ExecutionPlan:
+        """
+        生成写入计划
+
+        Args:
+            to_create / to_update / to_delete: 本次检测到的操作
+            icloud_events: 本次读取到的事件（创建和更新的数据来源）
+            state: 同步状态（删除操作的开始时间来源）
+            queued: 上次同步推迟的操作；创建和更新以本次检测结果为准，
+                删除在事件仍有映射且本次没有读取到时保留
+            now: 当前时间，默认为现在
+
+        Returns:
+            写入计划
+        """
+        operations = [('create', key) for key in to_create]
+        operations += [('update', key) for key in to_update]
+        operations += [('delete', key) for key in to_delete]
+
+        seen = set(operations)
+        resumed = 0
+        for kind, key in queued:
+            op = (kind, key)
+            if op in seen:
+                resumed += 1
+            elif kind == 'delete' and key not in icloud_events and state.get_event(key):
+                operations.append(op)
+                seen.add(op)
+                resumed += 1
+
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        starts = {op: self._start(op, icloud_events, state) for op in operations}
+        priorities = {op: self._priority(op[0], starts[op], now_ts) for op in operations}
+
+        # 例外实例依赖主体：主体也在本次创建时紧跟在主体之后
+        order = {}
+        for op in operations:
+            kind, key = op
+            event = icloud_events.get(key, {})
+            master_op = ('create', event.get('uid'))
+            if kind == 'create' and event.get('recurrence_id') and master_op in priorities:
+                order[op] = priorities[master_op] + (1, key)
+            else:
+                order[op] = priorities[op] + (0, key)
+        operations.sort(key=order.get)
+
+        selected, deferred = operations, []
+        if self.budget is not None:
+            spent = 0
+            for i, (kind, _) in enumerate(operations):
+                if spent + OPERATION_COST[kind] > self.budget:
+                    selected, deferred = operations[:i], operations[i:]
+                    break
+                spent += OPERATION_COST[kind]
+
+        classes = {op: priorities[op][0] for op in operations}
+        return ExecutionPlan(selected, deferred, classes, resumed)
+
+    @staticmethod
+    def _start(op: Operation, icloud_events: Dict[str, Dict], state: StateStore) -> Optional[float]:
+        """操作对应事件的开始时间（UTC 时间戳），未知时为 None"""
+        kind, key = op
+        if kind != 'delete' and key in icloud_events:
+            position = event_position(icloud_events[key])
+        else:
+            entry = state.get_event(key) or {}
+            position = entry.get('start')
+        if not position:
+            return None
+        return datetime.strptime(position, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+
+    @staticmethod
+    def _priority(kind: str, start: Optional[float], now: float) -> Tuple[int, float]:
+        """(类别, 类别内排序值)，越小越先执行"""
+        if start is None:
+            return 2, 0.0
+        if start >= now - timedelta(days=1).total_seconds():
+            # 当天及以后的事件，越近越先
+            return 0, start - now
+        # 过去的事件，越近越先；删除排在最后
+        return (2 if kind == 'delete' else 1), now - start
+
+
+def print_plan(result: ExecutionPlan, budget: Optional[int], batch_size: Optional[int] = None,
+               mapping_only: int = 0):
+    """打印写入计划（--plan）"""
+    operations = result.selected + result.deferred
+    counts = {kind: sum(1 for op_kind, _ in operations if op_kind == kind) for kind in KINDS}
+
+    print(f"\n{'=' * 50}")
+    print("写入计划（未执行任何写入）:")
+    print(f"  - 创建: {counts['create']}")
+    print(f"  - 更新: {counts['update']}")
+    print(f"  - 删除: {counts['delete']}")
+    if mapping_only:
+        print(f"  - 已删除的例外实例: {mapping_only}（只移除映射，不消耗配额）")
+    if result.resumed:
+        print(f"  - 其中上次同步推迟的操作: {result.resumed}")
+    for index, name in enumerate(PRIORITY_NAMES):
+        count = sum(1 for op in operations if result.classes[op] == index)
+        if count:
+            print(f"  - {name}: {count}")
+    print(f"  - 预计配额消耗: {ExecutionPlan.cost(operations)}，"
+          f"HTTP 请求: {ExecutionPlan.http_requests(operations, batch_size)}")
+    if budget is not None:
+        print(f"  - 每次同步预算: {budget}，本次执行 {len(result.selected)} 个"
+              f"（配额 {ExecutionPlan.cost(result.selected)}），推迟 {len(result.deferred)} 个")
+    print(f"{'=' * 50}\n")
@@ -0,0 +1,101 @@
+"""
+自适应限流器 - 令牌桶 + 指数退避，被限流时自动降速，请求成功后逐步恢复
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+
+class RateLimiter:
+    """
+    自适应令牌桶限流器（线程安全）
+
+    - 按 rate（请求/秒）补充令牌，最多积累 burst 个
+    - 被限流时速率乘以 decrease（不低于 min_rate），每次成功后增加 increase（不超过 max_rate）
+    - backoff() 返回带随机抖动的指数退避时间
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 10, min_rate: float = 0.5,
+                 max_rate: Optional[float] = None, increase: float = 0.05, decrease: float = 0.5,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 64.0):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.counters = {'requests': 0, 'throttles': 0, 'retries': 0}
+
+    def acquire(self, tokens: int = 1):
+        """
+        取得 tokens 个令牌，不足时阻塞等待
+
+        tokens 大于 burst 时（如一整批请求）只需等到桶满，超出部分记为欠账，
+        由后续请求等待补足。
+        """
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 1):
+        """acquire() 的 asyncio 版本，等待时不阻塞事件循环"""
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def _take(self, tokens: int) -> float:
+        """尝试取得令牌，成功返回 0，否则返回需要等待的秒数"""
+        needed = min(tokens, self.burst)
+        with self.lock:
+            self._refill()
+            if self.tokens >= needed:
+                self.tokens -= tokens
+                self.counters['requests'] += tokens
+                return 0
+            return (needed - self.tokens) / self.rate
+
+    def _refill(self):
+        """按经过的时间补充令牌（调用方持有锁）"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def on_success(self):
+        """请求成功，逐步提高速率"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        """被限流（403 rateLimitExceeded / 429），降低速率"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.counters['throttles'] += 1
+
+    def on_retry(self):
+        """记录一次重试"""
+        with self.lock:
+            self.counters['retries'] += 1
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试（从 0 开始）前的等待时间，带随机抖动"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def stats(self) -> Dict:
+        """请求、限流、重试计数和当前速率"""
+        with self.lock:
+            return dict(self.counters, rate=round(self.rate, 2))
@@ -0,0 +1,219 @@
+"""
+状态对账 - 用 Google 日历中的 icloud_uid / icloud_hash 私有属性重建或校验同步状态
+
+同步状态丢失或损坏时，同步引擎会把所有事件当作新事件重新创建。对账只需分页
+读取一遍 Google 日历，在内存中建立 事件键 -> Google 事件 的索引，再与同步状态和
+iCloud 事件逐一比对：
+
+- verify: 只报告差异
+- rebuild: 按索引重写同步状态
+- cleanup: 删除重复和孤立的 Google 事件后重写同步状态
+"""
+
+from datetime import datetime
+from typing import Dict, List, Set
+
+from icloud_calendar import event_key
+from sync_engine import SyncEngine
+from time_windows import fixed_window, to_position
+
+
+MODES = ('verify', 'rebuild', 'cleanup')
+
+# 每类问题最多列出的事件数
+SHOW_LIMIT = 20
+
+
+class Reconciler:
+    """
+    基于 Google 端 UID 索引的状态对账
+
+    Args:
+        engine: 已初始化的同步引擎，使用其中的 iCloud、Google 客户端和同步状态
+    """
+
+    def __init__(self, engine: SyncEngine):
+        self.engine = engine
+        self.icloud = engine.icloud
+        self.google = engine.google
+        self.state = engine.state
+
+    def run(self, start_date: datetime, mode: str = 'verify') -> Dict[str, int]:
+        """
+        执行对账
+
+        Args:
+            start_date: 同步开始日期，iCloud 按同步时的范围读取，用于判断孤立事件
+            mode: 'verify'、'rebuild' 或 'cleanup'
+
+        Returns:
+            各类差异的数量
+        """
+        if mode not in MODES:
+            raise ValueError(f"未知的对账模式: {mode}")
+
+        print("\n[1/3] 正在读取 Google 日历建立索引...")
+        index = self.build_index()
+        print(f"  - 已同步的 Google 事件: {sum(len(items) for items in index.values())} 个，"
+              f"对应 {len(index)} 个 iCloud 事件")
+
+        print("\n[2/3] 正在读取 iCloud 事件...")
+        plan = self.engine.windows.plan(start_date, None) if self.engine.windows else fixed_window(start_date)
+        present = {}
+        icloud_events = [event for _, events in self.engine._iter_windows(plan, present) for event in events]
+        icloud_keys = {event_key(event) for event in icloud_events}
+        icloud_uids = {event['uid'] for event in icloud_events}
+        window = (plan.windows[0].start_position, plan.windows[-1].end_position)
+        print(f"  - iCloud 事件: {len(icloud_keys)} 个")
+
+        print("\n[3/3] 正在比对...")
+        keep, duplicates = self._pick(index)
+        orphans = self._orphans(keep, icloud_keys, icloud_uids, window)
+        state = dict(self.state.iter_events())
+
+        missing = sorted(key for key in keep if key not in state)
+        stale = sorted(key for key, entry in state.items() if key not in keep)
+        mismatched = sorted(
+            key for key, entry in state.items()
+            if key in keep and entry['google_id'] != keep[key]['google_id']
+        )
+
+        report = {
+            'consistent': len(state) - len(stale) - len(mismatched),
+            'missing': len(missing),
+            'stale': len(stale),
+            'mismatched': len(mismatched),
+            'duplicates': len(duplicates),
+            'orphans': len(orphans),
+        }
+        self._print_report(report, {
+            '状态缺失（Google 中有，状态中没有）': missing,
+            '状态过期（状态中有，Google 中已不存在）': stale,
+            'Google ID 不一致': mismatched,
+            '重复的 Google 事件': [f"{item['key']} -> {item['google_id']}" for item in duplicates],
+            '孤立的 Google 事件（iCloud 中已删除）': [f"{key} -> {keep[key]['google_id']}" for key in orphans],
+        })
+
+        if mode == 'cleanup':
+            self._cleanup(duplicates, orphans, keep)
+        if mode in ('rebuild', 'cleanup'):
+            self._rebuild(keep, state)
+        elif any(report[name] for name in report if name != 'consistent'):
+            print("使用 --reconcile rebuild 重写同步状态，--reconcile cleanup 同时删除重复和孤立的事件")
+        return report
+
+    def build_index(self) -> Dict[str, List[Dict]]:
+        """
+        分页读取 Google 日历，建立 事件键 -> [{google_id, hash, master, start}] 索引
+
+        同一事件键对应多个 Google 事件时说明有重复。
+        """
+        index: Dict[str, List[Dict]] = {}
+        for item in self.google.iter_synced_events():
+            private = item['extendedProperties']['private']
+            uid = private['icloud_uid']
+            recurrence_id = private.get('icloud_recurrence_id')
+            key = event_key({'uid': uid, 'recurrence_id': recurrence_id})
+
+            start = item.get('start', {})
+            start = start.get('dateTime') or start.get('date')
+            entry = {
+                'key': key,
+                'google_id': item['id'],
+                'hash': private.get('icloud_hash', ''),
+                'start': to_position(start) if start else None,
+            }
+            if recurrence_id:
+                entry['master'] = uid
+            index.setdefault(key, []).append(entry)
+        return index
+
+    def _pick(self, index: Dict[str, List[Dict]]):
+        """
+        每个事件键保留一个 Google 事件：优先保留同步状态中记录的那个，其余为重复
+
+        Returns:
+            (事件键 -> 保留的事件, 重复的事件列表)
+        """
+        keep = {}
+        duplicates = []
+        for key, items in index.items():
+            recorded = self.state.get_event(key)
+            chosen = items[0]
+            if recorded:
+                chosen = next((item for item in items if item['google_id'] == recorded['google_id']), chosen)
+            keep[key] = chosen
+            duplicates.extend(item for item in items if item is not chosen)
+        return keep, duplicates
+
+    @staticmethod
+    def _orphans(keep: Dict[str, Dict], icloud_keys: Set[str], icloud_uids: Set[str], window) -> List[str]:
+        """
+        iCloud 中已不存在的事件
+
+        只判断开始时间在读取范围内的事件（范围外的 iCloud 事件没有读取）。
+        例外实例的主体仍存在时不算孤立：删除它会取消该次重复。
+        """
+        orphans = []
+        for key, item in keep.items():
+            if key in icloud_keys or item['start'] is None:
+                continue
+            if not window[0] <= item['start'] < window[1]:
+                continue
+            if item.get('master') and item['master'] in icloud_uids:
+                continue
+            orphans.append(key)
+        return sorted(orphans)
+
+    def _cleanup(self, duplicates: List[Dict], orphans: List[str], keep: Dict[str, Dict]):
+        """批量删除重复和孤立的 Google 事件，删除成功的孤立事件从索引中移除"""
+        google_ids = [item['google_id'] for item in duplicates] + [keep[key]['google_id'] for key in orphans]
+        if not google_ids:
+            return
+        print(f"\n正在删除 {len(google_ids)} 个重复或孤立的 Google 事件...")
+        deleted = self.google.batch_delete_events(google_ids)
+        for key in orphans:
+            if deleted.get(keep[key]['google_id']):
+                del keep[key]
+        failed = sum(1 for google_id in google_ids if not deleted.get(google_id))
+        print(f"  - 删除成功: {len(google_ids) - failed} 个" + (f"，失败: {failed} 个" if failed else ""))
+
+    def _rebuild(self, keep: Dict[str, Dict], state: Dict[str, Dict]):
+        """按索引重写同步状态，并让下次同步重新读取全部 iCloud 事件"""
+        if self.engine.lease:
+            self.engine.lease.verify()
+        for key in state:
+            if key not in keep:
+                self.state.delete_event(key)
+        for key, item in keep.items():
+            entry = {'google_id': item['google_id'], 'hash': item['hash']}
+            if item.get('master'):
+                entry['master'] = item['master']
+            if item['start']:
+                entry['start'] = item['start']
+            recorded = state.get(key)
+            if (recorded and recorded.get('fields')
+                    and (recorded['google_id'], recorded['hash']) == (item['google_id'], item['hash'])):
+                # 映射未变时保留字段指纹，下次更新仍可只提交变化的字段
+                entry['fields'] = recorded['fields']
+            if state.get(key) != entry:
+                self.state.put_event(key, entry)
+
+        # 增量同步和分层窗口的记录基于旧状态，清除后下次同步做一次全量比对
+        self.state.set_meta('caldav', None)
+        self.state.set_meta('windows', None)
+        self.state.flush()
+        print(f"\n同步状态已重建: {len(keep)} 个事件")
+
+    @staticmethod
+    def _print_report(report: Dict[str, int], details: Dict[str, List[str]]):
+        print(f"\n{'=' * 50}")
+        print("对账结果:")
+        print(f"  - 一致: {report['consistent']}")
+        for title, items in details.items():
+            print(f"  - {title}: {len(items)}")
+            for item in items[:SHOW_LIMIT]:
+                print(f"      {item}")
+            if len(items) > SHOW_LIMIT:
+                print(f"      ...（共 {len(items)} 个）")
+        print(f"{'=' * 50}\n")
@@ -5,8 +5,11 @@
 # 项目目录（iCloud 路径）
 PROJECT_DIR="$HOME/Library/Mobile Documents/iCloud~md~obsidian/Documents/second_brain/obsidian/project/apple_to_goolge"
 
-# 日志文件
+# 日志文件：记录脚本自身的信息和 main.py 的标准输出（同步日志由 config.py 的 LOG_FILE 轮转写入），
+# 超过 LOG_MAX_BYTES 时轮转，保留 LOG_BACKUP_COUNT 个旧文件
 LOG_FILE="$PROJECT_DIR/sync.log"
+LOG_MAX_BYTES=$((5 * 1024 * 1024))
+LOG_BACKUP_COUNT=3
 
 # 锁文件（防止多台 Mac 同时运行）
 LOCK_FILE="$PROJECT_DIR/.sync.lock"
@@ -19,8 +22,23 @@ fi
 
 cd "$PROJECT_DIR"
 
+# 轮转 sync.log：sync.log -> sync.log.1 -> ... -> sync.log.$LOG_BACKUP_COUNT
+if [ -f "$LOG_FILE" ] && [ "$(stat -f %z "$LOG_FILE")" -ge $LOG_MAX_BYTES ]; then
+    for i in $(seq $((LOG_BACKUP_COUNT - 1)) -1 1); do
+        [ -f "$LOG_FILE.$i" ] && mv -f "$LOG_FILE.$i" "$LOG_FILE.$((i + 1))"
+    done
+    mv -f "$LOG_FILE" "$LOG_FILE.1"
+fi
+
+# config.py 中启用了同步租约（SYNC_LEASE_TTL）时由 main.py 协调多台机器，不再使用锁文件
+if grep -Eq '^SYNC_LEASE_TTL *= *[0-9]' config.py 2>/dev/null; then
+    USE_LOCK_FILE=0
+else
+    USE_LOCK_FILE=1
+fi
+
 # 检查锁文件（防止重复运行）
-if [ -f "$LOCK_FILE" ]; then
+if [ $USE_LOCK_FILE -eq 1 ] && [ -f "$LOCK_FILE" ]; then
     # 检查锁文件是否超过 30 分钟（可能是上次异常退出）
     LOCK_AGE=$(( $(date +%s) - $(stat -f %m "$LOCK_FILE") ))
     if [ $LOCK_AGE -lt 1800 ]; then
@@ -32,14 +50,16 @@ if [ -f "$LOCK_FILE" ]; then
     fi
 fi
 
-# 创建锁文件（包含机器名和时间）
-echo "$(hostname) - $(date)" > "$LOCK_FILE"
+if [ $USE_LOCK_FILE -eq 1 ]; then
+    # 创建锁文件（包含机器名和时间）
+    echo "$(hostname) - $(date)" > "$LOCK_FILE"
 
-# 清理函数
-cleanup() {
-    rm -f "$LOCK_FILE"
-}
-trap cleanup EXIT
+    # 清理函数
+    cleanup() {
+        rm -f "$LOCK_FILE"
+    }
+    trap cleanup EXIT
+fi
 
 # 记录开始
 echo "" >> "$LOG_FILE"
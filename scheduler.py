@@ -0,0 +1,57 @@
+"""
+自适应调度 - 根据每次同步的结果调整守护进程的同步间隔
+"""
+
+import random
+from typing import Dict, Optional
+
+
+class AdaptiveScheduler:
+    """
+    根据同步统计计算下次同步的等待时间
+
+    - 发现变更：间隔缩短到 min_interval（变更往往成批出现）
+    - 没有变更：间隔乘以 backoff，最多到 max_interval
+    - 同步失败或有错误：按连续失败次数乘以 error_backoff，最多到 max_error_interval
+    - 每次结果加上 ±jitter 比例的随机抖动，避免多台机器在同一时刻请求
+
+    时间单位均为秒。
+    """
+
+    def __init__(self, interval: float, min_interval: float, max_interval: float,
+                 backoff: float = 2.0, error_backoff: float = 4.0,
+                 max_error_interval: Optional[float] = None, jitter: float = 0.1):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.error_backoff = error_backoff
+        self.max_error_interval = max_error_interval or self.max_interval
+        self.jitter = jitter
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.error_streak = 0
+
+    def next_interval(self, stats: Optional[Dict[str, int]]) -> float:
+        """
+        计算下次同步前的等待时间
+
+        Args:
+            stats: SyncEngine.sync 返回的统计，同步抛出异常时为 None
+
+        Returns:
+            等待秒数
+        """
+        if stats is None or stats.get('errors'):
+            self.error_streak += 1
+            delay = min(self.max_error_interval,
+                        max(self.interval, self.min_interval) * self.error_backoff ** self.error_streak)
+            return self._jittered(delay)
+
+        self.error_streak = 0
+        if stats['created'] or stats['updated'] or stats['deleted']:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return self._jittered(self.interval)
+
+    def _jittered(self, delay: float) -> float:
+        return max(0.0, delay * random.uniform(1 - self.jitter, 1 + self.jitter))
@@ -0,0 +1,485 @@
+"""
+同步状态存储 - 记录 iCloud 事件与 Google 事件的映射
+
+提供两种后端：
+- JsonStateStore: 整个状态保存在一个 JSON 文件中，同步结束时一次性写回
+- SqliteStateStore: 按 iCloud UID 和 Google ID 建索引，每个操作单独提交事务
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping, Set as AbstractSet
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from event_record import DigestView, StateEntry, to_digest
+from sync_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+class StateStore:
+    """
+    同步状态存储接口
+
+    事件按事件键（见 icloud_calendar.event_key）保存，每条记录为
+    {google_id, hash[, master][, start][, fields]}，start 为事件开始时间（见
+    time_windows.event_position），fields 为上次写入 Google 的各字段指纹（见
+    GoogleCalendar.field_fingerprints）；其他状态（如 last_sync）以名称保存。
+    """
+
+    # 事件映射的写入是否立即持久化（否则在 flush() 时一次性写回）
+    durable_writes = False
+
+    def get_event(self, key: str) -> Optional[Dict]:
+        """获取事件映射，不存在时返回 None"""
+        raise NotImplementedError
+
+    def put_event(self, key: str, entry: Dict):
+        """保存事件映射"""
+        raise NotImplementedError
+
+    def set_hash(self, key: str, event_hash: str, start: Optional[str] = None,
+                 fields: Optional[Dict[str, str]] = None):
+        """更新事件哈希，提供 start / fields 时一并更新开始时间和字段指纹"""
+        raise NotImplementedError
+
+    def set_starts(self, starts: Dict[str, str]):
+        """批量更新已同步事件的开始时间，不存在的键被忽略"""
+        raise NotImplementedError
+
+    def delete_event(self, key: str):
+        """删除事件映射"""
+        raise NotImplementedError
+
+    def get_digests(self, keys: Iterable[str]) -> Mapping:
+        """
+        批量获取已同步事件的哈希摘要（16 字节，见 event_record.to_digest）
+
+        返回值只用于按键查询：不在 keys 中的键可能也能查到（内存中的状态直接返回视图，
+        不复制），不存在的键查不到。
+        """
+        raise NotImplementedError
+
+    def missing_keys(self, present_keys: Iterable[str], start: Optional[str] = None,
+                     end: Optional[str] = None) -> Set[str]:
+        """
+        返回已同步但不在 present_keys 中的事件键（用于删除检测）
+
+        present_keys 为集合或映射（如 dict.keys()）时直接查询，不复制。
+        提供 start / end 时只检查开始时间在 [start, end) 内的事件，
+        没有记录开始时间的事件不在检查范围内。
+        """
+        raise NotImplementedError
+
+    def count_events(self) -> int:
+        """已同步事件数"""
+        raise NotImplementedError
+
+    def iter_events(self) -> Iterator[Tuple[str, Dict]]:
+        """遍历所有事件映射 (事件键, 记录)"""
+        raise NotImplementedError
+
+    def get_meta(self, name: str, default: Any = None) -> Any:
+        """读取其他状态"""
+        raise NotImplementedError
+
+    def set_meta(self, name: str, value: Any):
+        """保存其他状态（需可 JSON 序列化）"""
+        raise NotImplementedError
+
+    def read_meta(self, name: str, default: Any = None) -> Any:
+        """从存储中重新读取其他状态，不使用内存中的副本（其他机器可能已修改，见 lease.py）"""
+        raise NotImplementedError
+
+    def write_meta(self, name: str, value: Any):
+        """保存其他状态并立即持久化，不连带写入其他尚未保存的修改"""
+        raise NotImplementedError
+
+    def reload(self):
+        """重新加载存储，丢弃尚未保存的修改（取得同步租约后读取其他机器的同步结果）"""
+
+    def status(self) -> Dict:
+        """同步状态概要：已同步事件数和上次同步时间"""
+        return {
+            'total_synced_events': self.count_events(),
+            'last_sync': self.get_meta('last_sync')
+        }
+
+    def flush(self):
+        """把尚未持久化的修改写入存储"""
+
+    def close(self):
+        """关闭存储"""
+        self.flush()
+
+
+class JsonStateStore(StateStore):
+    """
+    基于单个 JSON 文件的状态存储，格式与旧版 sync_state.json 一致
+
+    事件映射在内存中保存为 事件键 -> StateEntry（见 event_record），
+    其他状态保存在 state 字典中。
+    """
+
+    def __init__(self, state_file: str):
+        self.state_file = state_file
+        self.lock = threading.Lock()
+        self.state, self.events = self._split(self._load())
+
+    def _load(self) -> Dict:
+        """加载同步状态"""
+        try:
+            state = self._read_file()
+            if state is not None:
+                return state
+        except Exception as e:
+            log.error("加载同步状态失败: %s", e)
+
+        return {
+            'events': {},  # 事件键 -> {google_id, hash[, master]}
+            'last_sync': None
+        }
+
+    @staticmethod
+    def _split(state: Dict) -> Tuple[Dict, Dict[str, StateEntry]]:
+        """把状态文件的内容拆分为 (其他状态, 紧凑的事件映射)"""
+        events = state.pop('events', None) or {}
+        return state, {key: StateEntry.from_dict(entry) for key, entry in events.items()}
+
+    def _read_file(self) -> Optional[Dict]:
+        """读取状态文件，不存在时返回 None"""
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_file(self, state: Dict):
+        """先写临时文件再替换，其他机器不会读到写了一半的文件"""
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.state_file)
+
+    def get_event(self, key: str) -> Optional[Dict]:
+        entry = self.events.get(key)
+        return entry.to_dict() if entry else None
+
+    def put_event(self, key: str, entry: Dict):
+        self.events[key] = StateEntry.from_dict(entry)
+
+    def set_hash(self, key: str, event_hash: str, start: Optional[str] = None,
+                 fields: Optional[Dict[str, str]] = None):
+        entry = self.events[key]
+        entry.digest = to_digest(event_hash)
+        if start is not None:
+            entry.start = start
+        if fields is not None:
+            entry.fields = StateEntry.dump_fields(fields)
+
+    def set_starts(self, starts: Dict[str, str]):
+        events = self.events
+        for key, start in starts.items():
+            if key in events:
+                events[key].start = start
+
+    def delete_event(self, key: str):
+        self.events.pop(key, None)
+
+    def get_digests(self, keys: Iterable[str]) -> Mapping:
+        return DigestView(self.events)
+
+    def missing_keys(self, present_keys: Iterable[str], start: Optional[str] = None,
+                     end: Optional[str] = None) -> Set[str]:
+        if not isinstance(present_keys, (AbstractSet, Mapping)):
+            present_keys = set(present_keys)
+        if start is None and end is None:
+            return {key for key in self.events if key not in present_keys}
+        return {
+            key for key, entry in self.events.items()
+            if entry.start is not None
+            and (start is None or entry.start >= start)
+            and (end is None or entry.start < end)
+            and key not in present_keys
+        }
+
+    def count_events(self) -> int:
+        return len(self.events)
+
+    def iter_events(self) -> Iterator[Tuple[str, Dict]]:
+        for key, entry in list(self.events.items()):
+            yield key, entry.to_dict()
+
+    def get_meta(self, name: str, default: Any = None) -> Any:
+        return self.state.get(name, default)
+
+    def set_meta(self, name: str, value: Any):
+        self.state[name] = value
+
+    def read_meta(self, name: str, default: Any = None) -> Any:
+        with self.lock:
+            return (self._read_file() or {}).get(name, default)
+
+    def write_meta(self, name: str, value: Any):
+        # 只修改文件中的这一项，内存中尚未保存的事件映射仍在 flush() 时写入
+        with self.lock:
+            self.state[name] = value
+            saved = self._read_file() or {'events': {}, 'last_sync': None}
+            saved[name] = value
+            self._write_file(saved)
+
+    def reload(self):
+        with self.lock:
+            self.state, self.events = self._split(self._load())
+
+    def flush(self):
+        """保存同步状态"""
+        try:
+            with self.lock:
+                events = {key: entry.to_dict() for key, entry in self.events.items()}
+                self._write_file({'events': events, **self.state})
+        except Exception as e:
+            log.error("保存同步状态失败: %s", e)
+
+
+class SqliteStateStore(StateStore):
+    """
+    基于 SQLite 的状态存储
+
+    每次写入单独提交，同步中途崩溃不会丢失已完成的映射。
+    首次打开时如果提供了旧的 JSON 状态文件，会自动导入。
+    """
+
+    durable_writes = True
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS events (
+            key TEXT PRIMARY KEY,
+            uid TEXT NOT NULL,
+            google_id TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            master TEXT,
+            start TEXT,
+            fields TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_events_uid ON events (uid);
+        CREATE INDEX IF NOT EXISTS idx_events_google_id ON events (google_id);
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        );
+    '''
+
+    def __init__(self, db_file: str, legacy_json: Optional[str] = None):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = self._connect()
+        self.conn.executescript(self.SCHEMA)
+        self._upgrade()
+
+        if legacy_json and self.get_meta('migrated_from') is None and os.path.exists(legacy_json):
+            self._migrate(legacy_json)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        # 数据库可能放在 iCloud Drive 中，使用默认的回滚日志而不是 WAL，
+        # 避免 -wal 文件与主文件分开同步
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def _upgrade(self):
+        """升级旧版本创建的数据库"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(events)')}
+        with self.conn:
+            if 'start' not in columns:
+                self.conn.execute('ALTER TABLE events ADD COLUMN start TEXT')
+            if 'fields' not in columns:
+                self.conn.execute('ALTER TABLE events ADD COLUMN fields TEXT')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_events_start ON events (start)')
+
+    def _migrate(self, legacy_json: str):
+        """从旧的 JSON 状态文件导入"""
+        legacy = JsonStateStore(legacy_json)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO events (key, uid, google_id, hash, master, start, fields) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (key, entry.get('master') or key, entry['google_id'], entry['hash'],
+                     entry.get('master'), entry.get('start'), self._dump_fields(entry))
+                    for key, entry in legacy.iter_events()
+                )
+            )
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+                (
+                    (name, json.dumps(value, ensure_ascii=False))
+                    for name, value in legacy.state.items()
+                )
+            )
+            self.conn.execute(
+                'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+                ('migrated_from', json.dumps(legacy_json, ensure_ascii=False))
+            )
+        log.info("已从 %s 导入 %s 条同步记录", legacy_json, legacy.count_events())
+
+    def get_event(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT google_id, hash, master, start, fields FROM events WHERE key = ?', (key,)
+            ).fetchone()
+        return self._entry(*row) if row else None
+
+    def put_event(self, key: str, entry: Dict):
+        master = entry.get('master')
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO events (key, uid, google_id, hash, master, start, fields) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, master or key, entry['google_id'], entry['hash'], master, entry.get('start'),
+                 self._dump_fields(entry))
+            )
+
+    def set_hash(self, key: str, event_hash: str, start: Optional[str] = None,
+                 fields: Optional[Dict[str, str]] = None):
+        fields = self._dump_fields({'fields': fields})
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE events SET hash = ?, start = COALESCE(?, start), fields = COALESCE(?, fields) WHERE key = ?',
+                (event_hash, start, fields, key)
+            )
+
+    @staticmethod
+    def _entry(google_id: str, event_hash: str, master: Optional[str], start: Optional[str],
+               fields: Optional[str]) -> Dict:
+        """把一行记录转换为事件映射"""
+        entry = {'google_id': google_id, 'hash': event_hash}
+        if master:
+            entry['master'] = master
+        if start:
+            entry['start'] = start
+        if fields:
+            entry['fields'] = json.loads(fields)
+        return entry
+
+    @staticmethod
+    def _dump_fields(entry: Dict) -> Optional[str]:
+        """字段指纹保存为 JSON 文本"""
+        fields = entry.get('fields')
+        return json.dumps(fields, sort_keys=True) if fields else None
+
+    def set_starts(self, starts: Dict[str, str]):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'UPDATE events SET start = ? WHERE key = ?', ((start, key) for key, start in starts.items())
+            )
+
+    def delete_event(self, key: str):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM events WHERE key = ?', (key,))
+
+    def get_digests(self, keys: Iterable[str]) -> Mapping:
+        with self.lock, self.conn:
+            self._load_keys(keys)
+            rows = self.conn.execute(
+                'SELECT e.key, e.hash FROM events e JOIN temp.present p ON e.key = p.key'
+            ).fetchall()
+        return {key: to_digest(event_hash) for key, event_hash in rows}
+
+    def missing_keys(self, present_keys: Iterable[str], start: Optional[str] = None,
+                     end: Optional[str] = None) -> Set[str]:
+        query = 'SELECT key FROM events WHERE key NOT IN (SELECT key FROM temp.present)'
+        params = []
+        if start is not None or end is not None:
+            query += ' AND start IS NOT NULL'
+        if start is not None:
+            query += ' AND start >= ?'
+            params.append(start)
+        if end is not None:
+            query += ' AND start < ?'
+            params.append(end)
+        with self.lock, self.conn:
+            self._load_keys(present_keys)
+            rows = self.conn.execute(query, params).fetchall()
+        return {row[0] for row in rows}
+
+    def _load_keys(self, keys: Iterable[str]):
+        """把一组事件键写入临时表，供 JOIN 查询使用（调用方持有锁）"""
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS present (key TEXT PRIMARY KEY)')
+        self.conn.execute('DELETE FROM temp.present')
+        self.conn.executemany(
+            'INSERT OR IGNORE INTO temp.present (key) VALUES (?)', ((key,) for key in keys)
+        )
+
+    def count_events(self) -> int:
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def iter_events(self) -> Iterator[Tuple[str, Dict]]:
+        with self.lock:
+            rows = self.conn.execute('SELECT key, google_id, hash, master, start, fields FROM events').fetchall()
+        for key, *row in rows:
+            yield key, self._entry(*row)
+
+    def get_meta(self, name: str, default: Any = None) -> Any:
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, name: str, value: Any):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+                (name, json.dumps(value, ensure_ascii=False))
+            )
+
+    # 同步租约使用新的连接读写：iCloud Drive 可能已用其他机器上的版本替换了数据库文件，
+    # 长期打开的连接仍指向旧文件
+
+    def read_meta(self, name: str, default: Any = None) -> Any:
+        with contextlib.closing(self._connect()) as conn:
+            row = conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def write_meta(self, name: str, value: Any):
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+                (name, json.dumps(value, ensure_ascii=False))
+            )
+
+    def reload(self):
+        with self.lock:
+            self.conn.close()
+            self.conn = self._connect()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def open_state_store(state_file: str, backend: str = 'json') -> StateStore:
+    """
+    按配置打开状态存储
+
+    Args:
+        state_file: 状态文件路径
+        backend: 'json' 或 'sqlite'；使用 sqlite 且 state_file 为 .json 时，
+            数据库保存在同名 .db 文件中，并自动导入原 JSON 状态
+
+    Returns:
+        状态存储
+    """
+    if backend == 'json':
+        return JsonStateStore(state_file)
+
+    if backend == 'sqlite':
+        root, ext = os.path.splitext(state_file)
+        if ext == '.json':
+            return SqliteStateStore(root + '.db', legacy_json=state_file)
+        return SqliteStateStore(state_file)
+
+    raise ValueError(f"未知的状态存储后端: {backend}")
@@ -0,0 +1,197 @@
+"""
+多账号同步 - 按 SYNC_ACCOUNTS 在进程池中并行同步多组 iCloud 账号和 Google 日历
+
+每组同步对在子进程中使用自己的 CalendarSync、SyncEngine 和同步状态，
+某一组失败（包括子进程异常退出）不影响其他组，全部完成后打印汇总报告。
+"""
+
+import contextlib
+import io
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from calendar_sync import CalendarSync, LOG_LEVEL, SYNC_ENGINE, SYNC_STATE_BACKEND, account_settings, state_files
+from metrics import metrics
+from state_store import open_state_store
+from sync_log import get_logger, set_level
+
+
+log = get_logger(__name__)
+
+
+def sync_account(account: Dict, engine: str) -> Dict:
+    """
+    子进程：同步一组账号
+
+    Returns:
+        {name, status ('ok' | 'errors' | 'failed'), stats, error, duration, output}，
+        output 为同步过程的日志，由主进程按组整体写入，避免多组输出交错
+    """
+    started = time.perf_counter()
+    set_level(LOG_LEVEL)
+    output = io.StringIO()
+    result = {'name': account['name'], 'status': 'failed', 'stats': None, 'error': None}
+
+    with contextlib.redirect_stdout(output):
+        try:
+            app = CalendarSync(engine, account)
+            if not app.setup():
+                result['error'] = '初始化失败'
+            elif not app.sync_once():
+                result['error'] = '同步出错'
+            else:
+                result['stats'] = app.last_stats
+                result['status'] = 'errors' if app.last_stats['errors'] else 'ok'
+        except Exception as e:
+            result['error'] = str(e)
+            log.exception("同步出错: %s", e)
+
+    result['duration'] = round(time.perf_counter() - started, 2)
+    result['output'] = output.getvalue()
+    return result
+
+
+def _ignore_sigint():
+    """子进程忽略 Ctrl+C，由主进程在本轮同步结束后退出"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class SyncSupervisor(CalendarSync):
+    """
+    多账号同步应用
+
+    复用 CalendarSync 的单次同步、守护进程循环、自适应调度和指标文件，
+    每次同步把各组同步对分配到最多 max_parallel 个子进程中执行。
+    """
+
+    def __init__(self, accounts: List[Dict], engine: str = SYNC_ENGINE, max_parallel: int = 2):
+        super().__init__(engine)
+        self.accounts = accounts
+        self.max_parallel = max(1, max_parallel)
+        self.last_results: List[Dict] = []
+
+        # 提前检查配置，避免子进程启动后才发现错误
+        settings = [account_settings(account) for account in accounts]
+        for field in ('name', 'state_file'):
+            values = [item[field] for item in settings]
+            duplicates = sorted({value for value in values if values.count(value) > 1})
+            if duplicates:
+                raise ValueError(f"SYNC_ACCOUNTS 中的 {field} 重复: {', '.join(duplicates)}")
+        self.account_settings = settings
+
+    def setup(self, connect_google: bool = True) -> bool:
+        """各组在子进程中各自连接，这里只记录配置"""
+        log.info("多账号模式: %s 组同步对，最多同时同步 %s 组", len(self.accounts), self.max_parallel)
+        for settings in self.account_settings:
+            log.info("%s: %s -> %s", settings['name'], settings['icloud_username'], settings['google_calendar_id'])
+        return True
+
+    def sync_once(self) -> bool:
+        """同步所有账号，全部成功时返回 True"""
+        started = datetime.now()
+        results = self.run_accounts()
+        self.last_results = results
+        self.last_stats = self._aggregate(results)
+        self.print_report(results)
+        self.write_metrics(started, self.last_stats, accounts=[
+            {key: value for key, value in result.items() if key != 'output'} for result in results
+        ])
+        return all(result['status'] != 'failed' for result in results)
+
+    def run_accounts(self) -> List[Dict]:
+        """在进程池中同步所有账号，按配置顺序返回各组结果"""
+        # 使用 spawn 启动子进程，每组都从干净的解释器开始，不继承主进程的连接和状态
+        context = multiprocessing.get_context('spawn')
+        workers = min(self.max_parallel, len(self.accounts))
+        results = {}
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_ignore_sigint) as pool:
+            futures = {
+                pool.submit(sync_account, account, self.engine_type): account['name']
+                for account in self.accounts
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 子进程异常退出时进程池不可用，尚未完成的组都会走到这里
+                    result = {'name': name, 'status': 'failed', 'stats': None,
+                              'error': f"子进程异常退出: {e}", 'duration': None, 'output': ''}
+
+                log.info("%s %s %s\n%s", '#' * 20, name, '#' * 20, result['output'].rstrip() or '（无输出）')
+                if result['error']:
+                    log.error("%s: %s", name, result['error'])
+
+                metrics.inc('sync_account_runs_total', account=name, result=result['status'])
+                for key, count in (result['stats'] or {}).items():
+                    metrics.set('sync_account_last_run_events', count, account=name, result=key)
+                results[name] = result
+
+        return [results[account['name']] for account in self.accounts]
+
+    @staticmethod
+    def _aggregate(results: List[Dict]) -> Optional[Dict[str, int]]:
+        """
+        汇总各组统计，失败的组计入 errors（自适应调度据此退避）
+
+        Returns:
+            汇总统计，所有组都失败时为 None
+        """
+        # 与 CalendarSync.sync_once 一样按需导入（sync_engine 依赖 caldav、googleapiclient）
+        from sync_engine import STAT_KEYS
+
+        if all(result['stats'] is None for result in results):
+            return None
+        total = dict.fromkeys(STAT_KEYS, 0)
+        for result in results:
+            if result['stats'] is None:
+                total['errors'] += 1
+                continue
+            for key in STAT_KEYS:
+                total[key] += result['stats'].get(key, 0)
+        return total
+
+    def print_report(self, results: List[Dict]):
+        """记录各组和合计的同步结果（JSON 格式日志中 accounts 为结构化字段）"""
+        from sync_engine import STAT_KEYS
+
+        failed = sum(1 for result in results if result['status'] == 'failed')
+        lines = [f"多账号同步完成: {len(results)} 组，成功 {len(results) - failed}，失败 {failed}",
+                 # 表头为全角字符，按显示宽度对齐
+                 f"  {'名称':<10} {'状态':<4} {'耗时':>5}  创建/更新/删除/未变更/错误/推迟"]
+        for result in results:
+            stats = result['stats']
+            counts = '/'.join(str(stats[key]) for key in STAT_KEYS) if stats else result['error']
+            duration = f"{result['duration']:.1f}s" if result['duration'] is not None else '-'
+            lines.append(f"  {result['name']:<12} {result['status']:<6} {duration:>7}  {counts}")
+        if self.last_stats:
+            lines.append(f"  {'合计':<10} {'':<6} {'':>7}  {'/'.join(str(self.last_stats[key]) for key in STAT_KEYS)}")
+        log.info('\n'.join(lines), extra={'accounts': [
+            {key: value for key, value in result.items() if key != 'output'} for result in results
+        ]})
+
+    def reconcile(self, mode: str = 'verify') -> bool:
+        """对账按组进行，多账号模式下需要用 --account 指定一组"""
+        print("错误: 多账号模式下请用 --account 指定要对账的一组")
+        return False
+
+    def preview(self) -> bool:
+        """写入计划按组生成，多账号模式下需要用 --account 指定一组"""
+        print("错误: 多账号模式下请用 --account 指定要查看写入计划的一组")
+        return False
+
+    def show_status(self):
+        """显示各组的同步状态（只读取本地状态文件）"""
+        for settings in self.account_settings:
+            statuses = [open_state_store(state_file, SYNC_STATE_BACKEND).status()
+                        for state_file in state_files(settings)]
+            last_syncs = [status['last_sync'] for status in statuses if status['last_sync']]
+            print(f"\n{settings['name']} 同步状态:")
+            print(f"  - 已同步事件数: {sum(status['total_synced_events'] for status in statuses)}")
+            print(f"  - 上次同步时间: {max(last_syncs) if last_syncs else '从未同步'}")
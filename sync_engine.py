@@ -2,47 +2,73 @@
 同步引擎 - 处理增删改检测和同步
 """
 
-import json
-import os
+import queue
+import threading
+import time
+from collections.abc import Set as AbstractSet
 from datetime import datetime
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from icloud_calendar import ICloudCalendar
-from google_calendar import GoogleCalendar
+from icloud_calendar import ICloudCalendar, event_key
+from google_calendar import GoogleCalendar, PATCH_FIELDS
+from lease import Lease, LeaseLost
+from metrics import metrics
+from planner import ExecutionPlan, OperationPlanner, print_plan
+from state_store import open_state_store
+from sync_log import get_logger
+from time_windows import TieredWindows, TimeWindow, WindowPlan, event_position, fixed_window
+
+
+log = get_logger(__name__)
+
+
+# 同步统计的各项
+STAT_KEYS = ('created', 'updated', 'deleted', 'unchanged', 'errors', 'deferred')
+
+
+class _KeyUnion(AbstractSet):
+    """多个窗口读取到的事件键的并集视图，查询时逐个检查，不复制"""
+
+    def __init__(self, sets: Iterable[Set[str]]):
+        self.sets = list(sets)
+
+    def __contains__(self, key) -> bool:
+        return any(key in keys for keys in self.sets)
+
+    def __iter__(self) -> Iterator[str]:
+        for i, keys in enumerate(self.sets):
+            for key in keys:
+                if not any(key in earlier for earlier in self.sets[:i]):
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
 
 
 class SyncEngine:
     """日历同步引擎"""
 
-    def __init__(self, icloud: ICloudCalendar, google: GoogleCalendar, state_file: str):
+    def __init__(self, icloud: ICloudCalendar, google: GoogleCalendar, state_file: str,
+                 incremental: bool = False, batch_writes: bool = False,
+                 state_backend: str = 'json', streaming: bool = False,
+                 write_queue_size: int = 200, windows: Optional[TieredWindows] = None,
+                 planner: Optional[OperationPlanner] = None, patch_updates: bool = False,
+                 lease: Optional[Lease] = None):
         self.icloud = icloud
         self.google = google
         self.state_file = state_file
-        self.sync_state = self._load_state()
-
-    def _load_state(self) -> Dict:
-        """加载同步状态"""
-        if os.path.exists(self.state_file):
-            try:
-                with open(self.state_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"加载同步状态失败: {e}")
-
-        return {
-            'events': {},  # icloud_uid -> {google_id, hash}
-            'last_sync': None
-        }
-
-    def _save_state(self):
-        """保存同步状态"""
-        try:
-            with open(self.state_file, 'w', encoding='utf-8') as f:
-                json.dump(self.sync_state, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存同步状态失败: {e}")
-
-    def sync(self, start_date: datetime) -> Dict[str, int]:
+        self.incremental = incremental
+        self.batch_writes = batch_writes
+        self.streaming = streaming                  # 流水线模式（增量模式下不生效）
+        self.write_queue_size = write_queue_size    # 流水线模式下待写入操作的队列上限
+        self.windows = windows                      # 分层时间窗口（增量模式下不生效）
+        self.planner = planner                      # 写入计划和配额预算（流水线模式下不生效）
+        self.pending_ops = []                       # 本次同步推迟的操作
+        self.patch_updates = patch_updates          # 只提交变化的字段（PATCH）
+        self.lease = lease                          # 多台机器共享同步状态时的同步租约
+        self.state = open_state_store(state_file, state_backend)
+
+    def sync(self, start_date: datetime) -> Optional[Dict[str, int]]:
         """
         执行同步
 
@@ -50,85 +76,571 @@ class SyncEngine:
             start_date: 同步开始日期
 
         Returns:
-            同步统计 {created, updated, deleted, unchanged}
+            同步统计 {created, updated, deleted, unchanged}；
+            同步租约由其他机器持有时跳过本次同步，返回 None
+        """
+        if not self.acquire_lease():
+            return None
+        try:
+            return self._sync(start_date)
+        finally:
+            self.release_lease()
+
+    def acquire_lease(self) -> bool:
+        """取得同步租约（未配置时总是成功），取得后重新加载同步状态"""
+        if not self.lease:
+            return True
+        if not self.lease.acquire(self.state):
+            current = self.lease.current
+            log.info("同步租约由 %s 持有（%s 到期），跳过本次同步",
+                     current['holder'], datetime.fromtimestamp(current['expires']).strftime('%H:%M:%S'))
+            return False
+        log.info("已取得同步租约（令牌 %s）", self.lease.token)
+        # 上次同步之后其他机器可能已修改同步状态
+        self.state.reload()
+        return True
+
+    def release_lease(self):
+        if self.lease:
+            self.lease.release()
+
+    def _check_lease(self):
+        """写入 Google 前确认仍持有租约，失去租约时抛出 LeaseLost"""
+        if self.lease:
+            self.lease.check()
+
+    def _fence_write(self):
+        """
+        写入同步状态前确认仍持有租约，失去租约时抛出 LeaseLost
+
+        SQLite 后端每次写入立即提交到共享的数据库，每次写入前重新读取租约核对防护令牌；
+        JSON 后端的修改只在内存中，提交前会统一核对（见 _finish_sync），这里只检查心跳结果。
+        """
+        if self.lease:
+            if self.state.durable_writes:
+                self.lease.verify()
+            else:
+                self.lease.check()
+
+    def _sync(self, start_date: datetime) -> Dict[str, int]:
+        """执行同步（已取得租约）"""
+        stats = self._begin_sync()
+
+        with metrics.timer('sync_run_seconds'):
+            delta = None
+            plan = None if self.incremental else self._plan_windows(start_date)
+            if self.streaming and not self.incremental:
+                total = self._sync_streaming(plan, stats)
+            else:
+                total, delta = self._sync_phased(start_date, plan, stats)
+
+            self._finish_sync(stats, total, delta, plan)
+        return stats
+
+    def _begin_sync(self) -> Dict[str, int]:
+        """记录开始信息，返回新的同步统计"""
+        log.info("开始同步 - %s", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        self.pending_ops = []
+        return dict.fromkeys(STAT_KEYS, 0)
+
+    def _finish_sync(self, stats: Dict[str, int], total: int, delta: Optional[Dict] = None,
+                     plan: Optional[WindowPlan] = None):
+        """计算未变更数量、保存状态并记录统计"""
+        # 计算未变更数量（推迟的创建和更新不算未变更）
+        deferred_writes = sum(1 for kind, _ in self.pending_ops if kind != 'delete')
+        stats['unchanged'] = total - stats['created'] - stats['updated'] - deferred_writes
+        # 有失败或推迟的操作时不推进增量状态和分层窗口，下次重新读取同样的事件
+        advance = stats['errors'] == 0 and not self.pending_ops
+
+        # 保存状态：先确认租约没有被接管（防护令牌未变化），否则放弃提交
+        log.info("[4/4] 正在保存同步状态...")
+        if self.lease:
+            self.lease.verify()
+        with metrics.timer('sync_phase_seconds', phase='save'):
+            if delta and advance:
+                self.state.set_meta('caldav', delta['state'])
+            if plan and plan.tiered and advance:
+                self.state.set_meta('windows', plan.state)
+            if self.planner:
+                self.state.set_meta('pending_ops', [list(op) for op in self.pending_ops])
+            self.state.set_meta('last_sync', datetime.now().isoformat())
+            self.state.flush()
+        self._record_metrics(stats)
+
+        # 汇总统计（JSON 格式日志中 stats / requests 为结构化字段）
+        summary = [f"创建 {stats['created']}", f"更新 {stats['updated']}",
+                   f"删除 {stats['deleted']}", f"未变更 {stats['unchanged']}"]
+        if stats['errors'] > 0:
+            summary.append(f"错误 {stats['errors']}")
+        if stats['deferred'] > 0:
+            summary.append(f"推迟到下次同步 {stats['deferred']}")
+        request_stats = self.google.get_request_stats()
+        if request_stats['throttles'] or request_stats['retries']:
+            summary.append(f"Google 限流 {request_stats['throttles']} 次，重试 {request_stats['retries']} 次"
+                           f"（当前速率 {request_stats['rate']} 次/秒）")
+        log.info("同步完成: %s", '，'.join(summary), extra={'stats': dict(stats), 'requests': request_stats})
+
+    def _record_metrics(self, stats: Dict[str, int]):
+        """把本次同步结果计入运行指标"""
+        for result, count in stats.items():
+            metrics.inc('sync_events_total', count, result=result)
+            metrics.set('sync_last_run_events', count, result=result)
+        metrics.inc('sync_runs_total', result='errors' if stats['errors'] else 'ok')
+        metrics.set('sync_last_run_timestamp_seconds', time.time())
+        metrics.set('sync_synced_events', self.state.count_events())
+
+    def _sync_phased(self, start_date: datetime, plan: Optional[WindowPlan],
+                     stats: Dict[str, int]) -> Tuple[int, Optional[Dict]]:
         """
-        stats = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'errors': 0}
+        分阶段同步：读取全部事件后统一检测变更并写入
 
-        print(f"\n{'='*50}")
-        print(f"开始同步 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"{'='*50}")
+        Args:
+            plan: 读取的时间窗口，增量模式下为 None
 
+        Returns:
+            (iCloud 事件总数, 增量模式下的变更结果)
+        """
         # 1. 从 iCloud 获取事件
-        print("\n[1/4] 正在从 iCloud 获取事件...")
-        icloud_events = self.icloud.get_events(start_date)
-        icloud_events_dict = {event['uid']: event for event in icloud_events}
+        log.info("[1/4] 正在从 iCloud 获取事件...")
+        present = {}
+        with metrics.timer('sync_phase_seconds', phase='fetch'):
+            delta, icloud_events = self._fetch_phased(start_date, plan, present)
+        icloud_events_dict = {event_key(event): event for event in icloud_events}
+
+        # 2. 检测需要创建、更新和删除的事件
+        log.info("[2/4] 正在检测变更...")
+        with metrics.timer('sync_phase_seconds', phase='diff'):
+            to_create, to_update, to_delete = self._detect_phased(
+                delta, plan, present, icloud_events, icloud_events_dict
+            )
+            if not delta:
+                self._record_positions(plan, icloud_events_dict)
+            self._resolve_override_deletions(to_update, to_delete, icloud_events_dict, stats)
+
+        log.info("需要创建 %s 个、更新 %s 个、删除 %s 个事件", len(to_create), len(to_update), len(to_delete))
+        to_create, to_update, to_delete = self._schedule(to_create, to_update, to_delete, icloud_events_dict, stats)
+
+        # 3. 执行同步操作
+        log.info("[3/4] 正在执行同步...")
+
+        with metrics.timer('sync_phase_seconds', phase='apply'):
+            if self.batch_writes:
+                self._apply_batch(to_create, to_update, to_delete, icloud_events_dict, stats)
+            else:
+                self._apply(to_create, to_update, to_delete, icloud_events_dict, stats)
+
+        total = delta['total'] if delta else len(icloud_events)
+        return total, delta
+
+    def _fetch_phased(self, start_date: datetime, plan: Optional[WindowPlan],
+                      present: Dict[str, Set[str]]) -> Tuple[Optional[Dict], List[Dict]]:
+        """
+        读取 iCloud 事件
 
-        # 2. 检测需要创建和更新的事件
-        print("\n[2/4] 正在检测变更...")
+        Returns:
+            (增量模式下的变更结果, 读取到的事件)
+        """
+        if self.incremental:
+            delta = self.icloud.get_event_changes(start_date, state=self.state.get_meta('caldav'))
+            return delta, delta['changed']
+        icloud_events = [event for _, events in self._iter_windows(plan, present) for event in events]
+        log.info("共获取到 %s 个事件", len(icloud_events))
+        return None, icloud_events
+
+    def _detect_phased(self, delta: Optional[Dict], plan: Optional[WindowPlan], present: Dict[str, Set[str]],
+                       icloud_events: List[Dict], icloud_events_dict: Dict[str, Dict]
+                       ) -> Tuple[Set[str], Set[str], Set[str]]:
+        """检测需要创建、更新和删除的事件（不修改同步状态）"""
         to_create, to_update = self._detect_changes(icloud_events_dict)
+        if delta and not delta['full']:
+            to_delete = self._detect_removed(delta['removed'], icloud_events_dict)
+        elif delta:
+            to_delete = self._detect_deletions(icloud_events_dict)
+        else:
+            to_delete = self._detect_window_deletions(
+                plan, present, {event['uid'] for event in icloud_events}
+            )
+        return to_create, to_update, to_delete
+
+    def _schedule(self, to_create: Set[str], to_update: Set[str], to_delete: Set[str],
+                  icloud_events: Dict[str, Dict], stats: Dict[str, int]
+                  ) -> Tuple[Iterable[str], Iterable[str], Iterable[str]]:
+        """
+        按写入计划选出本次执行的操作
+
+        未配置配额预算时原样返回；否则按优先级排序，超出预算的操作记入
+        pending_ops，由 _finish_sync 保存，下次同步与新检测到的操作一起重新排队。
+        """
+        if not self.planner:
+            return to_create, to_update, to_delete
+
+        result = self.planner.plan(to_create, to_update, to_delete, icloud_events, self.state,
+                                   self.state.get_meta('pending_ops') or [])
+        self.pending_ops = result.deferred
+        stats['deferred'] = len(result.deferred)
+        if result.resumed:
+            log.info("其中上次同步推迟的操作: %s 个", result.resumed)
+        if result.deferred:
+            log.warning("超出配额预算（%s），推迟 %s 个操作到下次同步", self.planner.budget, len(result.deferred))
+        return result.keys('create'), result.keys('update'), result.keys('delete')
+
+    def preview(self, start_date: datetime) -> ExecutionPlan:
+        """
+        只读取 iCloud 并检测变更，打印写入计划和预计配额消耗（--plan）
+
+        不调用 Google 接口，也不修改同步状态。
+        """
+        plan = None if self.incremental else self._plan_windows(start_date)
+        present = {}
+        delta, icloud_events = self._fetch_phased(start_date, plan, present)
+        icloud_events_dict = {event_key(event): event for event in icloud_events}
+        to_create, to_update, to_delete = self._detect_phased(
+            delta, plan, present, icloud_events, icloud_events_dict
+        )
+
+        # 已删除的例外实例只移除映射，不发出请求
+        mapping_only = {key for key in to_delete if self.state.get_event(key).get('master')}
+        planner = self.planner or OperationPlanner()
+        result = planner.plan(to_create, to_update, to_delete - mapping_only, icloud_events_dict,
+                              self.state, self.state.get_meta('pending_ops') or [])
+        print_plan(result, planner.budget, GoogleCalendar.BATCH_SIZE if self.batch_writes else None,
+                   len(mapping_only))
+        return result
+
+    def _sync_streaming(self, plan: WindowPlan, stats: Dict[str, int]) -> int:
+        """
+        流水线同步：每读完一个日历就检测变更，把创建和更新交给写入线程，
+        iCloud 读取与 Google 写入重叠进行；所有日历读取完成后再检测删除
+
+        Returns:
+            iCloud 事件总数
+        """
+        log.info("[1/4] 正在从 iCloud 读取事件并同步创建、更新...")
+        ops = queue.Queue(maxsize=self.write_queue_size)
+        failures: List[LeaseLost] = []
+        writer = threading.Thread(target=self._write_worker, args=(ops, stats, failures), daemon=True)
+        writer.start()
+
+        seen_keys = set()
+        seen_uids = set()
+        present = {}
+        positions = {}
+        with metrics.timer('sync_phase_seconds', phase='stream'):
+            try:
+                for calendar_name, events in self._iter_windows(plan, present):
+                    if failures:
+                        raise failures[0]
+                    calendar_events = {}
+                    for event in events:
+                        key = event_key(event)
+                        # 同一事件出现在多个日历中时以第一个为准
+                        if key not in seen_keys:
+                            seen_keys.add(key)
+                            seen_uids.add(event['uid'])
+                            calendar_events[key] = event
+                            if plan.full and plan.tiered:
+                                positions[key] = event_position(event)
+
+                    to_create, to_update = self._detect_changes(calendar_events)
+                    log.info("%s: 需要创建 %s 个，需要更新 %s 个", calendar_name, len(to_create), len(to_update))
+
+                    # 队列满时阻塞，读取速度受写入速度约束
+                    creates, overrides = self._split_overrides(to_create, calendar_events)
+                    for key in creates + overrides:
+                        ops.put(('create', key, calendar_events[key]))
+                    for key in to_update:
+                        ops.put(('update', key, calendar_events[key]))
+            finally:
+                ops.put(None)
+                writer.join()
+            if failures:
+                raise failures[0]
+
+        # 所有日历读取完成后才能确定哪些事件已删除
+        log.info("[2/4] 正在检测删除...")
+        with metrics.timer('sync_phase_seconds', phase='diff'):
+            to_delete = self._detect_window_deletions(plan, present, seen_uids)
+            if positions:
+                self._fence_write()
+                self.state.set_starts(positions)
+            self._resolve_override_deletions(set(), to_delete, {}, stats, present_keys=seen_keys)
+        log.info("需要删除: %s 个事件", len(to_delete))
+
+        log.info("[3/4] 正在执行删除...")
+        with metrics.timer('sync_phase_seconds', phase='apply'):
+            if self.batch_writes:
+                self._apply_batch(set(), set(), to_delete, {}, stats)
+            else:
+                self._apply(set(), set(), to_delete, {}, stats)
 
-        # 3. 检测需要删除的事件
-        to_delete = self._detect_deletions(icloud_events_dict)
+        return len(seen_keys)
 
-        print(f"  - 需要创建: {len(to_create)} 个事件")
-        print(f"  - 需要更新: {len(to_update)} 个事件")
-        print(f"  - 需要删除: {len(to_delete)} 个事件")
+    def _plan_windows(self, start_date: datetime) -> WindowPlan:
+        """本次同步读取的时间窗口：未配置分层时为从 start_date 开始的一年"""
+        if not self.windows:
+            return fixed_window(start_date)
+        plan = self.windows.plan(start_date, self.state.get_meta('windows'))
+        log.info("读取范围: %s", '，'.join(map(repr, plan.windows)))
+        return plan
 
-        # 4. 执行同步操作
-        print("\n[3/4] 正在执行同步...")
+    def _iter_windows(self, plan: WindowPlan, present: Dict[str, Set[str]]) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        依次读取各窗口，按日历产出事件
 
-        # 创建新事件
-        for uid in to_create:
-            event = icloud_events_dict[uid]
-            google_id = self.google.create_event(event)
-            if google_id:
-                self.sync_state['events'][uid] = {
-                    'google_id': google_id,
-                    'hash': event['hash']
-                }
-                stats['created'] += 1
+        Args:
+            present: 输出参数，记录每个窗口读取到的事件键，用于按窗口检测删除
+
+        Yields:
+            (日历名称, 事件列表)，跨越窗口边界的事件只产出一次
+        """
+        for window in plan.windows:
+            for calendar_name, events in self.icloud.iter_events(window.start, window.end):
+                yield calendar_name, self._window_events(window, events, present)
+
+    @staticmethod
+    def _window_events(window: TimeWindow, events: List[Dict], present: Dict[str, Set[str]]) -> List[Dict]:
+        """记录 window 中读取到的事件键，返回之前的窗口中没有读取到的事件"""
+        earlier = [keys for name, keys in present.items() if name != window.name]
+        keys = present.setdefault(window.name, set())
+        new_events = []
+        for event in events:
+            key = event_key(event)
+            keys.add(key)
+            if not any(key in other for other in earlier):
+                new_events.append(event)
+        return new_events
+
+    def _write_worker(self, ops: queue.Queue, stats: Dict[str, int], failures: List[LeaseLost]):
+        """
+        写入线程：执行队列中的创建和更新操作，批量模式下攒够一批再提交
+
+        失去租约时把 LeaseLost 放入 failures 交给读取端抛出，之后只取出队列中的操作不再写入，
+        读取端不会在队列上阻塞。
+        """
+        pending = []
+        while True:
+            op = ops.get()
+            if failures:
+                if op is None:
+                    break
+                continue
+            if op is not None:
+                pending.append(op)
+
+            if pending and (op is None or not self.batch_writes
+                            or len(pending) >= self.google.BATCH_SIZE or ops.empty()):
+                try:
+                    self._write_ops(pending, stats)
+                except LeaseLost as e:
+                    failures.append(e)
+                pending = []
+
+            if op is None:
+                break
+
+    def _write_ops(self, pending: List[Tuple[str, str, Dict]], stats: Dict[str, int]):
+        """执行一组 ('create' | 'update', 事件键, 事件) 操作"""
+        events = {key: event for _, key, event in pending}
+        to_create = {key for kind, key, _ in pending if kind == 'create'}
+        to_update = {key for kind, key, _ in pending if kind == 'update'}
+
+        try:
+            if self.batch_writes:
+                self._apply_batch(to_create, to_update, set(), events, stats)
             else:
-                stats['errors'] += 1
+                self._apply(to_create, to_update, set(), events, stats)
+        except LeaseLost:
+            raise
+        except Exception as e:
+            # 写入线程不能退出，否则读取端会在队列上永久阻塞
+            log.warning("写入事件失败: %s", e)
+            stats['errors'] += len(pending)
+
+    def _apply(self, to_create: Set[str], to_update: Set[str], to_delete: Set[str],
+               icloud_events: Dict[str, Dict], stats: Dict[str, int]):
+        """逐个执行创建、更新、删除操作"""
+        creates, overrides = self._split_overrides(to_create, icloud_events)
+
+        # 创建新事件
+        for key in creates:
+            self._check_lease()
+            event = icloud_events[key]
+            self._record_create(key, event, self.google.create_event(event), stats)
+
+        # 重复事件的例外实例：在主体创建后更新对应实例
+        for key in overrides:
+            self._check_lease()
+            event = icloud_events[key]
+            google_id = self._override_google_id(event)
+            success = bool(google_id) and self.google.update_event(google_id, event)
+            self._record_create(key, event, google_id if success else None, stats)
 
         # 更新事件
-        for uid in to_update:
-            event = icloud_events_dict[uid]
-            google_id = self.sync_state['events'][uid]['google_id']
-            if self.google.update_event(google_id, event):
-                self.sync_state['events'][uid]['hash'] = event['hash']
-                stats['updated'] += 1
+        for key in to_update:
+            self._check_lease()
+            event = icloud_events[key]
+            google_id = self.state.get_event(key)['google_id']
+            changed = self._changed_fields(key, event)
+            if changed is None:
+                success = self.google.update_event(google_id, event)
             else:
-                stats['errors'] += 1
+                success = self.google.patch_event(google_id, event, changed)
+            self._record_update(key, event, success, stats)
+
+        # 删除事件
+        for key in to_delete:
+            self._check_lease()
+            google_id = self.state.get_event(key)['google_id']
+            self._record_delete(key, self.google.delete_event(google_id), stats)
+
+    def _apply_batch(self, to_create: Set[str], to_update: Set[str], to_delete: Set[str],
+                     icloud_events: Dict[str, Dict], stats: Dict[str, int]):
+        """通过批量请求执行创建、更新、删除操作，每个子请求单独记录结果"""
+        creates, overrides = self._split_overrides(to_create, icloud_events)
+
+        # 创建新事件
+        if creates:
+            self._check_lease()
+            created = self.google.batch_create_events([(key, icloud_events[key]) for key in creates])
+            for key in creates:
+                self._record_create(key, icloud_events[key], created.get(key), stats)
+
+        # 重复事件的例外实例：在主体创建后更新对应实例
+        if overrides:
+            self._check_lease()
+            google_ids = {key: self._override_google_id(icloud_events[key]) for key in overrides}
+            updated = self.google.batch_update_events(
+                [(google_ids[key], icloud_events[key]) for key in overrides if google_ids[key]]
+            )
+            for key in overrides:
+                google_id = google_ids[key]
+                success = bool(google_id) and updated.get(google_id, False)
+                self._record_create(key, icloud_events[key], google_id if success else None, stats)
+
+        # 更新事件
+        if to_update:
+            self._check_lease()
+            google_ids = {key: self.state.get_event(key)['google_id'] for key in to_update}
+            changed = {key: self._changed_fields(key, icloud_events[key]) for key in to_update}
+            updated = self.google.batch_update_events(
+                [(google_ids[key], icloud_events[key]) for key in to_update if changed[key] is None]
+            )
+            updated.update(self.google.batch_patch_events(
+                [(google_ids[key], icloud_events[key], changed[key]) for key in to_update if changed[key] is not None]
+            ))
+            for key in to_update:
+                self._record_update(key, icloud_events[key], updated.get(google_ids[key], False), stats)
 
         # 删除事件
-        for uid in to_delete:
-            google_id = self.sync_state['events'][uid]['google_id']
-            if self.google.delete_event(google_id):
-                del self.sync_state['events'][uid]
-                stats['deleted'] += 1
+        if to_delete:
+            self._check_lease()
+            google_ids = {key: self.state.get_event(key)['google_id'] for key in to_delete}
+            deleted = self.google.batch_delete_events(list(google_ids.values()))
+            for key in to_delete:
+                self._record_delete(key, deleted.get(google_ids[key], False), stats)
+
+    @staticmethod
+    def _split_overrides(to_create: Set[str], icloud_events: Dict[str, Dict]) -> Tuple[List[str], List[str]]:
+        """把待创建事件分为普通事件/重复事件主体，以及依赖主体的例外实例"""
+        creates, overrides = [], []
+        for key in to_create:
+            if icloud_events[key].get('recurrence_id'):
+                overrides.append(key)
             else:
-                stats['errors'] += 1
-
-        # 计算未变更数量
-        stats['unchanged'] = len(icloud_events) - stats['created'] - stats['updated']
-
-        # 5. 保存状态
-        print("\n[4/4] 正在保存同步状态...")
-        self.sync_state['last_sync'] = datetime.now().isoformat()
-        self._save_state()
-
-        # 打印统计
-        print(f"\n{'='*50}")
-        print("同步完成!")
-        print(f"  - 创建: {stats['created']}")
-        print(f"  - 更新: {stats['updated']}")
-        print(f"  - 删除: {stats['deleted']}")
-        print(f"  - 未变更: {stats['unchanged']}")
-        if stats['errors'] > 0:
-            print(f"  - 错误: {stats['errors']}")
-        print(f"{'='*50}\n")
+                creates.append(key)
+        return creates, overrides
 
-        return stats
+    def _changed_fields(self, key: str, event: Dict) -> Optional[List[str]]:
+        """
+        与上次写入的字段指纹比较，返回变化的字段
+
+        Returns:
+            变化的字段（可能为空，此时只更新同步属性）；未启用 PATCH 或旧状态中
+            没有字段指纹时返回 None，整体更新
+        """
+        if not self.patch_updates:
+            return None
+        recorded = self.state.get_event(key).get('fields')
+        if not recorded:
+            return None
+        current = self.google.field_fingerprints(event)
+        return [name for name in PATCH_FIELDS if current[name] != recorded.get(name)]
+
+    def _override_google_id(self, event: Dict) -> Optional[str]:
+        """例外实例对应的 Google 实例 ID，主体尚未同步时返回 None"""
+        master = self.state.get_event(event['uid'])
+        if not master:
+            log.warning("重复事件主体未同步，跳过例外实例: %s", event['summary'])
+            return None
+        return self.google.instance_id(master['google_id'], event)
+
+    def _resolve_override_deletions(self, to_update: Set[str], to_delete: Set[str],
+                                    icloud_events: Dict[str, Dict], stats: Dict[str, int],
+                                    present_keys: Iterable[str] = ()):
+        """
+        处理已删除的例外实例
+
+        Google 中的例外实例不能单独删除（那样会取消该次重复），因此只移除映射；
+        主体仍存在时重新提交主体，让该实例恢复为重复规则的内容。
+        主体一并删除时，其所有实例会随主体删除。
+
+        Args:
+            present_keys: 流水线模式下本次读取到的事件键（事件数据已不在内存中），
+                这些主体会被标记为已变更，在下次同步时重新提交
+        """
+        present_keys = set(present_keys)
+        for key in list(to_delete):
+            master_uid = self.state.get_event(key).get('master')
+            if not master_uid:
+                continue
+
+            to_delete.discard(key)
+            self._fence_write()
+            self.state.delete_event(key)
+            stats['deleted'] += 1
+
+            if master_uid in to_delete or not self.state.get_event(master_uid):
+                continue
+            if master_uid in icloud_events:
+                to_update.add(master_uid)
+            elif master_uid in present_keys:
+                self._fence_write()
+                self.state.set_hash(master_uid, '')
+
+    def _record_create(self, key: str, event: Dict, google_id: Optional[str], stats: Dict[str, int]):
+        """记录创建结果"""
+        if google_id:
+            entry = {
+                'google_id': google_id,
+                'hash': event['hash'],
+                'start': event_position(event),
+                'fields': self.google.field_fingerprints(event)
+            }
+            if event.get('recurrence_id'):
+                entry['master'] = event['uid']
+            self._fence_write()
+            self.state.put_event(key, entry)
+            stats['created'] += 1
+        else:
+            stats['errors'] += 1
+
+    def _record_update(self, key: str, event: Dict, success: bool, stats: Dict[str, int]):
+        """记录更新结果"""
+        if success:
+            self._fence_write()
+            self.state.set_hash(key, event['hash'], event_position(event), self.google.field_fingerprints(event))
+            stats['updated'] += 1
+        else:
+            stats['errors'] += 1
+
+    def _record_delete(self, key: str, success: bool, stats: Dict[str, int]):
+        """记录删除结果"""
+        if success:
+            self._fence_write()
+            self.state.delete_event(key)
+            stats['deleted'] += 1
+        else:
+            stats['errors'] += 1
 
     def _detect_changes(self, icloud_events: Dict[str, Dict]) -> Tuple[Set[str], Set[str]]:
         """
@@ -140,11 +652,14 @@ class SyncEngine:
         to_create = set()
         to_update = set()
 
+        # 直接比较 16 字节摘要（见 event_record），不转换为十六进制
+        synced = self.state.get_digests(icloud_events.keys())
         for uid, event in icloud_events.items():
-            if uid not in self.sync_state['events']:
+            digest = synced.get(uid)
+            if digest is None:
                 # 新事件
                 to_create.add(uid)
-            elif self.sync_state['events'][uid]['hash'] != event['hash']:
+            elif digest != event.digest:
                 # 事件已修改
                 to_update.add(uid)
 
@@ -157,17 +672,65 @@ class SyncEngine:
         Returns:
             需要删除的 UID 集合
         """
-        synced_uids = set(self.sync_state['events'].keys())
-        current_uids = set(icloud_events.keys())
+        return self.state.missing_keys(icloud_events.keys())
 
-        return synced_uids - current_uids
+    def _detect_window_deletions(self, plan: WindowPlan, present: Dict[str, Set[str]],
+                                 seen_uids: Iterable[str]) -> Set[str]:
+        """
+        按窗口检测需要删除的事件
+
+        覆盖全部范围时与 _detect_deletions 相同；分层读取时每个窗口只检查开始时间
+        落在该窗口内的事件，冻结的历史事件和本次未读取的远期事件不会被误删。
+
+        Args:
+            present: 每个窗口读取到的事件键
+            seen_uids: 本次读取到的所有事件 UID
+
+        Returns:
+            需要删除的事件键集合
+        """
+        if plan.full:
+            return self.state.missing_keys(_KeyUnion(present.values()))
+
+        candidates = set()
+        for window in plan.windows:
+            candidates |= self.state.missing_keys(
+                present.get(window.name, ()), window.start_position, window.end_position
+            )
+        if not candidates:
+            return candidates
+
+        # 事件可能只是被改到了本次没有读取的时间范围，UID 不在本次结果中的向 iCloud 确认；
+        # 主体在本次结果中的例外实例，不存在就说明已删除
+        seen_uids = set(seen_uids)
+        uids = {key: self.state.get_event(key).get('master') or key for key in candidates}
+        unknown = {uid for uid in uids.values() if uid not in seen_uids}
+        existing = self.icloud.existing_uids(unknown) if unknown else set()
+        moved = {key for key, uid in uids.items() if uid in existing}
+        if moved:
+            log.info("%s 个事件已移出本次读取范围，暂不处理", len(moved))
+        return candidates - moved
+
+    def _record_positions(self, plan: Optional[WindowPlan], icloud_events: Dict[str, Dict]):
+        """分层同步首次全量读取时，为旧状态中的事件补充开始时间"""
+        if plan and plan.full and plan.tiered:
+            self._fence_write()
+            self.state.set_starts({key: event_position(event) for key, event in icloud_events.items()})
+
+    def _detect_removed(self, removed_keys: List[str], icloud_events: Dict[str, Dict]) -> Set[str]:
+        """
+        增量模式下的删除检测：只检查 iCloud 报告为已删除的事件
+
+        Returns:
+            需要删除的事件键集合
+        """
+        removed_keys = [key for key in removed_keys if key not in icloud_events]
+        synced = self.state.get_digests(removed_keys)
+        return {key for key in removed_keys if key in synced}
 
     def get_sync_status(self) -> Dict:
         """获取同步状态信息"""
-        return {
-            'total_synced_events': len(self.sync_state['events']),
-            'last_sync': self.sync_state.get('last_sync')
-        }
+        return self.state.status()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+"""
+日志 - 分级、异步缓冲写入、按大小轮转，可选 JSON lines 格式
+
+各模块通过 get_logger(__name__) 获取日志记录器：
+- DEBUG: 每个事件的读取、创建、更新、删除
+- INFO: 同步进度和汇总
+- WARNING / ERROR: 单个事件失败、连接失败等
+
+日志写到标准输出时直接写到当前的 sys.stdout，与 --plan、--reconcile 等命令打印的报告
+保持先后顺序，也可以被 redirect_stdout 捕获（多账号同步的子进程、基准测试）。
+配置了日志文件时，日志先放入队列，由后台线程批量写入并按大小轮转，队列空闲时或每隔
+FLUSH_INTERVAL 秒刷新一次，同步线程不再等待磁盘（或 iCloud Drive）写入。
+"""
+
+import atexit
+import json
+import logging
+import sys
+import threading
+from datetime import datetime
+from typing import Optional
+
+# logging.handlers 和 queue 只在写日志文件时需要，在 setup_logging 中导入，
+# 不拖慢 --status 等命令的启动
+
+
+ROOT = 'calendar_sync'
+
+# 后台写入线程刷新文件的最长间隔（秒）
+FLUSH_INTERVAL = 1.0
+
+# 队列上限，写入跟不上时新日志阻塞等待而不是无限占用内存
+QUEUE_SIZE = 10000
+
+# LogRecord 的标准属性，其余属性（logging 的 extra 参数）作为结构化字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """模块日志记录器，name 通常为 __name__"""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """写到当前的 sys.stdout（而不是创建时的），redirect_stdout 时同样生效"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON：ts、level、logger、msg，以及 extra 传入的结构化字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name[len(ROOT) + 1:] or record.name,
+            'msg': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS and name not in data:
+                data[name] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _Writer(threading.Thread):
+    """后台写入线程：从队列取出日志交给目标处理器，空闲时刷新"""
+
+    def __init__(self, records, handler: logging.Handler):
+        super().__init__(name='log-writer', daemon=True)
+        self.records = records
+        self.handler = handler
+
+    def run(self):
+        import queue
+
+        while True:
+            try:
+                record = self.records.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                self.handler.flush_now()
+                continue
+            if record is None:
+                break
+            self.handler.handle(record)
+            if self.records.empty():
+                self.handler.flush_now()
+        self.handler.flush_now()
+
+    def stop(self):
+        self.records.put(None)
+        self.join()
+        self.handler.close()
+
+
+_logger = logging.getLogger(ROOT)
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+_logger.addHandler(_StdoutHandler())
+_writer: Optional[_Writer] = None
+
+
+def setup_logging(level: str = 'INFO', log_file: Optional[str] = None, max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 5, json_lines: bool = False):
+    """
+    配置日志
+
+    Args:
+        level: 日志级别（DEBUG 时输出每个事件）
+        log_file: 日志文件（异步写入、按大小轮转），None 时写到标准输出
+        max_bytes: 日志文件超过该大小时轮转，0 表示不轮转
+        backup_count: 保留的旧日志文件数
+        json_lines: 每条日志输出为一行 JSON
+    """
+    global _writer
+    shutdown_logging()
+
+    if log_file:
+        import logging.handlers
+        import queue
+
+        class _BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+            """emit 后不立即刷新，由后台写入线程统一刷新"""
+
+            def flush(self):
+                pass
+
+            def flush_now(self):
+                with self.lock:
+                    if self.stream:
+                        self.stream.flush()
+
+        target = _BufferedRotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                              encoding='utf-8')
+        target.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        records = queue.Queue(QUEUE_SIZE)
+        _writer = _Writer(records, target)
+        _writer.start()
+        handler = logging.handlers.QueueHandler(records)
+    else:
+        target = handler = _StdoutHandler()
+    if json_lines:
+        target.setFormatter(JsonFormatter())
+
+    for old in list(_logger.handlers):
+        _logger.removeHandler(old)
+    _logger.addHandler(handler)
+    set_level(level)
+
+
+def set_level(level: str):
+    """只修改日志级别（未调用 setup_logging 的子进程使用）"""
+    _logger.setLevel(getattr(logging, level.upper()))
+
+
+def shutdown_logging():
+    """写出队列中剩余的日志并关闭日志文件（进程退出时自动调用）"""
+    global _writer
+    if _writer:
+        _writer.stop()
+        _writer = None
+
+
+atexit.register(shutdown_logging)
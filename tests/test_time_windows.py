@@ -0,0 +1,107 @@
+"""
+分层时间窗口测试 - 近期窗口的起点每天后移，未变化的重复事件不应被重复更新
+
+使用 benchmark 中的假 CalDAV 和 Google 服务器，不访问网络。
+
+用法:
+    python -m unittest tests.test_time_windows
+"""
+
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+
+from google.oauth2.credentials import Credentials
+
+from benchmark.dataset import BASE_DATE, CalendarObject, Dataset
+from benchmark.fake_caldav import FakeCalDAVServer
+from benchmark.fake_google import FakeGoogleServer
+from google_calendar import GoogleCalendar
+from icloud_calendar import ICloudCalendar
+from sync_engine import SyncEngine
+from time_windows import TieredWindows
+
+
+WEEKLY = '\r\n'.join([
+    'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//test//EN',
+    'BEGIN:VEVENT', 'UID:weekly-series', 'SUMMARY:周会',
+    'DTSTART:20251006T020000Z', 'DTEND:20251006T030000Z', 'RRULE:FREQ=WEEKLY',
+    'END:VEVENT', 'END:VCALENDAR'
+]) + '\r\n'
+
+START_DATE = BASE_DATE - timedelta(days=120)
+DAY1 = BASE_DATE + timedelta(days=30)
+DAY2 = BASE_DATE + timedelta(days=40)
+
+
+class TieredWindowsPlanTest(unittest.TestCase):
+
+    def test_near_window_moves_with_now(self):
+        windows = TieredWindows(past_days=7, near_days=30, far_days=90, far_every=2)
+        first = windows.plan(START_DATE, None, now=DAY1)
+        second = windows.plan(START_DATE, first.state, now=DAY2)
+
+        self.assertTrue(first.full)
+        self.assertEqual([window.name for window in first.windows], ['历史', '近期', '远期'])
+        self.assertFalse(second.full)
+        self.assertEqual(second.windows[0].start, DAY2 - timedelta(days=7))
+        self.assertEqual(second.state['cycle'], 2)
+
+
+class TieredSyncTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        dataset = Dataset(20, calendars=1, seed=1)
+        dataset.calendars['cal0']['weekly-series.ics'] = CalendarObject('weekly-series', WEEKLY, 1)
+        cls.caldav = FakeCalDAVServer(dataset)
+        cls.google_server = FakeGoogleServer()
+        cls.caldav.start()
+        cls.google_server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.caldav.stop()
+        cls.google_server.stop()
+
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.google_server.events.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.work)
+
+    def engine(self, windows: TieredWindows) -> SyncEngine:
+        icloud = ICloudCalendar('test', 'test', recurrence_aware=True)
+        icloud.CALDAV_URL = self.caldav.url
+        self.assertTrue(icloud.connect())
+
+        google = GoogleCalendar('', '', rate_limit=1000)
+        google.creds = Credentials(token='test')
+        google.service = FakeGoogleServer.build_service(self.google_server.url)
+        return SyncEngine(icloud, google, os.path.join(self.work, 'sync_state.json'), windows=windows)
+
+    def test_unchanged_series_not_updated_on_later_day(self):
+        windows = TieredWindows(past_days=7, near_days=30, far_days=90, far_every=2)
+        engine = self.engine(windows)
+
+        windows.plan = functools.partial(TieredWindows.plan, windows, now=DAY1)
+        first = engine.sync(START_DATE)
+        series = dict(self.google_server.events)
+        self.assertGreater(first['created'], 0)
+        self.assertIsNotNone(engine.state.get_event('weekly-series'))
+
+        # 第二天近期窗口的起点越过了重复事件的若干个实例
+        windows.plan = functools.partial(TieredWindows.plan, windows, now=DAY2)
+        second = engine.sync(START_DATE)
+        self.assertEqual(second['created'], 0)
+        self.assertEqual(second['updated'], 0)
+        self.assertEqual(second['deleted'], 0)
+        self.assertEqual(self.google_server.events, series)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+分层时间窗口 - 按事件时间远近决定每次同步读取的范围
+
+- 近期窗口：从冻结点到未来 near_days 天，每次同步都读取
+- 远期窗口：近期窗口之后到未来 far_days 天，每 far_every 次同步读取一次
+- 历史：冻结点（past_days 天前）之前的事件不再读取，也不再检测删除
+
+第一次使用（状态中没有窗口记录）时读取从 SYNC_START_DATE 开始的全部范围，
+之后每次读取的事件数只取决于窗口长度，不随历史事件增长。
+
+只用于识别重复事件的模式（ICLOUD_RECURRENCE_AWARE）：展开模式下重复事件由窗口内第一个实例代表，
+近期窗口的起点随时间后移，同一个未变化的重复事件每天都会被当作已修改。
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from dateutil import tz
+
+
+def to_position(value) -> str:
+    """
+    把时间转换为可按字符串比较的 UTC 时间（YYYY-MM-DDTHH:MM:SS）
+
+    不带时区的时间和全天日期按本地时区处理，与 date_search 的时间范围一致。
+    """
+    if isinstance(value, str):
+        # Google 返回的 UTC 时间以 Z 结尾，Python 3.11 之前的 fromisoformat 不支持
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=tz.tzlocal())
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def event_position(event: Dict) -> str:
+    """事件在时间轴上的位置（开始时间），保存在同步状态中，用于判断事件属于哪个窗口"""
+    return to_position(event['start'])
+
+
+class TimeWindow:
+    """一个读取范围 [start, end)"""
+
+    def __init__(self, name: str, start: datetime, end: datetime):
+        self.name = name
+        self.start = start
+        self.end = end
+
+    @property
+    def start_position(self) -> str:
+        return to_position(self.start)
+
+    @property
+    def end_position(self) -> str:
+        return to_position(self.end)
+
+    def __repr__(self) -> str:
+        return f"{self.name} {self.start:%Y-%m-%d} ~ {self.end:%Y-%m-%d}"
+
+
+class WindowPlan:
+    """
+    一次同步要读取的窗口
+
+    Attributes:
+        windows: 本次读取的窗口
+        full: 是否覆盖全部范围；为 True 时按整体检测删除，否则只在各窗口内检测
+        state: 同步成功后保存到状态中的窗口记录，固定窗口时为 None
+    """
+
+    def __init__(self, windows: List[TimeWindow], full: bool, state: Optional[Dict] = None):
+        self.windows = windows
+        self.full = full
+        self.state = state
+
+    @property
+    def tiered(self) -> bool:
+        return self.state is not None
+
+
+def fixed_window(start_date: datetime, days: int = 365) -> WindowPlan:
+    """不分层时的固定窗口：从 start_date 开始 days 天"""
+    return WindowPlan([TimeWindow('全部', start_date, start_date + timedelta(days=days))], full=True)
+
+
+class TieredWindows:
+    """
+    按配置生成每次同步的窗口
+
+    Args:
+        past_days: 近期窗口向过去覆盖的天数，更早的事件冻结
+        near_days: 近期窗口向未来覆盖的天数
+        far_days: 远期窗口向未来覆盖的天数
+        far_every: 每隔几次同步读取一次远期窗口
+    """
+
+    def __init__(self, past_days: int = 30, near_days: int = 90,
+                 far_days: int = 365, far_every: int = 12):
+        self.past_days = past_days
+        self.near_days = near_days
+        self.far_days = far_days
+        self.far_every = max(1, far_every)
+
+    def plan(self, start_date: datetime, saved: Optional[Dict],
+             now: Optional[datetime] = None) -> WindowPlan:
+        """
+        计算本次同步的窗口
+
+        Args:
+            start_date: 同步开始日期（SYNC_START_DATE），早于它的事件从不同步
+            saved: 上次同步保存的窗口记录（WindowPlan.state），为空时读取全部范围
+            now: 当前时间，默认为 datetime.now()
+        """
+        now = now or datetime.now()
+        cutoff = max(start_date, now - timedelta(days=self.past_days))
+        near_end = max(cutoff, now + timedelta(days=self.near_days))
+        far_end = max(near_end, now + timedelta(days=self.far_days))
+
+        full = not saved
+        cycle = 0 if full else saved.get('cycle', 0)
+
+        windows = []
+        if full and start_date < cutoff:
+            windows.append(TimeWindow('历史', start_date, cutoff))
+        windows.append(TimeWindow('近期', cutoff, near_end))
+        if far_end > near_end and (full or cycle % self.far_every == 0):
+            windows.append(TimeWindow('远期', near_end, far_end))
+
+        state = {'cycle': cycle + 1, 'frozen_before': cutoff.isoformat()}
+        return WindowPlan(windows, full, state)